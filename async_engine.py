@@ -0,0 +1,477 @@
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from lxml.html import HtmlElement
+
+from pipeline import Pipeline, PipelineExecutor, Records
+from progress import Progress
+from work_queue import SharedProgress, NoURLAvailable, page_key
+from crawler import follow_next_page, watch_pipeline
+from logger import Logger
+from credentials import FacebookCookies
+from extractor import FacebookPostExtractor, CLOSE_BTN_XPATH
+from driver_pool import DriverPool
+from fetcher import parse_page, parse_timeline, CommentImageResolver, USER_AGENT
+from post import PagePostMetadata
+from politeness import PolitenessScheduler, CheckpointError
+from transactions import TransactionAborted
+from metrics import STAGE_SECONDS, PAGES, RECORDS
+import colors
+
+from http.cookies import SimpleCookie
+from typing import Literal, Sequence, Type
+import numpy as np
+import threading
+import traceback
+import asyncio
+import signal
+import time
+import sys
+
+total_crawler = 0
+
+class AsyncCrawler:
+    """
+        Base class for asyncio crawlers. Many of them run as tasks of one
+        event loop, sharing an aiohttp connection pool; the `on_start`,
+        `parse`, `on_parse_error` and `on_exit` hooks are coroutines and must
+        not block, browser work goes through `in_browser` and progress calls
+        (which fsync or wait on SQLite locks) through `in_thread`.
+    """
+    def __init__(
+        self,
+        termination_event: threading.Event,
+        progress: Progress | SharedProgress,
+        data_pipeline: Pipeline | PipelineExecutor,
+        connector,
+        name: str | None = None,
+        mean_std_sleep_second: tuple[float, float] = (10, 1),
+        timeout_second: float = 30,
+        driver_pool: DriverPool | None = None,
+        browser_slots: asyncio.Semaphore | None = None,
+        scheduler: PolitenessScheduler | None = None,
+        account: str = "default"
+    ):
+        """
+        :param connector: The `aiohttp.TCPConnector` shared by every crawler of the engine.
+        :param driver_pool: Browsers for pages that need JavaScript, None if none are needed.
+        :param browser_slots: Bounds the crawlers using a browser at once.
+        """
+        global total_crawler
+        total_crawler += 1
+        if name is None:
+            name = f"AsyncCrawler-{total_crawler}"
+        self.name = name
+
+        self.termination_flag = termination_event
+        self.logger = Logger(name)
+        self.progress = progress
+        self.data_pipeline = data_pipeline
+
+        self.connector = connector
+        self.mean_std_sleep_second = mean_std_sleep_second
+        self.timeout_second = timeout_second
+        self.driver_pool = driver_pool
+        self.browser_slots = browser_slots
+        self.scheduler = scheduler
+        self.account = account
+        self.page_outcome = None
+        self.http = None
+
+    async def sleep(self, times: int = 1):
+        if self.scheduler is not None:
+            await asyncio.sleep(self.scheduler.delay(self.account, times))
+            return
+        mean, std = self.mean_std_sleep_second
+        sleep_second = np.random.normal(mean, std, (times,))
+        sleep_second = np.clip(sleep_second, a_min=0, a_max=mean+3*std).sum()
+        await asyncio.sleep(sleep_second)
+
+    def report(self, outcome: Literal["success", "error", "checkpoint", "empty"]):
+        # A page's first outcome is its only one: `run` reports a success
+        # or a failure only if `parse` reported nothing else
+        if self.page_outcome is not None:
+            return
+        self.page_outcome = outcome
+        if self.scheduler is not None:
+            self.scheduler.report(self.account, outcome)
+
+    def load_cookies(self, cookies: list[dict]):
+        jar = SimpleCookie()
+        for cookie in cookies:
+            jar[cookie["name"]] = cookie["value"]
+            jar[cookie["name"]]["domain"] = cookie.get("domain", "")
+            jar[cookie["name"]]["path"] = cookie.get("path", "/")
+        self.http.cookie_jar.update_cookies(jar)
+
+    async def get(self, url: str) -> HtmlElement:
+        async with self.http.get(url) as response:
+            response.raise_for_status()
+            content = await response.read()
+            return parse_page(content, str(response.url), response.headers.get("Content-Type", ""))
+
+    async def in_thread(self, fn, *args, **kwargs):
+        """
+        Runs a blocking call, eg. of the progress, on a worker thread. The
+        context is copied, so the call belongs to the current transaction.
+        """
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def in_browser(self, fn, *args):
+        """
+        Runs `fn(driver, *args)` on a worker thread with a pooled browser,
+        which is reset and returned to the pool afterwards.
+        """
+        async with self.browser_slots:
+            driver = await asyncio.to_thread(self.driver_pool.acquire)
+            try:
+                return await asyncio.to_thread(fn, driver, *args)
+            finally:
+                await asyncio.to_thread(self.driver_pool.release, driver)
+
+    async def exit(self):
+        if self.termination_flag.is_set():
+            self.logger.info("Closing due to Engine's termination")
+        else:
+            self.logger.info("Closing due to no URL left in queue")
+        await self.in_thread(self.progress.release, self.name)
+        await self.on_exit()
+        await self.http.close()
+
+    async def on_start(self):
+        pass
+
+    async def on_exit(self):
+        pass
+
+    async def parse(self, url: str):
+        pass
+
+    async def on_parse_error(self):
+        pass
+
+    async def run(self):
+        import aiohttp
+        self.http = aiohttp.ClientSession(
+            connector=self.connector,
+            connector_owner=False,
+            # Also keep cookies of IP hosts, eg. a local stand-in server
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            headers={"User-Agent": USER_AGENT, "Accept-Language": "vi-VN,vi;q=0.9"},
+            timeout=aiohttp.ClientTimeout(total=self.timeout_second)
+        )
+        try:
+            await self.on_start()
+            err_trial = 0
+            while (
+                # A shared queue may wait for other workers' leases
+                await self.in_thread(self.progress.remaining_num, self.name) > 0
+                and not self.termination_flag.is_set()
+                and err_trial <= 5
+            ):
+                url = None
+                self.page_outcome = None
+                accounted = False
+                try:
+                    # Extract data -> Add history -> Pipeline, which commits
+                    # both once the records are staged; rolled back on error
+                    with self.progress.transaction() as transaction:
+                        try:
+                            url = await self.in_thread(self.progress.next_url, worker=self.name)
+                            self.logger.info(f"Begin parsing {colors.grey(url)}")
+                            with STAGE_SECONDS.time(crawler=self.name, stage="parse"):
+                                data = await self.parse(url)
+                            await self.in_thread(self.progress.add_history, url)
+                        except BaseException:
+                            # Off the loop, leaving nothing for the block's own rollback
+                            await self.in_thread(transaction.rollback)
+                            raise
+                    # Rolled back meanwhile along with the page it depends on
+                    transaction.ensure_open()
+                    # Submitting blocks while the pipeline queue is full
+                    with STAGE_SECONDS.time(crawler=self.name, stage="pipeline_submit"):
+                        watch_pipeline(
+                            self.logger,
+                            await self.in_thread(self.data_pipeline, Records.of(data, transaction.id)),
+                            url, transaction
+                        )
+                    PAGES.inc(crawler=self.name, outcome=self.page_outcome or "success")
+                    RECORDS.inc(len(data) if data else 0, crawler=self.name)
+                    await self.in_thread(self.progress.record_outcome, url, len(data) if data else 0)
+                    self.report("success")
+                    accounted = True
+                    await self.sleep()
+                    err_trial = 0
+                except NoURLAvailable:
+                    # Taken by another crawler since `remaining_num`, not a failure
+                    continue
+                except TransactionAborted as e:
+                    # Not a failure of this page, redone with the one it depends on
+                    PAGES.inc(crawler=self.name, outcome="aborted")
+                    self.logger.warning(f"Abandoned {colors.grey(url)}: {e}")
+                except Exception:
+                    err_trial += 1
+                    # Logging out error
+                    exc_type, value, tb = sys.exc_info()
+                    # A failure once the page is accounted for (eg. while pacing) is
+                    # not reported again
+                    if not accounted:
+                        outcome = "checkpoint" if isinstance(value, CheckpointError) else "error"
+                        PAGES.inc(crawler=self.name, outcome=outcome)
+                        self.report(outcome)
+                        if url is not None:
+                            await self.in_thread(self.progress.record_outcome, url, 0, failed=True)
+                    # The transaction of the page put its URL back in the queue
+                    action = "Restore {0} to queue" if not accounted else "Done with {0}, then failed"
+                    self.logger.error(f"{action.format(colors.grey(url))} due to error: \n{colors.red(exc_type.__name__)}: {value}\n{traceback.format_exc()}")
+
+                    await self.on_parse_error()
+        finally:
+            await self.exit()
+
+
+class AsyncFacebookPageCrawler(AsyncCrawler):
+    """
+        Crawls page timelines over HTTP with the saved login cookies. Posts
+        with images are extracted in a pooled browser, which stays logged out.
+    """
+    def __init__(
+        self,
+        termination_event: threading.Event,
+        progress: Progress | SharedProgress,
+        data_pipeline: Pipeline | PipelineExecutor,
+        connector,
+        cookies_dir: str = "./fb-cookies",
+        name: str | None = None,
+        mode: Literal["post", "comments", "both"] = "both",
+        comment_load_num: int = 300,
+        extraction: Literal["webdriver", "snapshot", "script"] = "webdriver",
+        image_resolution: Literal["browser", "http"] = "browser",
+        image_concurrency: int = 8,
+        incremental: bool = False,
+        watermark_overlap_second: float = 24 * 3600,
+        mean_std_load_cmt_sleep_second: tuple[float, float] = (1, 0.1),
+        mean_std_sleep_second: tuple[float, float] = (6, 1),
+        DOM_wait_second: float = 60,
+        timeout_second: float = 30,
+        driver_pool: DriverPool | None = None,
+        browser_slots: asyncio.Semaphore | None = None,
+        scheduler: PolitenessScheduler | None = None,
+        account: str = "default"
+    ) -> None:
+        super().__init__(
+            termination_event=termination_event,
+            progress=progress,
+            data_pipeline=data_pipeline,
+            connector=connector,
+            name=name,
+            mean_std_sleep_second=mean_std_sleep_second,
+            timeout_second=timeout_second,
+            driver_pool=driver_pool,
+            browser_slots=browser_slots,
+            scheduler=scheduler,
+            account=account
+        )
+        self.mode = mode
+        self.cmt_load_num = comment_load_num
+        self.extraction = extraction
+        self.image_resolution = image_resolution
+        self.image_concurrency = image_concurrency
+        self.image_resolver = None
+        # Stop walking a timeline at posts older than the last walk's newest
+        self.incremental = incremental
+        self.watermark_overlap_second = watermark_overlap_second
+        self.DOM_wait_second = DOM_wait_second
+        self.cookies = FacebookCookies(cookies_dir)
+        self.mean_std_cmt_sleep = mean_std_load_cmt_sleep_second
+
+    async def on_start(self):
+        if not self.cookies.exists():
+            raise RuntimeError(f"No saved cookies in {self.cookies.dir_path}, log in once with FacebookPageCrawler first")
+        self.load_cookies(self.cookies.load())
+        if self.image_resolution == "http":
+            self.image_resolver = CommentImageResolver(self.cookies.load(), self.image_concurrency)
+
+    async def on_exit(self):
+        if self.image_resolver is not None:
+            self.image_resolver.close()
+
+    def extract_in_browser(self, chrome: webdriver.Chrome, metadata: PagePostMetadata):
+        chrome.get(metadata.post_url)
+        post_extractor = FacebookPostExtractor(
+            chrome=chrome,
+            logger=self.logger,
+            mode=self.mode,
+            cmt_load_time=self.cmt_load_num,
+            extraction=self.extraction,
+            image_resolver=self.image_resolver,
+            mean_std_sleep_second=self.mean_std_cmt_sleep,
+            DOM_wait_second=self.DOM_wait_second,
+            scheduler=self.scheduler,
+            account=self.account
+        )
+        post_extractor.readiness.clickable(By.XPATH, CLOSE_BTN_XPATH).click()
+        return post_extractor.extract(metadata)
+
+    async def extract_post(self, metadata: PagePostMetadata):
+        return await self.in_browser(self.extract_in_browser, metadata)
+
+    async def parse(self, url: str):
+        metadatas, next_page_link = parse_timeline(await self.get(url), url)
+        self.logger.info("Located {0} posts".format(colors.bold(str(len(metadatas)))))
+        if len(metadatas) == 0:
+            self.report("empty")
+        await self.sleep()
+
+        data = []
+        for metadata in metadatas:
+            # If this post contains image(s), open it in a browser and crawl
+            if (
+                "image" in metadata.attachment_types
+                and not await self.in_thread(self.progress.propagated, metadata.post_url)
+            ):
+                post_data = await self.extract_post(metadata)
+                data.extend(post_data)
+                await self.in_thread(self.progress.add_history, metadata.post_url)
+
+        link = await self.in_thread(
+            follow_next_page,
+            self.progress, url, metadatas, next_page_link,
+            self.incremental, self.watermark_overlap_second
+        )
+        if link is None and next_page_link is not None:
+            self.logger.info(f"Reached the watermark of {colors.grey(page_key(url))}, not following older pages")
+        await self.in_thread(self.progress.enqueue, link)
+        return data
+
+
+class AsyncEngine:
+    """
+    The asyncio counterpart of `Engine`: every crawler is a task of a single
+    event loop, so dozens of pages are crawled at once by one thread that
+    spends its politeness delays awaiting instead of blocking. Browsers are
+    only launched for the pages that need them.
+    """
+    def __init__(
+        self,
+        crawler_type: Type[AsyncCrawler],
+        start_urls: Sequence[str],
+        data_pipeline: Pipeline,
+        progress_dir: str = "./progress",
+        progress: Progress | SharedProgress | None = None,
+        recrawl_start_urls: bool = False,
+        num_crawlers: int = 8,
+        num_browsers: int = 1,
+        max_connections: int = 32,
+        pipeline_workers: int = 1,
+        pipeline_queue_size: int = 16,
+        headless: bool = True,
+        name_format: str = "Crawler-{0}",
+        crawler_args=(), crawler_kwargs={}
+    ) -> None:
+        """
+        :param crawler_type: The type of crawler to use.
+        :param start_urls: The initial URLs to crawl.
+        :param data_pipeline: The pipeline to process crawled data.
+        :param progress_dir: The directory to store progress.
+        :param progress: A progress tracker to use instead of the one in `progress_dir`, eg. a `SharedProgress` for sharded crawling.
+        :param recrawl_start_urls: Walk the start URLs again even if crawled before, eg. for an incremental refresh.
+        :param num_crawlers: The number of crawlers multiplexed on the event loop.
+        :param num_browsers: The number of browsers shared by the crawlers, 0 for none.
+        :param max_connections: The size of the shared HTTP connection pool.
+        :param pipeline_workers: The number of threads running the data pipeline.
+        :param pipeline_queue_size: The number of crawled results waiting for the pipeline before crawlers block.
+        :param headless: Whether the browsers run headless.
+        :param name_format: The format for crawler names.
+        :param crawler_args: Additional arguments to pass to crawlers.
+        :param crawler_kwargs: Additional keyword arguments to pass to crawlers.
+        """
+        self.logger = Logger("AsyncEngine")
+        self.progress = progress \
+                        if progress is not None \
+                        else Progress(progress_dir)
+        queued_pages = {page_key(url) for url in self.progress.queue}
+        for url in (
+            set(start_urls)
+           .difference(self.progress.queue)
+        ):
+            # A walk left unfinished by the last run carries on instead
+            if page_key(url) in queued_pages \
+                if recrawl_start_urls \
+                else self.progress.propagated(url):
+                continue
+            self.progress.enqueue(url, "left")
+
+        self.termination_flag = threading.Event()
+        self.data_pipeline = data_pipeline
+        # Publish the output of pages committed before a crash, drop the rest
+        self.data_pipeline.recover(self.progress.committed)
+        self.pipeline_executor = PipelineExecutor(
+            data_pipeline,
+            num_workers=pipeline_workers,
+            queue_size=pipeline_queue_size
+        )
+
+        self.crawler_type = crawler_type
+        self.num_crawlers = num_crawlers
+        self.num_browsers = num_browsers
+        self.max_connections = max_connections
+        self.name_format = name_format
+        self.crawler_args = crawler_args
+        self.crawler_kwargs = crawler_kwargs
+        self.driver_pool = DriverPool(size=num_browsers, headless=headless) \
+                            if num_browsers > 0 \
+                            else None
+
+    def terminate(self):
+        self.logger.warning("Received SIGINT signal from Ctrl+C")
+        self.termination_flag.set()
+
+    async def main(self):
+        import aiohttp
+        loop = asyncio.get_running_loop()
+        try:
+            # Let crawlers finish their current page instead of cancelling them
+            loop.add_signal_handler(signal.SIGINT, self.terminate)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        browser_slots = asyncio.Semaphore(max(self.num_browsers, 1))
+        try:
+            crawlers = [
+                self.crawler_type(
+                    termination_event=self.termination_flag,
+                    progress=self.progress,
+                    data_pipeline=self.pipeline_executor,
+                    connector=connector,
+                    name=self.name_format.format(i+1),
+                    driver_pool=self.driver_pool,
+                    browser_slots=browser_slots,
+                    *self.crawler_args, **self.crawler_kwargs
+                )
+                for i in range(self.num_crawlers)
+            ]
+            await asyncio.gather(*(crawler.run() for crawler in crawlers))
+        finally:
+            await connector.close()
+
+    def run(self):
+        """
+        Runs all crawlers on a new event loop and waits for them to finish.
+        """
+        start = time.monotonic()
+        try:
+            if self.driver_pool is not None:
+                self.driver_pool.start()
+            asyncio.run(self.main())
+        except KeyboardInterrupt:
+            self.terminate()
+        finally:
+            try:
+                self.pipeline_executor.shutdown()
+            except:
+                self.logger.error(f"Failed to flush pipeline on termination:\n{traceback.format_exc()}")
+            self.logger.warning(f"Saving progress on termination after {time.monotonic() - start:.1f}s")
+            self.progress.save()
+            if self.driver_pool is not None:
+                self.driver_pool.close()
@@ -0,0 +1,63 @@
+"""
+Crawls many mbasic timelines from the local stand-in server with
+`AsyncEngine`, at several numbers of crawlers multiplexed on one event loop,
+reporting wall time and the CPU time the process actually used. Post pages
+are not opened (no browser), only the timeline chain is walked.
+
+    python -m benchmarks.bench_async_engine --pages 40 --depth 5
+"""
+from async_engine import AsyncEngine, AsyncFacebookPageCrawler
+from credentials import FacebookCookies
+from pipeline import Pipeline
+from benchmarks.fixtures import timeline_url
+from benchmarks.server import serve
+
+import argparse
+import logging
+import tempfile
+import pathlib
+import time
+
+
+class TimelineOnlyCrawler(AsyncFacebookPageCrawler):
+    async def extract_post(self, metadata):
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--sleep-ms", type=float, default=200)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with serve(latency_second=args.latency_ms / 1000, timeline_pages=args.depth) as server:
+        for num_crawlers in (1, 8, args.pages):
+            with tempfile.TemporaryDirectory() as tmp:
+                cookies_dir = pathlib.Path(tmp) / "cookies"
+                FacebookCookies(cookies_dir).save([{"name": "c_user", "value": "100000000000000"}])
+                engine = AsyncEngine(
+                    crawler_type=TimelineOnlyCrawler,
+                    start_urls=[server.base_url + timeline_url(f"page{i}", 0) for i in range(args.pages)],
+                    data_pipeline=Pipeline(),
+                    progress_dir=pathlib.Path(tmp) / "progress",
+                    num_crawlers=num_crawlers,
+                    num_browsers=0,
+                    crawler_kwargs=dict(
+                        cookies_dir=cookies_dir,
+                        mean_std_sleep_second=(args.sleep_ms / 1000, args.sleep_ms / 4000)
+                    )
+                )
+                wall, cpu = time.perf_counter(), time.process_time()
+                engine.run()
+                wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+                crawled = len(engine.progress.history.others)
+                assert crawled == args.pages * args.depth, f"crawled {crawled} timeline pages"
+                print(f"{num_crawlers:>4} crawlers: {crawled:>5} timeline pages  {wall:7.2f} s wall  {cpu:6.2f} s CPU  {crawled / wall:7.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
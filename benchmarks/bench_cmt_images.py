@@ -0,0 +1,90 @@
+"""
+Resolves the comment photos of an image-heavy post served by the local
+stand-in server: once through the browser (a `FakeDriver` tab per photo,
+loading it from the server, WebDriver calls charged a fixed latency) and
+once through `CommentImageResolver` (concurrent HTTP + lxml), and checks
+both yield the same records.
+
+The browser path also sleeps twice per photo; `--sleep-second` defaults to
+0 to compare the mechanics alone.
+
+    python -m benchmarks.bench_cmt_images --comments 120 --concurrency 8
+"""
+from extractor import FacebookPostExtractor
+from fetcher import CommentImageResolver
+from logger import Logger
+from benchmarks.fake_driver import FakeDriver
+from benchmarks.bench_fetcher import ServedPages, COOKIES
+from benchmarks.bench_extraction import METADATA
+from benchmarks.server import serve
+from benchmarks import fixtures
+
+import argparse
+import logging
+import time
+
+
+class PostPages(ServedPages):
+    """
+    Serves the post page itself, and every other URL from the stand-in server.
+    """
+    def __init__(self, post_html: str) -> None:
+        super().__init__()
+        self.post_html = post_html
+
+    def get(self, url: str, default: str | None = None):
+        if url == fixtures.POST_URL:
+            return self.post_html
+        return super().get(url, default)
+
+
+def run(html: str, resolver: CommentImageResolver | None, rpc_latency_second: float, sleep_second: float):
+    driver = FakeDriver(PostPages(html), fixtures.POST_URL, rpc_latency_second)
+    logger = Logger("Bench")
+    logger.setLevel(logging.WARNING)
+    extractor = FacebookPostExtractor(
+        chrome=driver,
+        logger=logger,
+        extraction="snapshot",
+        image_resolver=resolver,
+        mean_std_sleep_second=(sleep_second, 0),
+        DOM_wait_second=5
+    )
+    start = time.perf_counter()
+    data = extractor.extract(METADATA)
+    return data, time.perf_counter() - start, driver.rpc_count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comments", type=int, default=120)
+    parser.add_argument("--image-every", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--rpc-latency-ms", type=float, default=2.0)
+    parser.add_argument("--sleep-second", type=float, default=0)
+    args = parser.parse_args()
+
+    with serve(latency_second=args.latency_ms / 1000) as server:
+        html = fixtures.post_page(n_comments=args.comments, image_every=args.image_every)
+        html = html.replace("https://www.facebook.com/photo/", f"{server.base_url}/photo/")
+        n_photos = html.count("/photo/?fbid=")
+
+        resolver = CommentImageResolver(COOKIES, args.concurrency)
+        try:
+            results = {
+                "browser": run(html, None, args.rpc_latency_ms / 1000, args.sleep_second),
+                "http": run(html, resolver, args.rpc_latency_ms / 1000, args.sleep_second),
+                "http cached": run(html, resolver, args.rpc_latency_ms / 1000, args.sleep_second)
+            }
+        finally:
+            resolver.close()
+
+    if any(data != results["browser"][0] for data, _, _ in results.values()):
+        raise AssertionError("HTTP image resolution diverges from the browser path")
+    for name, (data, elapsed, rpc_count) in results.items():
+        print(f"{name:>12}: {n_photos:>4} photos  {rpc_count:>6} RPCs  {elapsed * 1000:>9.1f} ms  {elapsed / n_photos * 1000:7.1f} ms/photo")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Loads a record of a large `SaveAsCSV` file the way `preview.py` does on
+every rerun: `pd.read_csv` of the whole file versus a kept-open
+`CSVDataset` reading the displayed columns of one row. Also times indexing
+the file and a refresh after the crawl appended rows, and checks the rows
+read through the index against `pd.read_csv`.
+
+    python -m benchmarks.bench_dataset --rows 200000
+"""
+from dataset import CSVDataset
+from pipeline import SaveAsCSV
+from benchmarks.records import synthetic_records
+
+import pandas as pd
+import argparse
+import tempfile
+import pathlib
+import random
+import time
+
+COLUMNS = ["post_url", "text", "image_paths"]
+
+
+def records(n_rows: int, seed: int):
+    df = pd.DataFrame(synthetic_records(n_rows, seed=seed))
+    # Post texts span lines and hold quotes and commas
+    df["text"] = df["text"].str.replace(" ", '\n"quoted", ', n=1, regex=False)
+    df["image_paths"] = df["post_id"] + "_0.jpg   " + df["post_id"] + "_1.jpg"
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--appended", type=int, default=10_000)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp) / "page.csv"
+        sink = SaveAsCSV(path)
+        sink(records(args.rows, args.seed))
+        print(f"{args.rows} rows, {path.stat().st_size / 1e6:.0f} MB")
+
+        elapsed = time.perf_counter()
+        full = pd.read_csv(path, dtype=str, keep_default_na=False)
+        elapsed = time.perf_counter() - elapsed
+        print(f"{'read_csv per rerun':>22}: {elapsed * 1000:9.1f} ms")
+
+        elapsed = time.perf_counter()
+        dataset = CSVDataset(path)
+        elapsed = time.perf_counter() - elapsed
+        print(f"{'index once':>22}: {elapsed * 1000:9.1f} ms")
+        assert len(dataset) == len(full), f"{len(dataset)} rows indexed for {len(full)}"
+
+        indices = [rng.randrange(len(full)) for _ in range(args.reads)]
+        elapsed = time.perf_counter()
+        rows = [dataset.row(i, columns=COLUMNS) for i in indices]
+        elapsed = time.perf_counter() - elapsed
+        print(f"{'row per rerun':>22}: {elapsed / args.reads * 1000:9.3f} ms")
+        for i, row in zip(indices, rows):
+            assert row == full.loc[i, COLUMNS].to_dict(), f"row {i} differs"
+
+        sink(records(args.appended, args.seed + 1))
+        elapsed = time.perf_counter()
+        num_rows = dataset.refresh()
+        elapsed = time.perf_counter() - elapsed
+        print(f"{f'refresh +{args.appended} rows':>22}: {elapsed * 1000:9.1f} ms")
+        full = pd.read_csv(path, dtype=str, keep_default_na=False)
+        assert num_rows == len(full)
+        for i in (num_rows - args.appended, num_rows - 1):
+            assert dataset.row(i, columns=COLUMNS) == full.loc[i, COLUMNS].to_dict(), f"row {i} differs"
+        print("rows read through the index match read_csv")
+        dataset.close()
+
+
+if __name__ == "__main__":
+    main()
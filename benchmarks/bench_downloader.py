@@ -0,0 +1,68 @@
+"""
+Image download throughput against the local stand-in server: the old serial
+`requests.get` loop versus `ImageDownloader` at several pool sizes.
+
+    python -m benchmarks.bench_downloader --images 200 --latency-ms 50
+"""
+from downloader import ImageDownloader
+from benchmarks.server import serve
+
+import argparse
+import pathlib
+import requests
+import tempfile
+import time
+
+
+def serial(tasks: list[tuple[str, pathlib.Path]]):
+    for url, path in tasks:
+        img_data = requests.get(url).content
+        with open(path, "wb") as f:
+            f.write(img_data)
+
+
+def pooled(tasks: list[tuple[str, pathlib.Path]], num_workers: int):
+    downloader = ImageDownloader(num_workers=num_workers, backoff_second=0.01)
+    try:
+        downloader.download_all(tasks)
+    finally:
+        downloader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    with serve(latency_second=args.latency_ms / 1000, img_size=args.size) as server:
+        runs = [("serial", serial)] + [
+            (f"pool-{n}", lambda tasks, n=n: pooled(tasks, n))
+            for n in (4, 8, 16)
+        ]
+        for name, download in runs:
+            with tempfile.TemporaryDirectory() as tmp:
+                tasks = [
+                    (f"{server.base_url}/img/{name}-{i}.jpg?fail={int(i % 10 == 0)}", pathlib.Path(tmp) / f"{i}.jpg")
+                    for i in range(args.images)
+                ]
+                if name == "serial":
+                    # The old loop never retried, so spare it the flaky responses
+                    tasks = [(url.split("?")[0], path) for url, path in tasks]
+                start = time.perf_counter()
+                download(tasks)
+                elapsed = time.perf_counter() - start
+
+                # Everything is on disk now, so a re-run must not touch the network
+                rerun = "-"
+                if name != "serial":
+                    rerun_start = time.perf_counter()
+                    download(tasks)
+                    rerun = f"{(time.perf_counter() - rerun_start) * 1000:.1f} ms"
+            mb = args.images * args.size / 1e6
+            print(f"{name:>8}: {elapsed:7.2f} s  {mb / elapsed:7.1f} MB/s  {args.images / elapsed:7.1f} img/s  re-run {rerun}")
+
+
+if __name__ == "__main__":
+    main()
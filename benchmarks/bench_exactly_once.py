@@ -0,0 +1,215 @@
+"""
+Crawls a simulated site (chains of timeline pages, posts with comments, no
+browser) with `Engine`, injecting failures everywhere: `parse` raises before
+or after enqueueing the next page, a pipeline step raises after `SaveAsCSV`
+staged the rows, and the whole process is killed (SIGKILL) at random times
+and restarted until the crawl completes. Checks that the CSV then holds
+every record exactly once. Beforehand, checks that a page rolled back along
+with the page it depends on, while still being parsed, tracks nothing more.
+
+    python -m benchmarks.bench_exactly_once --pages 40 --depth 10 --kills 8
+    python -m benchmarks.bench_exactly_once --shared
+"""
+from engine import Engine
+from crawler import Crawler
+from pipeline import Pipeline, MicroBatch, SaveAsCSV
+from progress import Progress
+from work_queue import SharedProgress
+from transactions import TransactionAborted
+
+import multiprocessing
+import pandas as pd
+import argparse
+import tempfile
+import pathlib
+import logging
+import random
+import time
+
+
+class Flaky:
+    def __init__(self, failure_rate: float) -> None:
+        self.failure_rate = failure_rate
+
+    def __call__(self, df):
+        if random.random() < self.failure_rate:
+            raise RuntimeError("Injected pipeline failure")
+        return df
+
+
+class SimulatedCrawler(Crawler):
+    """
+    Timeline page `sim://page{i}/{d}` lists `posts` posts, each with
+    `comments` comments; posts of consecutive pages overlap by one.
+    """
+    def __init__(
+        self,
+        *args,
+        depth: int = 5,
+        posts: int = 4,
+        comments: int = 3,
+        failure_rate: float = 0.1,
+        parses_path: str = "parses.log",
+        **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.depth = depth
+        self.posts = posts
+        self.comments = comments
+        self.failure_rate = failure_rate
+        self.parses_path = parses_path
+
+    def start_driver(self):
+        pass
+
+    def stop_driver(self):
+        pass
+
+    def sleep(self, times: int = 1):
+        time.sleep(random.uniform(0, 0.1) * times)
+
+    def fail(self):
+        if random.random() < self.failure_rate:
+            raise RuntimeError("Injected parse failure")
+
+    def parse(self, url: str):
+        with open(self.parses_path, "a") as f:
+            f.write(url + "\n")
+        page, d = url.removeprefix("sim://").split("/")
+        d = int(d)
+        data = []
+        for k in range(self.posts):
+            post_id = f"{page}-{d * (self.posts - 1) + k}"
+            post_url = f"https://facebook.com/{post_id}"
+            if self.progress.propagated(post_url):
+                continue
+            self.fail()
+            data.append({"post_id": post_id, "cmt_id": "", "type": "post", "text": post_url})
+            data.extend(
+                {"post_id": post_id, "cmt_id": str(c), "type": "comment", "text": "x"}
+                for c in range(self.comments)
+            )
+            self.progress.add_history(post_url)
+        if d + 1 < self.depth:
+            self.progress.enqueue(f"sim://{page}/{d + 1}")
+        self.fail()
+        return data
+
+
+def expected_keys(pages: int, depth: int, posts: int, comments: int):
+    return {
+        (f"page{i}-{n}", cmt_id)
+        for i in range(pages)
+        for n in range(depth * (posts - 1) + 1)
+        for cmt_id in ("", *map(str, range(comments)))
+    }
+
+
+def shared_progress(tmp: pathlib.Path):
+    # The leases of a killed run expire quickly for the next one
+    return SharedProgress(tmp / "progress" / "queue.sqlite", visibility_timeout_second=2, idle_wait_second=3, poll_second=0.2)
+
+
+def check_cascaded_rollback(progress: Progress | SharedProgress):
+    progress.enqueue("sim://page0/0")
+    with progress.transaction() as parent:
+        progress.next_url(worker="Crawler-1")
+        progress.enqueue("sim://page0/1")
+    post_url = "https://facebook.com/page0-3"
+    try:
+        with progress.transaction():
+            progress.next_url(worker="Crawler-1")
+            # The pipeline fails on the parent's records meanwhile
+            parent.rollback()
+            progress.add_history(post_url)
+        raise AssertionError("add_history on a rolled back page did not raise")
+    except TransactionAborted:
+        pass
+    assert not progress.propagated(post_url), "the rolled back page left its history pending"
+    url = progress.next_url(worker="Crawler-1")
+    assert url == "sim://page0/0", f"{url} queued instead of the rolled back parent"
+    assert progress.remaining_num("Crawler-1") == 0, "the rolled back page left its URLs queued"
+
+
+def crawl(tmp: str, args: argparse.Namespace, seed: int):
+    random.seed(seed)
+    logging.disable(logging.CRITICAL)
+    tmp = pathlib.Path(tmp)
+    steps = [SaveAsCSV(tmp / "records.csv"), Flaky(args.pipeline_failure_rate)]
+    engine = Engine(
+        crawler_type=SimulatedCrawler,
+        start_urls=[f"sim://page{i}/0" for i in range(args.pages)],
+        data_pipeline=Pipeline(
+            *steps,
+            batch=MicroBatch(max_rows=args.batch_rows) if args.batch_rows > 0 else None
+        ),
+        progress_dir=tmp / "progress",
+        progress=shared_progress(tmp) if args.shared else None,
+        num_crawlers=args.crawlers,
+        warm_drivers=False,
+        crawler_kwargs=dict(
+            depth=args.depth,
+            failure_rate=args.parse_failure_rate,
+            parses_path=tmp / "parses.log"
+        )
+    )
+    engine.run()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--depth", type=int, default=10)
+    parser.add_argument("--crawlers", type=int, default=4)
+    parser.add_argument("--kills", type=int, default=8, help="Times the crawl is killed before being let to finish")
+    parser.add_argument("--batch-rows", type=int, default=40, help="MicroBatch size, 0 for none")
+    parser.add_argument("--parse-failure-rate", type=float, default=0.05)
+    parser.add_argument("--pipeline-failure-rate", type=float, default=0.1)
+    parser.add_argument("--shared", action="store_true", help="Use a SharedProgress")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        check_cascaded_rollback(Progress(pathlib.Path(tmp) / "progress"))
+        shared = SharedProgress(pathlib.Path(tmp) / "queue.sqlite", idle_wait_second=0)
+        check_cascaded_rollback(shared)
+        shared.close()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        runs, kills = 0, 0
+        while True:
+            runs += 1
+            process = multiprocessing.Process(target=crawl, args=(tmp, args, args.seed + runs))
+            process.start()
+            process.join(rng.uniform(1, 3) if kills < args.kills else None)
+            if process.is_alive():
+                process.kill()
+                process.join()
+                kills += 1
+                continue
+            # A run gives up after repeated failures, start another one
+            remaining = len(shared_progress(pathlib.Path(tmp)).queue) \
+                        if args.shared \
+                        else len((pathlib.Path(tmp) / "progress" / "queue.txt").read_text().split())
+            if remaining == 0:
+                break
+
+        df = pd.read_csv(pathlib.Path(tmp) / "records.csv", dtype=str, keep_default_na=False)
+        keys = list(zip(df["post_id"], df["cmt_id"]))
+        expected = expected_keys(args.pages, args.depth, 4, 3)
+        duplicates = len(keys) - len(set(keys))
+        missing = len(expected - set(keys))
+        with open(pathlib.Path(tmp) / "parses.log") as f:
+            parses = sum(1 for _ in f)
+
+        print(
+            f"{runs} runs ({kills} killed): {len(keys)} rows for {len(expected)} records, "
+            f"{duplicates} duplicated, {missing} missing; "
+            f"{parses} parses for {args.pages * args.depth} timeline pages"
+        )
+        assert duplicates == 0 and missing == 0
+
+
+if __name__ == "__main__":
+    main()
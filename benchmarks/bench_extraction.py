@@ -0,0 +1,130 @@
+"""
+Compares the per-element WebDriver extraction against the snapshot and the
+bulk script paths on the recorded post fixture, charging every chromedriver
+call a fixed latency. The fake driver answers the extraction scripts with
+lxml stand-ins mirroring them.
+
+    python -m benchmarks.bench_extraction --rpc-latency-ms 2
+"""
+from extractor import (
+    FacebookPostExtractor, EXPAND_COMMENTS_SCRIPT, COLLECT_COMMENTS_SCRIPT,
+    SEE_MORE_XPATH, inner_html
+)
+from logger import Logger
+from benchmarks.fake_driver import FakeDriver, css_to_xpath
+from benchmarks import fixtures
+from lxml.html import HtmlElement
+
+from types import SimpleNamespace
+from urllib.parse import urljoin
+from datetime import datetime
+import argparse
+import logging
+import time
+
+METADATA = SimpleNamespace(
+    page_id="BeatvnNow",
+    post_id="804109268529640",
+    post_url=fixtures.POST_URL,
+    date=datetime(2024, 6, 1, 8, 30)
+)
+
+
+def expand_comments(root: HtmlElement, selector: str):
+    return len(root.xpath(f"{css_to_xpath(selector)}//{SEE_MORE_XPATH}"))
+
+
+def collect_comments(
+    root: HtmlElement,
+    selector: str,
+    url_class: str,
+    attachment_class: str,
+    text_class: str,
+    img_class: str,
+    probes: list[tuple[str, str, str]]
+):
+    def href(element: HtmlElement | None):
+        return urljoin(fixtures.POST_URL, element.get("href")) if element is not None else None
+
+    def attachment_type(attachment: HtmlElement | None):
+        if attachment is None or attachment.get("class") != attachment_class:
+            return "no attachment"
+        for name, tag, cls in probes:
+            if attachment.xpath(f".//{tag}[@class='{cls}']"):
+                return name
+        return "image" if attachment.xpath(css_to_xpath(f"img.{img_class}")) else "unknown"
+
+    results = []
+    for comment in root.xpath(css_to_xpath(selector)):
+        divs = comment.xpath("div")
+        url_div = next((div for div in divs if div.get("class") == url_class), None)
+        kind = attachment_type(divs[1] if len(divs) > 1 else None)
+
+        text = comment
+        for _ in range(6 if kind == "no attachment" else 4):
+            text = text.find(".//div") if text is not None else None
+        text = text.xpath("*")[-1] if text is not None and len(text) else None
+        if text is None or text.get("class") != text_class:
+            results.append(None)
+            continue
+
+        image = None
+        if kind == "image":
+            box = comment.xpath(css_to_xpath("div." + ".".join(attachment_class.split())))
+            img = box[0].xpath(css_to_xpath(f"img.{img_class}")) if box else []
+            image = href(img[0].getparent()) if img else None
+        results.append({
+            "url": href(url_div.find(".//a")) if url_div is not None else None,
+            "attachment": kind,
+            "text": inner_html(text),
+            "image": image
+        })
+    return results
+
+
+SCRIPTS = {
+    EXPAND_COMMENTS_SCRIPT: expand_comments,
+    COLLECT_COMMENTS_SCRIPT: collect_comments
+}
+
+
+def run(extraction: str, html: str, rpc_latency_second: float):
+    pages = {fixtures.POST_URL: html, **fixtures.photo_pages(html)}
+    driver = FakeDriver(pages, fixtures.POST_URL, rpc_latency_second, SCRIPTS)
+    logger = Logger("Bench")
+    logger.setLevel(logging.WARNING)
+    extractor = FacebookPostExtractor(
+        chrome=driver,
+        logger=logger,
+        extraction=extraction,
+        mean_std_sleep_second=(0, 0),
+        DOM_wait_second=0
+    )
+
+    start = time.perf_counter()
+    data = extractor.extract(METADATA)
+    elapsed = time.perf_counter() - start
+    return data, elapsed, driver.rpc_count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixture", default="post.html")
+    parser.add_argument("--rpc-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    html = fixtures.load(args.fixture)
+    results = {
+        extraction: run(extraction, html, args.rpc_latency_ms / 1000)
+        for extraction in ("webdriver", "snapshot", "script")
+    }
+    for extraction in ("snapshot", "script"):
+        if results["webdriver"][0] != results[extraction][0]:
+            raise AssertionError(f"{extraction.capitalize()} extraction diverges from the WebDriver path")
+
+    for extraction, (data, elapsed, rpc_count) in results.items():
+        print(f"{extraction:>10}: {len(data):>4} records  {rpc_count:>6} RPCs  {elapsed*1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
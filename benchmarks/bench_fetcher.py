@@ -0,0 +1,123 @@
+"""
+Walks a chain of mbasic timeline pages served by the local stand-in server,
+once through `MbasicFetcher` (HTTP + lxml) and once through the browser path
+(`FakeDriver` loading the same responses, WebDriver calls charged a fixed
+latency), and checks both yield the same post metadata and next links.
+Before that, checks both constructors of `PagePostMetadata` agree on the
+shared and album post shapes, which the served timelines do not have.
+
+    python -m benchmarks.bench_fetcher --pages 20 --rpc-latency-ms 2
+"""
+from crawler import FacebookPageCrawler
+from post import PagePostMetadata
+from readiness import Readiness
+from fetcher import MbasicFetcher
+from benchmarks.fake_driver import FakeDriver
+from benchmarks.fixtures import timeline_url, timeline_variants_page
+from benchmarks.server import serve
+
+from selenium.webdriver.common.by import By
+from types import SimpleNamespace
+import lxml.html
+import argparse
+import requests
+import time
+
+COOKIES = [{"name": "c_user", "value": "100000000000000"}, {"name": "xs", "value": "0"}]
+
+
+class ServedPages:
+    """
+    `FakeDriver` page mapping that loads every URL from the stand-in server.
+    """
+    def __init__(self) -> None:
+        self.session = requests.Session()
+        for cookie in COOKIES:
+            self.session.cookies.set(cookie["name"], cookie["value"])
+
+    def get(self, url: str, default: str | None = None):
+        if not url.startswith("http"):
+            return default
+        return self.session.get(url).text
+
+
+def walk(fetch_timeline, start_url: str, n_pages: int):
+    posts, next_links = [], []
+    url = start_url
+    for _ in range(n_pages):
+        metadatas, url = fetch_timeline(url)
+        posts.extend(metadata.to_json() for metadata in metadatas)
+        next_links.append(url)
+    return posts, next_links
+
+
+def http(start_url: str, n_pages: int):
+    fetcher = MbasicFetcher(COOKIES)
+    try:
+        return walk(fetcher.fetch_timeline, start_url, n_pages), 0
+    finally:
+        fetcher.close()
+
+
+def browser(start_url: str, n_pages: int, rpc_latency_second: float):
+    driver = FakeDriver(ServedPages(), "about:blank", rpc_latency_second)
+    readiness = Readiness(driver)
+    crawler = SimpleNamespace(name="Bench", chrome=driver, wait_DOM=readiness.element, sleep=lambda: None)
+    return walk(lambda url: FacebookPageCrawler.parse_timeline(crawler, url), start_url, n_pages), driver.rpc_count
+
+
+def check_variants():
+    url = "https://mbasic.facebook.com" + timeline_url("BeatvnNow", 0)
+    html = timeline_variants_page()
+    driver = FakeDriver({url: html}, url)
+    posts = driver.find_element(By.ID, "structured_composer_async_container").find_elements(By.XPATH, "section/article")
+    root = lxml.html.fromstring(html)
+    root.make_links_absolute(url, resolve_base_href=False)
+    articles = root.xpath("//*[@id='structured_composer_async_container']/section/article")
+
+    webdriver_posts = [PagePostMetadata(post).to_json() for post in posts]
+    html_posts = [PagePostMetadata.from_html(post).to_json() for post in articles]
+    if webdriver_posts != html_posts:
+        raise AssertionError("PagePostMetadata.from_html diverges from the WebDriver constructor")
+    if [post["attachment_types"] for post in html_posts][1::2] != [["shared post"], ["image"]] \
+        or html_posts[3]["page_id"] != "BeatvnAlbums":
+        raise AssertionError("Shared or album post parsed from outside the post")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--posts", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--rpc-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    check_variants()
+    with serve(
+        latency_second=args.latency_ms / 1000,
+        # One page more than walked: the browser path expects a next link
+        timeline_pages=args.pages + 1,
+        timeline_posts=args.posts
+    ) as server:
+        start_url = server.base_url + timeline_url("BeatvnNow", 0)
+        results = {}
+        for name, run in (
+            ("browser", lambda: browser(start_url, args.pages, args.rpc_latency_ms / 1000)),
+            ("http", lambda: http(start_url, args.pages))
+        ):
+            start = time.perf_counter()
+            (posts, next_links), rpc_count = run()
+            results[name] = (posts, next_links, rpc_count, time.perf_counter() - start)
+
+    browser_posts, browser_links = results["browser"][:2]
+    http_posts, http_links = results["http"][:2]
+    # Post dates are parsed from absolute timestamps, so they compare exactly
+    if browser_posts != http_posts or browser_links != http_links:
+        raise AssertionError("HTTP timeline parsing diverges from the browser path")
+
+    for name, (posts, _, rpc_count, elapsed) in results.items():
+        print(f"{name:>8}: {len(posts):>4} posts  {rpc_count:>6} RPCs  {elapsed*1000:>9.1f} ms  {elapsed / args.pages * 1000:7.1f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Resident memory per entry, lookup latency and cold-load time of the history
+store: the old `set` of URL strings loaded from text versus `HistoryIndex`.
+Each store is measured in a fresh process; its memory is the growth of the
+process's resident set over loading it and running the lookups, so pages of
+a memory-mapped array count once the lookups have faulted them in.
+
+    python -m benchmarks.bench_history --entries 100000 1000000
+"""
+from history import HistoryIndex, ID_URL_FORMAT
+
+import multiprocessing
+import argparse
+import pathlib
+import tempfile
+import random
+import time
+import os
+
+
+def resident_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def lookup_ns(history, urls: list[str]):
+    start = time.perf_counter()
+    for url in urls:
+        url in history
+    return (time.perf_counter() - start) / len(urls) * 1e9
+
+
+def load(store: str, tmp: pathlib.Path):
+    if store == "set[str]":
+        with open(tmp / "history.txt") as f:
+            return set(f.read().split())
+    index = HistoryIndex()
+    index.load(tmp / "history.npy", tmp / "others.txt", mmap=store == "index/mmap")
+    return index
+
+
+def measure(store: str, tmp: pathlib.Path, hits: list[str], misses: list[str], results: multiprocessing.Queue):
+    base = resident_bytes()
+    start = time.perf_counter()
+    history = load(store, tmp)
+    elapsed = time.perf_counter() - start
+    hit, miss = lookup_ns(history, hits), lookup_ns(history, misses)
+    results.put((elapsed, hit, miss, resident_bytes() - base))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    # A fresh interpreter per store, so memory freed by another is not reused
+    context = multiprocessing.get_context("spawn")
+    rng = random.Random(0)
+    for n in args.entries:
+        ids = rng.sample(range(10**15, 10**15 + 50 * n), n)
+        urls = [ID_URL_FORMAT.format(i) for i in ids]
+        hits = rng.sample(urls, min(args.lookups, n))
+        misses = [ID_URL_FORMAT.format(10**15 + 50 * n + i) for i in range(args.lookups)]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = pathlib.Path(tmp)
+            (tmp / "history.txt").write_text("\n".join(urls))
+            index = HistoryIndex()
+            index.update(urls)
+            index.save(tmp / "history.npy", tmp / "others.txt")
+            del index
+
+            print(f"{n:,} entries")
+            for store in ("set[str]", "index/mmap", "index/ram"):
+                results = context.Queue()
+                process = context.Process(target=measure, args=(store, tmp, hits, misses, results))
+                process.start()
+                cold_load, hit, miss, memory = results.get()
+                process.join()
+                print(
+                    f"  {store:>12}: {memory / n:7.1f} B/entry resident   load {cold_load * 1000:8.1f} ms"
+                    f"   hit {hit:7.0f} ns   miss {miss:7.0f} ns"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+A daily refresh of many page timelines from the local stand-in server: a
+first `AsyncEngine` run walks every timeline, then new posts are published
+and the refresh is run twice from the same progress, walking every timeline
+again as before and with `incremental=True`, which stops at the page
+watermarks. Reports timeline pages fetched and wall time, and checks both
+refreshes found the same posts.
+
+    python -m benchmarks.bench_incremental --pages 100 --depth 20 --new-posts 4
+"""
+from async_engine import AsyncEngine
+from credentials import FacebookCookies
+from pipeline import Pipeline
+from benchmarks.bench_async_engine import TimelineOnlyCrawler
+from benchmarks.fixtures import timeline_url
+from benchmarks.server import serve
+
+from datetime import datetime
+import argparse
+import logging
+import tempfile
+import pathlib
+import shutil
+import time
+
+
+def crawl(server, progress_dir: pathlib.Path, cookies_dir: pathlib.Path, args: argparse.Namespace, **kwargs):
+    engine = AsyncEngine(
+        crawler_type=TimelineOnlyCrawler,
+        start_urls=[server.base_url + timeline_url(f"page{i}", 0) for i in range(args.pages)],
+        data_pipeline=Pipeline(),
+        progress_dir=progress_dir,
+        num_crawlers=args.crawlers,
+        num_browsers=0,
+        recrawl_start_urls=kwargs.pop("recrawl_start_urls", False),
+        crawler_kwargs=dict(
+            cookies_dir=cookies_dir,
+            mean_std_sleep_second=(args.sleep_ms / 1000, args.sleep_ms / 4000),
+            **kwargs
+        )
+    )
+    server.hits.clear()
+    wall = time.perf_counter()
+    engine.run()
+    wall = time.perf_counter() - wall
+    fetched = sum(hits for path, hits in server.hits.items() if path.startswith("/page"))
+    return engine.progress, fetched, wall
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--depth", type=int, default=20)
+    parser.add_argument("--new-posts", type=int, default=4, help="Posts published between the runs, one every 6 hours")
+    parser.add_argument("--overlap-hours", type=float, default=24)
+    parser.add_argument("--crawlers", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--sleep-ms", type=float, default=100)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with serve(latency_second=args.latency_ms / 1000, timeline_pages=args.depth) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        cookies_dir = tmp / "cookies"
+        FacebookCookies(cookies_dir).save([{"name": "c_user", "value": "100000000000000"}])
+        server.timeline_newest = datetime(2024, 6, 1, 12, 0)
+
+        _, fetched, wall = crawl(server, tmp / "first", cookies_dir, args)
+        print(f"{'first run':>20}: {fetched:>6} timeline pages  {wall:7.2f} s")
+
+        server.timeline_new_posts = args.new_posts
+        histories = []
+        for name, incremental in (("full refresh", False), ("incremental refresh", True)):
+            progress_dir = tmp / name.replace(" ", "-")
+            shutil.copytree(tmp / "first", progress_dir)
+            progress, fetched, wall = crawl(
+                server, progress_dir, cookies_dir, args,
+                recrawl_start_urls=True,
+                incremental=incremental,
+                watermark_overlap_second=args.overlap_hours * 3600
+            )
+            histories.append({url for url in progress.history if url.startswith("https://facebook.com/")})
+            print(f"{name:>20}: {fetched:>6} timeline pages  {wall:7.2f} s")
+        assert histories[0] == histories[1], "the refreshes found different posts"
+        print(f"both refreshes recorded the same {len(histories[0])} posts")
+
+
+if __name__ == "__main__":
+    main()
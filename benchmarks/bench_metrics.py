@@ -0,0 +1,51 @@
+"""
+Cost of the metrics layer per recorded event, disabled versus enabled, and
+the per-stage breakdown it produces for one post extraction on the recorded
+fixture (`FakeDriver`, fixed latency per WebDriver call).
+
+    python -m benchmarks.bench_metrics
+"""
+from metrics import REGISTRY, STAGE_SECONDS, PAGES
+from benchmarks import bench_extraction, fixtures
+import metrics
+
+import argparse
+import json
+import time
+
+
+def overhead(n: int):
+    start = time.perf_counter()
+    for _ in range(n):
+        with STAGE_SECONDS.time(crawler="Crawler-1", stage="sleep"):
+            pass
+        PAGES.inc(crawler="Crawler-1", outcome="success")
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--rpc-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for _ in range(args.events):
+        pass
+    baseline = (time.perf_counter() - start) / args.events
+
+    metrics.enable(False)
+    disabled = overhead(args.events) - baseline
+    metrics.enable(True)
+    enabled = overhead(args.events) - baseline
+    print(f"timer + counter per event: disabled {disabled * 1e9:7.0f} ns   enabled {enabled * 1e9:7.0f} ns")
+
+    STAGE_SECONDS.values.clear()
+    html = fixtures.load("post.html")
+    for extraction in ("webdriver", "snapshot"):
+        bench_extraction.run(extraction, html, args.rpc_latency_ms / 1000)
+    print(json.dumps(REGISTRY.summary()["crawler_stage_seconds"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Simulates hours of crawling against a rate-limited server on a simulated
+clock: the fixed `np.random.normal(6, 1)` sleeps versus the AIMD
+`PolitenessScheduler`, for servers tolerating different request rates.
+
+Before the runs, checks on a simulated clock that a checkpoint pauses an
+account for exactly `checkpoint_pause_second`, whatever the rate cut.
+
+The server answers an error when an account exceeds `limit` requests in the
+last minute, and a checkpoint after too many errors in ten minutes.
+
+    python -m benchmarks.bench_politeness --hours 6
+"""
+from politeness import PolitenessScheduler, SimulatedClock
+
+from collections import deque, Counter
+import numpy as np
+import argparse
+
+
+class RateLimitedServer:
+    def __init__(self, clock: SimulatedClock, limit_per_minute: int, checkpoint_errors: int = 10) -> None:
+        self.clock = clock
+        self.limit_per_minute = limit_per_minute
+        self.checkpoint_errors = checkpoint_errors
+        self.requests = deque()
+        self.errors = deque()
+
+    def request(self):
+        now = self.clock.now()
+        for window, span in ((self.requests, 60), (self.errors, 600)):
+            while window and window[0] <= now - span:
+                window.popleft()
+
+        self.requests.append(now)
+        if len(self.requests) <= self.limit_per_minute:
+            return "success"
+        self.errors.append(now)
+        if len(self.errors) >= self.checkpoint_errors:
+            self.errors.clear()
+            return "checkpoint"
+        return "error"
+
+
+def fixed(server: RateLimitedServer, clock: SimulatedClock, duration: float, seed: int):
+    rng = np.random.default_rng(seed)
+    outcomes = Counter()
+    while clock.now() < duration:
+        outcome = server.request()
+        outcomes[outcome] += 1
+        # A checkpoint costs the same pause as under the scheduler
+        if outcome == "checkpoint":
+            clock.sleep(1800)
+        clock.sleep(float(np.clip(rng.normal(6, 1), 0, 9)))
+    return outcomes
+
+
+def adaptive(server: RateLimitedServer, clock: SimulatedClock, duration: float, seed: int):
+    scheduler = PolitenessScheduler(clock=clock, seed=seed)
+    outcomes = Counter()
+    while clock.now() < duration:
+        scheduler.acquire("account")
+        outcome = server.request()
+        outcomes[outcome] += 1
+        scheduler.report("account", outcome)
+    return outcomes
+
+
+def check_checkpoint_pause():
+    for pause in (60, 1800):
+        clock = SimulatedClock()
+        scheduler = PolitenessScheduler(checkpoint_pause_second=pause, jitter=0, clock=clock)
+        scheduler.acquire("account")
+        scheduler.report("account", "checkpoint")
+        delay = scheduler.delay("account")
+        assert abs(delay - pause) < 1e-6, f"checkpoint paused the account {delay:.0f}s instead of {pause}s"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    duration = args.hours * 3600
+
+    check_checkpoint_pause()
+
+    for limit in (6, 10, 20):
+        for name, run in (("fixed", fixed), ("adaptive", adaptive)):
+            clock = SimulatedClock()
+            outcomes = run(RateLimitedServer(clock, limit), clock, duration, args.seed)
+            print(
+                f"limit {limit:>2}/min {name:>9}: {outcomes['success'] / (clock.now() / 60):6.2f} pages/min  "
+                f"{outcomes['error']:>5} errors  {outcomes['checkpoint']:>3} checkpoints"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Per-operation persistence cost of the Progress journal at several fsync
+batch sizes, plus replay (cold start) time of the resulting journal.
+
+    python -m benchmarks.bench_progress --ops 20000
+"""
+from progress import Progress
+
+import argparse
+import tempfile
+import time
+
+
+def workload(progress: Progress, n_ops: int):
+    # Timeline pages: enqueue the next page, pop it, record the posts found
+    for i in range(n_ops // 3):
+        progress.enqueue(f"https://mbasic.facebook.com/BeatvnNow?v=timeline&cursor={i}")
+        progress.next_url()
+        progress.add_history(f"https://facebook.com/{10**15 + i}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=30_000)
+    args = parser.parse_args()
+
+    for fsync_every in (1, 64, 1024, None):
+        with tempfile.TemporaryDirectory() as tmp:
+            progress = Progress(
+                tmp,
+                fsync_every=fsync_every or 2**62,
+                fsync_interval_second=1.0 if fsync_every else float("inf"),
+                compact_every=2**62
+            )
+            start = time.perf_counter()
+            workload(progress, args.ops)
+            elapsed = time.perf_counter() - start
+
+            start = time.perf_counter()
+            replayed = Progress(tmp)
+            cold_load = time.perf_counter() - start
+            assert set(replayed.history) == set(progress.history) and replayed.queue == progress.queue
+
+            label = f"fsync/{fsync_every}" if fsync_every else "no fsync"
+            print(f"{label:>12}: {elapsed / args.ops * 1e6:8.2f} us/op   replay {replayed.journal_entries} entries in {cold_load * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Counts the dead time lookups for absent elements would cost on a real
+driver: with the old driver-wide implicit wait every failing lookup polls
+for the whole `DOM_wait_second`, with `Readiness` it returns at once. The
+fake driver charges each failing lookup the implicit wait in effect instead
+of sleeping through it.
+
+    python -m benchmarks.bench_readiness --dom-wait-second 60
+"""
+from extractor import FacebookPostExtractor
+from crawler import FacebookPageCrawler
+from readiness import Readiness
+from logger import Logger
+from benchmarks.fake_driver import FakeDriver
+from benchmarks.bench_extraction import METADATA
+from benchmarks import fixtures
+
+from types import SimpleNamespace
+import argparse
+import logging
+
+
+def extract_post(html: str, implicit_wait_second: float, dom_wait_second: float):
+    driver = FakeDriver({fixtures.POST_URL: html, **fixtures.photo_pages(html)}, fixtures.POST_URL)
+    logger = Logger("Bench")
+    logger.setLevel(logging.WARNING)
+    extractor = FacebookPostExtractor(
+        chrome=driver,
+        logger=logger,
+        mean_std_sleep_second=(0, 0),
+        DOM_wait_second=dom_wait_second
+    )
+    driver.implicitly_wait(implicit_wait_second)
+    extractor.extract(METADATA)
+    return driver
+
+
+def show_mode(html: str, implicit_wait_second: float, dom_wait_second: float):
+    driver = FakeDriver({fixtures.POST_URL: html}, fixtures.POST_URL)
+    crawler = SimpleNamespace(chrome=driver, readiness=Readiness(driver, dom_wait_second), mean_std_sleep_second=(6, 1))
+    driver.implicitly_wait(implicit_wait_second)
+    FacebookPageCrawler.cmt_show_mode(crawler)
+    return driver
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dom-wait-second", type=float, default=60)
+    args = parser.parse_args()
+
+    scenarios = (
+        ("post with comments", extract_post, fixtures.load("post.html")),
+        ("post without comments", extract_post, fixtures.post_page(n_comments=0)),
+        ("post without sort button", show_mode, '<html><body><div class="x78zum5 x1n2onr6 x1nhvcw1"></div></body></html>')
+    )
+    for name, run, html in scenarios:
+        # The implicit wait `wait_DOM` used to leave on the driver, then none
+        implicit = run(html, args.dom_wait_second, args.dom_wait_second)
+        explicit = run(html, 0, args.dom_wait_second)
+        print(
+            f"{name:>25}: implicit wait {implicit.dead_time_second:7.1f} s dead  "
+            f"readiness {explicit.dead_time_second:7.1f} s dead  ({explicit.rpc_count} RPCs)"
+        )
+
+
+if __name__ == "__main__":
+    main()
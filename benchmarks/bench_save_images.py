@@ -0,0 +1,77 @@
+"""
+Cost curve of `SaveImages.__call__` name resolution (downloads excluded),
+old per-row `df.loc` scan versus the vectorized mapping.
+
+    python -m benchmarks.bench_save_images --rows 1000 10000 100000
+"""
+from pipeline import SaveImages, AsDataFrame
+from downloader import ImageDownloader
+from benchmarks.records import synthetic_records
+
+import argparse
+import tempfile
+import time
+
+
+class NullDownloader(ImageDownloader):
+    """
+    Resolves the task list but performs no I/O, isolating the stage's own cost.
+    """
+    def download_all(self, tasks):
+        self.tasks = list(tasks)
+
+
+def legacy_call(save_images: SaveImages, df):
+    if not df.empty:
+        is_post = df["type"] == "post"
+
+    tasks = []
+    for tp in df.itertuples():
+        post_img = df.loc[(df["post_id"] == tp.post_id) & is_post, "images"].values[0]
+
+        img_files = []
+        imgs = tp.images.split()
+        for i, url in enumerate(imgs):
+            img_file = save_images.img_name(
+                post_id=tp.post_id,
+                cmt_id=tp.cmt_id \
+                        if tp.images != post_img \
+                        else "",
+                ordinal=i
+            )
+            tasks.append((url, save_images.save_dir / img_file))
+            img_files.append(img_file)
+        df.loc[tp.Index, "image_paths"] = "   ".join(img_files)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--legacy-max-rows", type=int, default=10_000, help="The old path is quadratic; skip it above this size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        save_images = SaveImages(tmp)
+        save_images.downloader = NullDownloader(num_workers=1)
+
+        for n_rows in args.rows:
+            df = AsDataFrame()(synthetic_records(n_rows))
+
+            start = time.perf_counter()
+            new = save_images(df.copy())
+            vectorized = time.perf_counter() - start
+
+            legacy = "skipped"
+            if n_rows <= args.legacy_max_rows:
+                start = time.perf_counter()
+                old = legacy_call(save_images, df.copy())
+                legacy = f"{time.perf_counter() - start:9.3f} s"
+                if not old["image_paths"].equals(new["image_paths"]):
+                    raise AssertionError("Vectorized image_paths diverge from the old path")
+
+            print(f"{n_rows:>8} rows: vectorized {vectorized:9.3f} s   legacy {legacy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Simulates an hour of crawling many page timelines on a simulated clock: the
+single FIFO queue `Progress` used to be versus the per-page `PageQueue`.
+
+Each page has a timeline of `depth` cursor pages, a number of posts per
+timeline page, a posting rate and an error rate; a few pages mostly fail
+(checkpoints, removed pages). A crawler spends `fetch` seconds on the
+timeline page, when the next cursor link is enqueued, then time per post.
+A failed page goes back to the front of the queue. Switching a crawler to
+another page costs `switch` seconds (a cold session on that page).
+
+Reports pages reached, posts and posts under a day old per hour, and how
+often two crawlers worked the same page's cursor chain at once.
+
+    python -m benchmarks.bench_scheduler --pages 500 --crawlers 8
+"""
+from page_queue import PageQueue
+from politeness import SimulatedClock
+from work_queue import page_key
+
+from collections import deque
+import numpy as np
+import argparse
+import heapq
+
+
+class FifoQueue:
+    """
+    The former `Progress` queue.
+    """
+    def __init__(self, urls) -> None:
+        self.queue = deque(urls)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def append(self, url: str):
+        self.queue.append(url)
+
+    def appendleft(self, url: str):
+        self.queue.appendleft(url)
+
+    def pop(self, worker):
+        return self.queue.popleft()
+
+    def record(self, url: str, records: int, failed: bool = False):
+        pass
+
+    def fresh(self, key: str, timestamp: float):
+        pass
+
+
+def make_pages(n: int, rng: np.random.Generator):
+    return [
+        dict(
+            depth=int(rng.integers(5, 40)),
+            posts=max(int(rng.lognormal(1.5, 0.8)), 1),
+            # Hours between posts, and age of the newest one
+            spacing=float(rng.lognormal(1.5, 1.2)),
+            age=float(rng.exponential(24)),
+            error_rate=0.6 if rng.random() < 0.1 else 0.02
+        )
+        for _ in range(n)
+    ]
+
+
+def url(i: int, d: int):
+    return f"https://mbasic.facebook.com/page{i}?cursor={d}"
+
+
+def parse_url(url: str):
+    path, cursor = url.removeprefix("https://mbasic.facebook.com/page").split("?cursor=")
+    return int(path), int(cursor)
+
+
+def simulate(queue, pages: list[dict], args: argparse.Namespace, clock: SimulatedClock, seed: int):
+    rng = np.random.default_rng(seed)
+    events = [(0.0, k, "free", k, None) for k in range(args.crawlers)]
+    seq = args.crawlers
+    idle, last_page, working = set(), {}, {}
+    reached, posts, fresh_posts, switches, shared = set(), 0, 0, 0, 0
+
+    while events:
+        t, _, kind, crawler, data = heapq.heappop(events)
+        if t > args.hours * 3600:
+            break
+        clock.sleep(t - clock.now())
+
+        if kind == "enqueue":
+            queue.append(data)
+            for k in idle:
+                seq += 1
+                heapq.heappush(events, (t, seq, "free", k, None))
+            idle.clear()
+            continue
+        if kind == "done":
+            i, d, failed, n = data
+            working[i] -= 1
+            if failed:
+                queue.record(url(i, d), 0, failed=True)
+                queue.appendleft(url(i, d))
+                for k in idle:
+                    seq += 1
+                    heapq.heappush(events, (t, seq, "free", k, None))
+                idle.clear()
+            else:
+                queue.record(url(i, d), n)
+            kind = "free"
+
+        try:
+            i, d = parse_url(queue.pop(crawler))
+        except IndexError:
+            idle.add(crawler)
+            continue
+        page = pages[i]
+        cost = 0.0
+        if last_page.get(crawler) != i:
+            switches += 1
+            cost += args.switch
+        last_page[crawler] = i
+        if working.get(i, 0) > 0:
+            shared += 1
+        working[i] = working.get(i, 0) + 1
+
+        failed = rng.random() < page["error_rate"]
+        n = 0 if failed else page["posts"]
+        cost += args.fetch + args.per_post * n
+        if not failed:
+            ages = page["age"] + page["spacing"] * (d * page["posts"] + np.arange(n))
+            posts += n
+            fresh_posts += int((ages < 24).sum())
+            if d == 0:
+                reached.add(i)
+            queue.fresh(page_key(url(i, d)), clock.now() - ages[0] * 3600)
+            if d + 1 < page["depth"]:
+                seq += 1
+                heapq.heappush(events, (t + args.fetch, seq, "enqueue", crawler, url(i, d + 1)))
+        seq += 1
+        heapq.heappush(events, (t + cost, seq, "done", crawler, (i, d, failed, n)))
+
+    hours = args.hours
+    return len(reached), posts / hours, fresh_posts / hours, switches, shared
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--crawlers", type=int, default=8)
+    parser.add_argument("--hours", type=float, default=1)
+    parser.add_argument("--fetch", type=float, default=4, help="Seconds to load a timeline page")
+    parser.add_argument("--per-post", type=float, default=1.5, help="Seconds per post")
+    parser.add_argument("--switch", type=float, default=3, help="Seconds to move a crawler to another page")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, np.random.default_rng(args.seed))
+    start_urls = [url(i, 0) for i in range(args.pages)]
+    print(f"{args.pages} pages, {args.crawlers} crawlers, {args.hours:g} simulated hours")
+    for name, make_queue in (
+        ("fifo", lambda clock: FifoQueue(start_urls)),
+        ("page queue", lambda clock: PageQueue(start_urls, clock=clock.now))
+    ):
+        clock = SimulatedClock()
+        reached, posts, fresh, switches, shared = simulate(make_queue(clock), pages, args, clock, args.seed)
+        print(
+            f"{name:>12}: {reached:>5} pages reached  {posts:8.0f} posts/h  {fresh:7.0f} fresh posts/h  "
+            f"{switches:>6} page switches  {shared:>5} shared chains"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Checks the single-pass `html_to_text` and the table-driven `parse_post_date`
+against the regex chains they replaced, then times both over millions of
+comments and dates.
+
+The new date parser deliberately differs from the old one on two shapes,
+which the check accounts for:
+- "d tháng m[, yyyy]" without a time came out in year 1900; the given year,
+  or the current one, is now kept.
+- "Hôm qua lúc hh:mm" dropped the time (`dt.replace` was discarded); it is
+  now applied.
+
+    python -m benchmarks.bench_text_date --n 1000000
+"""
+from extractor import html_to_text, CMT_TEXT_CLASS, has_classes
+from post import parse_post_date, match_post_date
+from benchmarks import fixtures
+
+from datetime import datetime, timedelta
+import lxml.html
+import argparse
+import random
+import time
+import re
+
+
+def legacy_html_to_text(html: str) -> str:
+    text = re.sub(r"(<img[^>]*alt=\"([^\"]+)\")[^>]*>", r"\2", html)
+    text = re.sub(r"<a[^>]*href=\"([^\"]+)\"[^>]*>(.*?)</a>", r"href(\2, \1)", text)
+    text = re.sub(r"(?<=</div>)()(?=<div)", r"\n", text)
+    text = re.sub(r"<.*?>", "", text)
+    return text
+
+
+def legacy_parse_post_date(raw_date: str):
+    dt = datetime.now()
+    if re.match(r"^\d{1,2} tháng \d{1,2}(, \d{4})? lúc \d{1,2}:\d{1,2}.*", raw_date):
+        if not re.match(r"^\d{1,2} tháng \d{1,2}, \d{4}.*", raw_date):
+            year = datetime.now().year
+            raw_date = f", {year}".join(
+                re.split(r"(?<=\d)(?= lúc)", raw_date)
+            )
+        raw_date = re.search(r"\d{1,2} tháng \d{1,2}, \d{4} lúc \d{1,2}:\d{1,2}", raw_date).group(0)
+        dt = datetime.strptime(raw_date, "%d tháng %m, %Y lúc %H:%M")
+    elif re.match(r"^\d{1,2} tháng \d{1,2}(, \d{4})?", raw_date):
+        raw_date = re.search(r"\d{1,2} tháng \d{1,2}", raw_date).group(0)
+        dt = datetime.strptime(raw_date, "%d tháng %m")
+    elif re.match(r"\d{1,2} phút.*", raw_date):
+        minute = re.search(r"(\d{1,2}) phút", raw_date).group(1)
+        minute = int(minute)
+        dt -= timedelta(minutes=minute)
+    elif re.match(r"\d{1,2} giờ.*", raw_date):
+        hour = re.search(r"(\d{1,2}) giờ", raw_date).group(1)
+        hour = int(hour)
+        dt -= timedelta(hours=hour)
+    elif re.match(r"^Hôm qua lúc \d{1,2}:\d{1,2}", raw_date):
+        h_m_search = re.search(r"lúc (\d{1,2}):(\d{2})$", raw_date)
+        hour, minute = h_m_search.group(1), h_m_search.group(2)
+        dt -= timedelta(days=1)
+        dt.replace(hour=int(hour), minute=int(minute))
+
+    return dt
+
+
+def comment_texts():
+    root = lxml.html.fromstring(fixtures.load("comments.html"))
+    return [
+        (div.text or "") + "".join(lxml.html.tostring(child, encoding="unicode") for child in div)
+        for div in root.xpath(f"//div[{has_classes(CMT_TEXT_CLASS)}]")
+    ]
+
+
+def fuzz_texts(n: int, seed: int):
+    """
+    Odd markup the fixtures lack: nested and multi-line links, images
+    without alt, tags broken over lines. Text never holds a raw `<`, which
+    `innerHTML` escapes.
+    """
+    rng = random.Random(seed)
+    pieces = (
+        "<div>", "</div>", "<div dir=\"auto\">", "</div><div>", "<span>", "</span>",
+        "<a href=\"https://a.b/?x=1&amp;y=2\">", "<a role=\"link\">", "</a>", "<abbr href=\"h\">",
+        "<img alt=\"😂\" src=\"e.png\">", "<img alt=\"\" src=\"e.png\">", "<img src=\"x\" alt=\"a\" alt=\"b\">",
+        "<img\nalt=\"x\">", "<br>", "<span\n>", "\n", " ", "text", "&amp;", "1 &lt; 2", "a &gt; b", "ơ ư"
+    )
+    return ["".join(rng.choices(pieces, k=rng.randint(1, 25))) for _ in range(n)]
+
+
+def check_text(texts: list[str]):
+    for html in texts:
+        expected, actual = legacy_html_to_text(html), html_to_text(html)
+        assert actual == expected, f"html_to_text({html!r}) = {actual!r}, expected {expected!r}"
+
+
+def check_dates(raw_dates: list[str]):
+    now = datetime.now()
+    for raw_date in raw_dates:
+        expected, actual = legacy_parse_post_date(raw_date), parse_post_date(raw_date, now=now)
+        kind, values = match_post_date(raw_date)
+        if kind == "date":
+            assert expected.year == 1900 and actual.year == (values[2] or now.year)
+            expected = expected.replace(year=actual.year)
+        elif kind == "yesterday":
+            assert (actual.hour, actual.minute) == values
+            expected, actual = expected.date(), actual.date()
+        elif kind in ("minutes", "hours", None):
+            # The old parser read its own clock
+            assert abs(expected - actual) < timedelta(seconds=5), raw_date
+            continue
+        assert actual == expected, f"parse_post_date({raw_date!r}) = {actual}, expected {expected}"
+
+
+def timed(fn, items: list[str]):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=1_000_000, help="Comments and dates timed")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    texts = comment_texts()
+    check_text(texts + fuzz_texts(20_000, args.seed))
+    check_dates(fixtures.raw_dates(20_000, args.seed))
+    print(f"equivalent on {len(texts)} fixture comments, 20000 fuzzed snippets and 20000 dates")
+
+    texts = (texts * (args.n // len(texts) + 1))[:args.n]
+    raw_dates = fixtures.raw_dates(args.n, args.seed)
+    for name, legacy, current, items in (
+        ("html_to_text", legacy_html_to_text, html_to_text, texts),
+        ("parse_post_date", legacy_parse_post_date, parse_post_date, raw_dates)
+    ):
+        old, new = timed(legacy, items), timed(current, items)
+        print(
+            f"{name:>15}: {len(items)} items  regex chain {old:7.2f} s ({old / len(items) * 1e6:5.2f} us)  "
+            f"single pass {new:7.2f} s ({new / len(items) * 1e6:5.2f} us)  x{old / new:4.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
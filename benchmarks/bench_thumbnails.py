@@ -0,0 +1,102 @@
+"""
+Runs `MakeThumbnails` over a directory of synthetic full-size photos, as
+saved by `SaveImages`, with one worker process and with `--workers`. Reports
+images per second, the bytes of originals, thumbnails and re-encoded
+copies, and the time the viewer spends decoding a full image versus its
+thumbnail.
+
+    python -m benchmarks.bench_thumbnails --images 200 --workers 4
+"""
+from pipeline import MakeThumbnails
+
+from PIL import Image
+import pandas as pd
+import numpy as np
+import argparse
+import tempfile
+import pathlib
+import shutil
+import time
+
+
+def make_photos(img_dir: pathlib.Path, n: int, size: tuple[int, int], seed: int):
+    """
+    Smooth gradients with noise, compressing about like photos.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    x, y = np.meshgrid(np.linspace(0, 1, width), np.linspace(0, 1, height))
+    names = []
+    for i in range(n):
+        phase = rng.uniform(0, 2 * np.pi, 3)
+        channels = [
+            127 + 100 * np.sin(2 * np.pi * (x * rng.uniform(1, 4) + y * rng.uniform(1, 4)) + p)
+            for p in phase
+        ]
+        pixels = np.stack(channels, axis=-1) + rng.normal(0, 12, (height, width, 3))
+        name = f"{10**15 + i}__{i % 3}.jpg"
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(img_dir / name, quality=92)
+        names.append(name)
+    return names
+
+
+def dir_bytes(paths):
+    return sum(path.stat().st_size for path in paths)
+
+
+def decode_second(paths):
+    elapsed = time.perf_counter()
+    for path in paths:
+        with Image.open(path) as img:
+            img.load()
+    return (time.perf_counter() - elapsed) / len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--width", type=int, default=2048)
+    parser.add_argument("--height", type=int, default=1536)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--reencode-quality", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source_dir = pathlib.Path(tmp) / "source"
+        source_dir.mkdir()
+        names = make_photos(source_dir, args.images, (args.width, args.height), args.seed)
+        # Three images per post row
+        df = pd.DataFrame({"image_paths": ["   ".join(names[i:i + 3]) for i in range(0, len(names), 3)]})
+        originals = dir_bytes(source_dir / name for name in names)
+        print(f"{args.images} photos {args.width}x{args.height}: {originals / 1e6:.1f} MB")
+
+        for workers, reencode_quality in ((1, None), (args.workers, None), (args.workers, args.reencode_quality)):
+            img_dir = pathlib.Path(tmp) / f"imgs-{workers}-{reencode_quality}"
+            shutil.copytree(source_dir, img_dir)
+            step = MakeThumbnails(img_dir, num_workers=workers, reencode_quality=reencode_quality)
+            elapsed = time.perf_counter()
+            out = step(df.copy())
+            elapsed = time.perf_counter() - elapsed
+            step.close()
+
+            thumbnails = [img_dir / path for paths in out["thumbnail_paths"] for path in paths.split()]
+            assert len(thumbnails) == args.images, f"{len(thumbnails)} thumbnails for {args.images} photos"
+            label = f"{workers} workers" + (f", re-encode q{reencode_quality}" if reencode_quality else "")
+            full_size = [img_dir / path for paths in out["reencoded_paths"] for path in paths.split()] \
+                        if reencode_quality \
+                        else [img_dir / name for name in names]
+            print(
+                f"{label:>24}: {args.images / elapsed:7.1f} images/s  "
+                f"thumbnails {dir_bytes(thumbnails) / 1e6:6.2f} MB  "
+                f"full size {dir_bytes(full_size) / 1e6:6.1f} MB"
+            )
+
+        print(
+            f"{'viewer decode':>24}: full {decode_second([source_dir / name for name in names[:20]]) * 1000:.1f} ms  "
+            f"thumbnail {decode_second(thumbnails[:20]) * 1000:.1f} ms per image"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Simulates sharded crawling: worker processes share one `SharedProgress`
+SQLite queue, each "crawling" page timelines (a sleep per timeline page,
+then the next cursor is enqueued). One worker is killed mid-page; its
+leases must expire back into the queue and be finished by the others.
+Checks that every page is crawled to the end, and that no page was ever
+worked on by two workers at once.
+
+    python -m benchmarks.bench_work_queue --workers 4 --pages 40 --depth 5
+"""
+from work_queue import SharedProgress, page_key
+
+import multiprocessing
+import argparse
+import tempfile
+import pathlib
+import logging
+import time
+import os
+
+ROOT_URL = "https://mbasic.facebook.com"
+
+
+def worker(db_path: str, depth: int, crawl_second: float, visibility_second: float, die_after: int, log_path: str):
+    logging.disable(logging.INFO)
+    progress = SharedProgress(
+        db_path,
+        visibility_timeout_second=visibility_second,
+        idle_wait_second=visibility_second * 2,
+        poll_second=0.05
+    )
+    crawled = 0
+    with open(log_path, "a") as log:
+        while progress.remaining_num() > 0:
+            try:
+                url = progress.next_url()
+            except IndexError:
+                continue
+            start = time.time()
+            if crawled == die_after:
+                # Dies holding the lease, without releasing anything
+                os._exit(1)
+            time.sleep(crawl_second)
+            cursor = int(url.rsplit("=", 1)[1])
+            if cursor + 1 < depth:
+                progress.enqueue(url.rsplit("=", 1)[0] + f"={cursor + 1}")
+            log.write(f"{url}\t{progress.worker_id}\t{start}\t{time.time()}\n")
+            log.flush()
+            progress.add_history(url)
+            crawled += 1
+    progress.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--depth", type=int, default=5)
+    parser.add_argument("--crawl-ms", type=float, default=20)
+    parser.add_argument("--visibility-ms", type=float, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(pathlib.Path(tmp) / "queue.sqlite")
+        seed = SharedProgress(db_path)
+        for i in range(args.pages):
+            seed.enqueue(f"{ROOT_URL}/page{i}?v=timeline&cursor=0")
+        seed.close()
+
+        log_paths = [str(pathlib.Path(tmp) / f"worker-{i}.log") for i in range(args.workers)]
+        processes = [
+            multiprocessing.Process(
+                target=worker,
+                args=(
+                    db_path, args.depth, args.crawl_ms / 1000, args.visibility_ms / 1000,
+                    # The first worker dies on its 3rd timeline page
+                    2 if i == 0 else -1,
+                    log_paths[i]
+                )
+            )
+            for i in range(args.workers)
+        ]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        spans = []
+        for log_path in log_paths:
+            if os.path.exists(log_path):
+                with open(log_path) as f:
+                    spans.extend(line.rstrip("\n").split("\t") for line in f)
+
+    crawled = {url for url, *_ in spans}
+    expected = {
+        f"{ROOT_URL}/page{i}?v=timeline&cursor={c}"
+        for i in range(args.pages)
+        for c in range(args.depth)
+    }
+    assert crawled == expected, f"{len(expected - crawled)} timeline pages never crawled"
+
+    # Spans of different workers on one page must not overlap
+    by_page: dict[str, list] = {}
+    for url, worker_id, begin, end in spans:
+        by_page.setdefault(page_key(url), []).append((float(begin), float(end), worker_id))
+    for key, page_spans in by_page.items():
+        page_spans.sort()
+        for (_, end, a), (begin, _, b) in zip(page_spans, page_spans[1:]):
+            assert a == b or begin >= end, f"{key} crawled by {a} and {b} at once"
+
+    print(f"{args.workers} workers (1 killed): {len(crawled)} timeline pages of {args.pages} pages in {elapsed:.2f} s, "
+          f"{len(spans) - len(crawled)} crawled twice")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+A chromedriver stand-in backed by lxml, so extraction code can run offline.
+
+Every call that would be an HTTP round-trip to chromedriver is counted in
+`rpc_count` and can be charged a fixed `rpc_latency_second`, which makes the
+cost of per-element WebDriver chains measurable against the snapshot path.
+"""
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.common.exceptions import NoSuchElementException
+import lxml.html
+from lxml.html import HtmlElement
+
+from urllib.parse import urljoin
+from typing import Callable
+import itertools
+import re
+import time
+
+from extractor import has_classes, inner_html
+
+_CSS_COMPOUND = re.compile(r"^(?P<tag>[\w*-]*)(?P<classes>(?:\.[\w-]+)*)(?P<attrs>(?:\[[^\]]+\])*)$")
+
+
+def css_to_xpath(selector: str) -> str:
+    """
+    Translates the simple descendant/compound CSS selectors used by the
+    crawler (eg. `div.a.b`, `div[data-nosnippet]`) into XPath.
+    """
+    steps = []
+    for compound in selector.split():
+        match = _CSS_COMPOUND.match(compound)
+        if match is None:
+            raise ValueError(f"Unsupported CSS selector: {selector}")
+        predicates = []
+        classes = [cls for cls in match["classes"].split(".") if cls]
+        if classes:
+            predicates.append(has_classes(*classes))
+        for attr in re.findall(r"\[([^\]]+)\]", match["attrs"]):
+            name, _, value = attr.partition("=")
+            predicates.append(f"@{name}" if not value else f"@{name}={value!r}")
+        step = match["tag"] or "*"
+        if predicates:
+            step += f"[{' and '.join(predicates)}]"
+        steps.append(step)
+    return ".//" + "//".join(steps)
+
+
+def to_xpath(by: str, value: str) -> str:
+    if by == By.XPATH:
+        return value
+    if by == By.CLASS_NAME:
+        return f".//*[{has_classes(value)}]"
+    if by == By.ID:
+        return f".//*[@id={value!r}]"
+    if by == By.NAME:
+        return f".//*[@name={value!r}]"
+    if by == By.TAG_NAME and re.fullmatch(r"[\w-]+", value):
+        return f".//{value}"
+    if by in (By.TAG_NAME, By.CSS_SELECTOR):
+        return css_to_xpath(value)
+    raise ValueError(f"Unsupported locator: {by}")
+
+
+class FakeElement(WebElement):
+    _ids = itertools.count()
+
+    def __init__(self, driver: "FakeDriver", element: HtmlElement) -> None:
+        super().__init__(driver, f"fake-{next(self._ids)}")
+        self.driver = driver
+        self.element = element
+
+    @property
+    def tag_name(self):
+        self.driver.rpc()
+        return self.element.tag
+
+    @property
+    def text(self):
+        self.driver.rpc()
+        return self.element.text_content().strip()
+
+    def get_attribute(self, name: str):
+        self.driver.rpc()
+        if name == "innerHTML":
+            return inner_html(self.element)
+        if name == "outerHTML":
+            return lxml.html.tostring(self.element, encoding="unicode", with_tail=False)
+        value = self.element.get(name)
+        if value is not None and name in ("href", "src"):
+            value = urljoin(self.driver.current_url, value)
+        return value
+
+    def find_elements(self, by: str = By.ID, value: str | None = None):
+        return self.driver.locate(self.element, by, value)
+
+    def find_element(self, by: str = By.ID, value: str | None = None):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"{by}={value}")
+        return elements[0]
+
+    def is_displayed(self):
+        self.driver.rpc()
+        return True
+
+    def is_enabled(self):
+        self.driver.rpc()
+        return True
+
+    def click(self):
+        self.driver.rpc()
+
+    def send_keys(self, *value):
+        self.driver.rpc()
+
+
+class _SwitchTo:
+    def __init__(self, driver: "FakeDriver") -> None:
+        self.driver = driver
+
+    def new_window(self, type_hint: str | None = None):
+        self.driver.rpc()
+        handle = f"tab-{next(self.driver._handles)}"
+        self.driver.windows[handle] = ("about:blank", lxml.html.fromstring("<html><body></body></html>"))
+        self.driver.current_window_handle = handle
+
+    def window(self, handle: str):
+        self.driver.rpc()
+        self.driver.current_window_handle = handle
+
+
+class FakeDriver:
+    """
+    :param pages: URL to HTML mapping served by `get`.
+    :param start_url: The URL opened in the initial tab.
+    :param rpc_latency_second: Simulated chromedriver round-trip latency.
+    :param scripts: Python stand-ins of the scripts `execute_script` may get,
+        called with the page's root element and the script's arguments.
+    """
+    def __init__(
+        self,
+        pages: dict[str, str],
+        start_url: str,
+        rpc_latency_second: float = 0.0,
+        scripts: dict[str, Callable] | None = None
+    ) -> None:
+        self.pages = pages
+        self.rpc_latency_second = rpc_latency_second
+        self.scripts = scripts if scripts is not None else {}
+        self.rpc_count = 0
+        self.implicit_wait_second = 0.0
+        self.dead_time_second = 0.0
+
+        self._handles = itertools.count()
+        self.windows: dict[str, tuple[str, HtmlElement]] = {}
+        self.switch_to = _SwitchTo(self)
+        self.switch_to.new_window()
+        self.get(start_url)
+        self.rpc_count = 0
+
+    def rpc(self):
+        self.rpc_count += 1
+        if self.rpc_latency_second:
+            time.sleep(self.rpc_latency_second)
+
+    @property
+    def current_url(self):
+        self.rpc()
+        return self.windows[self.current_window_handle][0]
+
+    @property
+    def window_handles(self):
+        self.rpc()
+        return list(self.windows)
+
+    @property
+    def page_source(self):
+        self.rpc()
+        root = self.windows[self.current_window_handle][1]
+        return lxml.html.tostring(root, encoding="unicode")
+
+    def get(self, url: str):
+        self.rpc()
+        html = self.pages.get(url, "<html><body></body></html>")
+        self.windows[self.current_window_handle] = (url, lxml.html.fromstring(html))
+
+    def close(self):
+        self.rpc()
+        del self.windows[self.current_window_handle]
+
+    def quit(self):
+        self.rpc()
+        self.windows.clear()
+
+    def implicitly_wait(self, time_to_wait: float):
+        self.rpc()
+        self.implicit_wait_second = time_to_wait
+
+    def locate(self, element: HtmlElement | None, by: str, value: str):
+        self.rpc()
+        if element is None:
+            element = self.windows[self.current_window_handle][1]
+        found = element.xpath(to_xpath(by, value))
+        if not found:
+            # A real driver polls for the whole implicit wait before giving up
+            self.dead_time_second += self.implicit_wait_second
+        return [FakeElement(self, el) for el in found]
+
+    def find_elements(self, by: str = By.ID, value: str | None = None):
+        return self.locate(None, by, value)
+
+    def find_element(self, by: str = By.ID, value: str | None = None):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"{by}={value}")
+        return elements[0]
+
+    def execute_script(self, script: str, *args):
+        self.rpc()
+        if script in self.scripts:
+            return self.scripts[script](self.windows[self.current_window_handle][1], *args)
+
+    def set_script_timeout(self, time_to_wait: float):
+        self.rpc()
+
+    def execute_async_script(self, script: str, *args):
+        """
+        Answers the readiness script: the page is static, so it is settled
+        as soon as the selector (its first argument) matches.
+        """
+        self.rpc()
+        selector = args[0] if args else None
+        root = self.windows[self.current_window_handle][1]
+        return selector is None or bool(root.xpath(css_to_xpath(selector)))
+
+    def execute(self, driver_command: str, params: dict | None = None):
+        self.rpc()
+        return {"value": None}
@@ -0,0 +1,282 @@
+"""
+Synthetic Facebook markup reproducing the DOM shapes the extractors walk.
+
+The checked-in files under `benchmarks/fixtures/` are produced by this module:
+
+    python -m benchmarks.fixtures
+"""
+from extractor import (
+    CMT_CLASSES,
+    CMT_IMG_CLASS,
+    CMT_TEXT_CLASS,
+    CMT_ATTACHMENT_CLASS,
+    CMT_URL_CLASS
+)
+
+from datetime import datetime, timedelta
+import pathlib
+import random
+import zlib
+import re
+
+FIXTURE_DIR = pathlib.Path(__file__).parent / "fixtures"
+POST_URL = "https://facebook.com/804109268529640"
+PHOTO_URL_FORMAT = "https://www.facebook.com/photo/?fbid={0}&set=p.{0}"
+IMG_URL_FORMAT = "https://scontent.xx.fbcdn.net/v/t39.30808-6/{0}_n.jpg?stp=dst-jpg&_nc_cat=1"
+
+_WORDS = (
+    "hôm nay trời đẹp quá mọi người ơi xem video này chưa thật sự bất ngờ "
+    "cảm ơn admin đã chia sẻ tin tức mới nhất về giá xăng và thời tiết"
+).split()
+_EMOJIS = ("😂", "❤️", "😮", "👍", "🔥")
+
+
+def _paragraphs(rng: random.Random, see_more: bool = False) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(1, 3)):
+        words = " ".join(rng.choices(_WORDS, k=rng.randint(4, 30)))
+        if rng.random() < 0.3:
+            emoji = rng.choice(_EMOJIS)
+            words += f' <img height="16" width="16" alt="{emoji}" src="https://static.xx.fbcdn.net/images/emoji.php/v9/t1/16/{ord(emoji[0]):x}.png">'
+        if rng.random() < 0.1:
+            words += ' <a href="https://l.facebook.com/l.php?u=https%3A%2F%2Fvnexpress.net%2F&amp;h=AT0" role="link">vnexpress.net</a>'
+        paragraphs.append(f'<div dir="auto" style="text-align: start;">{words}</div>')
+    if see_more:
+        paragraphs.append('<div role="button" tabindex="0">See more</div>')
+    return "".join(paragraphs)
+
+
+def comment_html(rng: random.Random, cmt_id: int, has_image: bool, see_more: bool) -> str:
+    author = f'<div class="x3x7a5m"><a href="/profile.php?id={rng.randint(10**9, 10**10)}"><span>Người dùng {cmt_id % 997}</span></a></div>'
+    text = f'<div class="{CMT_TEXT_CLASS}"><div class="xdj266r x11i5rnm">{_paragraphs(rng, see_more)}</div></div>'
+    url = (
+        f'<div class="{CMT_URL_CLASS}"><a href="{POST_URL}?comment_id={cmt_id}&amp;__cft__=AZ">'
+        f'<span>{rng.randint(1, 23)} giờ</span></a></div>'
+    )
+
+    if has_image:
+        body = f'<div><div><div><div class="x1y1aw1k">{author}{text}</div></div></div></div>'
+        photo_id = 10**15 + cmt_id
+        attachment = (
+            f'<div class="{CMT_ATTACHMENT_CLASS}"><div class="x10l6tqk">'
+            f'<a href="{PHOTO_URL_FORMAT.format(photo_id)}" role="link">'
+            f'<img class="{CMT_IMG_CLASS} x1lliihq" src="{IMG_URL_FORMAT.format(photo_id)}&amp;thumb=1" alt="">'
+            f'</a></div></div>'
+        )
+    else:
+        body = f'<div><div><div><div><div><div class="x1y1aw1k">{author}{text}</div></div></div></div></div></div>'
+        attachment = ""
+
+    return f'<div class="{" ".join(CMT_CLASSES)}">{body}{attachment}{url}</div>'
+
+
+def post_page(
+    n_comments: int = 50,
+    image_every: int = 7,
+    see_more_every: int = 5,
+    n_images: int = 3,
+    seed: int = 0
+) -> str:
+    rng = random.Random(seed)
+    # The extractor reads the 8th `.html-div`, whose children are the text and images
+    padding = "".join(f'<div class="html-div xdj266r">{i}</div>' for i in range(7))
+    images = "".join(
+        f'<a href="{PHOTO_URL_FORMAT.format(i)}"><img src="{IMG_URL_FORMAT.format(i)}" alt=""></a>'
+        for i in range(n_images)
+    )
+    post = (
+        f'<div class="html-div x1n2onr6">'
+        f'<div class="x1iorvi4">{_paragraphs(rng)}</div>'
+        f'<div class="x10l6tqk"><div><div><div><div class="x1ey2m1c">{images}</div></div></div></div></div>'
+        f'</div>'
+    )
+    comments = "".join(
+        comment_html(
+            rng,
+            cmt_id=10**15 + 17 * i,
+            has_image=(image_every > 0 and i % image_every == image_every - 1),
+            see_more=(see_more_every > 0 and i % see_more_every == see_more_every - 1)
+        )
+        for i in range(n_comments)
+    )
+    return (
+        '<html><head><title>Facebook</title></head><body>'
+        '<div data-nosnippet=""><div class="x1n2onr6">Log in</div></div>'
+        f'<div role="main">{padding}{post}<div role="list">{comments}</div></div>'
+        '</body></html>'
+    )
+
+
+def photo_page(photo_id: int) -> str:
+    return (
+        '<html><body><div role="main">'
+        f'<img data-visualcompletion="media-vc-image" src="{IMG_URL_FORMAT.format(photo_id)}" alt="">'
+        '</div></body></html>'
+    )
+
+
+def photo_pages(html: str) -> dict[str, str]:
+    """
+    Serves a photo page for every comment photo linked from `html`.
+    """
+    return {
+        PHOTO_URL_FORMAT.format(photo_id): photo_page(int(photo_id))
+        for photo_id in re.findall(r"/photo/\?fbid=(\d+)", html)
+    }
+
+
+def timeline_post_html(rng: random.Random, page_id: str, post_id: int, date: datetime | None = None) -> str:
+    kind = rng.choice(("photo", "photo", "album", "link", "text"))
+    if kind == "photo":
+        attachment = f'<div><a href="/photo.php?fbid={post_id + 1}&amp;id={page_id}"><img src="{IMG_URL_FORMAT.format(post_id + 1)}" alt=""></a></div>'
+    elif kind == "album":
+        attachment = "<div><div>" + "".join(
+            f'<a href="/photo.php?fbid={post_id + i}&amp;id={page_id}"><img src="{IMG_URL_FORMAT.format(post_id + i)}" alt=""></a>'
+            for i in range(1, 4)
+        ) + "</div></div>"
+    elif kind == "link":
+        attachment = '<div><a href="https://lm.facebook.com/l.php?u=https%3A%2F%2Fvnexpress.net%2F&amp;h=AT0">vnexpress.net</a></div>'
+    else:
+        attachment = ""
+    words = " ".join(rng.choices(_WORDS, k=rng.randint(4, 30)))
+    raw_date = f"{rng.randint(1, 28)} tháng {rng.randint(1, 12)}, 2023 lúc {rng.randint(0, 23)}:{rng.randint(0, 59):02d}" \
+                if date is None \
+                else f"{date.day} tháng {date.month}, {date.year} lúc {date.hour}:{date.minute:02d}"
+    return (
+        f'<article>'
+        f'<div><header><h3><strong><a href="/{page_id}?refid=17">{page_id}</a></strong></h3></header>'
+        f'<div><span><p>{words}</p></span></div>{attachment}</div>'
+        f'<footer><div><abbr>{raw_date}</abbr> · Công khai</div>'
+        f'<div><span id="like_{post_id}"><a href="/a/like.php?ft_ent_identifier={post_id}">Thích</a></span></div></footer>'
+        f'</article>'
+    )
+
+
+def timeline_page(
+    page_id: str = "BeatvnNow",
+    cursor: int = 0,
+    n_posts: int = 5,
+    next_url: str | None = None,
+    seed: int = 0,
+    newest: datetime | None = None,
+    new_posts: int = 0,
+    post_spacing_second: float = 6 * 3600
+) -> str:
+    """
+    An mbasic `?v=timeline` page: posts inside the composer container's
+    `<section>`, followed by the "see more stories" link.
+
+    Post dates are random, unless `newest` is given: posts are then one
+    every `post_spacing_second`, newest first, and `new_posts` posts
+    published since push the others down the timeline, keeping their ids.
+    """
+    rng = random.Random(seed * 1_000_003 + cursor)
+    if newest is None:
+        posts = "".join(
+            timeline_post_html(rng, page_id, 10**15 + 100 * (cursor * n_posts + i))
+            for i in range(n_posts)
+        )
+    else:
+        # A post keeps its id and content wherever it is on the timeline
+        first_id = 10**15 + zlib.crc32(page_id.encode()) % 10**5 * 10**9
+        numbers = [cursor * n_posts + i - new_posts for i in range(n_posts)]
+        posts = "".join(
+            timeline_post_html(
+                random.Random(f"{seed}-{page_id}-{number}"), page_id, first_id + 100 * (10**6 + number),
+                newest - timedelta(seconds=number * post_spacing_second)
+            )
+            for number in numbers
+        )
+    next_link = f'<div><a href="{next_url}"><span>Xem tin khác</span></a></div>' \
+                if next_url is not None \
+                else ""
+    return (
+        '<html><head><title>Facebook</title></head><body><div id="viewport"><div id="objects_container">'
+        f'<div id="structured_composer_async_container"><section>{posts}</section>{next_link}</div>'
+        '</div></div></body></html>'
+    )
+
+
+def timeline_variants_page(page_id: str = "BeatvnNow", album_page_id: str = "BeatvnAlbums") -> str:
+    """
+    A timeline page with the post shapes off the regular path: a shared
+    post (an `<article>` nested in the attachment) and a post of an album,
+    whose three children hold the page's link in the second `<header>`.
+    Each follows a regular post, so selectors escaping the post show.
+    """
+    rng = random.Random(7)
+    date = "3 tháng 5, 2023 lúc 9:15"
+    footer = lambda post_id: (
+        f'<footer><div><abbr>{date}</abbr> · Công khai</div>'
+        f'<div><span id="like_{post_id}"><a href="/a/like.php?ft_ent_identifier={post_id}">Thích</a></span></div></footer>'
+    )
+    shared = (
+        f'<article>'
+        f'<div><header><h3><strong><a href="/{page_id}?refid=17">{page_id}</a></strong></h3></header>'
+        f'<div><span><p>{" ".join(rng.choices(_WORDS, k=8))}</p></span></div>'
+        f'<div><div><article><header><h3><a href="/someone?refid=17">someone</a></h3></header>'
+        f'<div><span><p>{" ".join(rng.choices(_WORDS, k=8))}</p></span></div></article></div></div></div>'
+        f'{footer(10**15 + 901)}'
+        f'</article>'
+    )
+    album = (
+        f'<article>'
+        f'<div><header><h3>3 ảnh mới trong album</h3></header>'
+        f'<div><span><p>{" ".join(rng.choices(_WORDS, k=8))}</p></span></div>'
+        f'<div><div><a href="/photo.php?fbid={10**15 + 903}&amp;id={album_page_id}"><img src="{IMG_URL_FORMAT.format(10**15 + 903)}" alt=""></a></div></div></div>'
+        f'<div><header><h3><strong><a href="/{album_page_id}?refid=17">{album_page_id}</a></strong></h3></header></div>'
+        f'{footer(10**15 + 902)}'
+        f'</article>'
+    )
+    posts = "".join((
+        timeline_post_html(rng, page_id, 10**15 + 800), shared,
+        timeline_post_html(rng, page_id, 10**15 + 810), album
+    ))
+    return (
+        '<html><head><title>Facebook</title></head><body><div id="viewport"><div id="objects_container">'
+        f'<div id="structured_composer_async_container"><section>{posts}</section></div>'
+        '</div></div></body></html>'
+    )
+
+
+def timeline_url(page_id: str, cursor: int) -> str:
+    return f"/{page_id}?v=timeline&cursor={cursor}"
+
+
+def raw_dates(n: int, seed: int = 0) -> list[str]:
+    """
+    Timeline dates in every shape `parse_post_date` handles, as mbasic
+    prints them with the audience suffix.
+    """
+    rng = random.Random(seed)
+    shapes = (
+        lambda: f"{rng.randint(1, 59)} phút",
+        lambda: f"{rng.randint(1, 23)} giờ",
+        lambda: f"Hôm qua lúc {rng.randint(0, 23)}:{rng.randint(0, 59):02d}",
+        lambda: f"{rng.randint(1, 28)} tháng {rng.randint(1, 12)} lúc {rng.randint(0, 23)}:{rng.randint(0, 59):02d}",
+        lambda: f"{rng.randint(1, 28)} tháng {rng.randint(1, 12)}, {rng.randint(2015, 2023)} lúc {rng.randint(0, 23)}:{rng.randint(0, 59):02d}",
+        lambda: f"{rng.randint(1, 28)} tháng {rng.randint(1, 12)}, {rng.randint(2015, 2023)}",
+        lambda: f"{rng.randint(1, 28)} tháng {rng.randint(1, 12)}"
+    )
+    return [rng.choice(shapes)() for _ in range(n)]
+
+
+def load(name: str) -> str:
+    return (FIXTURE_DIR / name).read_text(encoding="utf-8")
+
+
+def write_fixtures():
+    FIXTURE_DIR.mkdir(exist_ok=True)
+    (FIXTURE_DIR / "post.html").write_text(post_page(), encoding="utf-8")
+    (FIXTURE_DIR / "comments.html").write_text(
+        post_page(n_comments=500, image_every=11, see_more_every=4, seed=1),
+        encoding="utf-8"
+    )
+    (FIXTURE_DIR / "timeline.html").write_text(
+        timeline_page(next_url=timeline_url("BeatvnNow", 1)),
+        encoding="utf-8"
+    )
+
+
+if __name__ == "__main__":
+    write_fixtures()
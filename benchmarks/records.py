@@ -0,0 +1,60 @@
+"""
+Synthetic crawl records shaped like `FacebookPostExtractor.extract` output.
+"""
+from benchmarks.fixtures import IMG_URL_FORMAT
+
+from datetime import datetime, timedelta
+import random
+
+_WORDS = "hôm nay trời đẹp quá mọi người ơi xem video này chưa cảm ơn admin".split()
+
+
+def synthetic_records(
+    n_rows: int,
+    comments_per_post: int = 20,
+    imgs_per_post: int = 3,
+    cmt_image_ratio: float = 0.1,
+    seed: int = 0
+) -> list[dict]:
+    rng = random.Random(seed)
+    start = datetime(2024, 6, 1)
+    records = []
+    post_no = 0
+    while len(records) < n_rows:
+        post_id = str(10**15 + post_no)
+        post_url = f"https://facebook.com/{post_id}"
+        date = start - timedelta(hours=post_no)
+        post_imgs = "   ".join(
+            IMG_URL_FORMAT.format(f"{post_id}{i}")
+            for i in range(imgs_per_post)
+        )
+        records.append({
+            "page_id": "BeatvnNow",
+            "post_id": post_id,
+            "post_url": post_url,
+            "cmt_id": "",
+            "cmt_url": "",
+            "datetime": date,
+            "text": " ".join(rng.choices(_WORDS, k=rng.randint(10, 80))),
+            "images": post_imgs,
+            "type": "post"
+        })
+        for c in range(comments_per_post):
+            if len(records) >= n_rows:
+                break
+            cmt_id = str(10**16 + post_no * comments_per_post + c)
+            records.append({
+                "page_id": "BeatvnNow",
+                "post_id": post_id,
+                "post_url": post_url,
+                "cmt_id": cmt_id,
+                "cmt_url": f"https://facebook.com/{cmt_id}",
+                "datetime": date,
+                "text": " ".join(rng.choices(_WORDS, k=rng.randint(2, 40))),
+                "images": IMG_URL_FORMAT.format(cmt_id) \
+                            if rng.random() < cmt_image_ratio \
+                            else post_imgs,
+                "type": "comment"
+            })
+        post_no += 1
+    return records
@@ -0,0 +1,191 @@
+"""
+Offline benchmark suite over the checked-in fixtures and synthetic records:
+no network, no Chrome. Every case reports its best and mean time over a few
+repeats; results are written as JSON so runs on different commits can be
+compared.
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --compare bench.json --threshold 0.2
+    python -m benchmarks.run --only parse_post_date parse_text
+"""
+from post import PagePostMetadata, parse_post_date, parse_attachment_types
+from extractor import FacebookPostExtractor, CMT_TEXT_CLASS, has_classes
+from pipeline import AsDataFrame, SaveImages, SaveAsCSV
+from logger import Logger
+from benchmarks.fake_driver import FakeDriver
+from benchmarks.bench_save_images import NullDownloader
+from benchmarks.records import synthetic_records
+from benchmarks import fixtures
+
+from selenium.webdriver.common.by import By
+from typing import Callable
+import lxml.html
+import subprocess
+import platform
+import argparse
+import tempfile
+import pathlib
+import logging
+import json
+import time
+import sys
+
+CASES: dict[str, Callable[[float, pathlib.Path], tuple[Callable[[], object], int]]] = {}
+
+def case(name: str):
+    """
+    Registers a case: `fn(scale, tmp_dir)` prepares its input and returns
+    the timed callable and the number of items it processes.
+    """
+    def register(fn):
+        CASES[name] = fn
+        return fn
+    return register
+
+
+def timeline_driver():
+    return FakeDriver({fixtures.POST_URL: fixtures.load("timeline.html")}, fixtures.POST_URL)
+
+
+@case("page_post_metadata_webdriver")
+def page_post_metadata_webdriver_case(scale: float, tmp: pathlib.Path):
+    driver = timeline_driver()
+    posts = driver.find_element(By.ID, "structured_composer_async_container").find_elements(By.XPATH, "section/article")
+    posts = posts * max(1, int(20 * scale))
+    return lambda: [PagePostMetadata(post) for post in posts], len(posts)
+
+
+@case("page_post_metadata_html")
+def page_post_metadata_html_case(scale: float, tmp: pathlib.Path):
+    root = lxml.html.fromstring(fixtures.load("timeline.html"))
+    posts = root.xpath("//*[@id='structured_composer_async_container']/section/article") * max(1, int(20 * scale))
+    return lambda: [PagePostMetadata.from_html(post) for post in posts], len(posts)
+
+
+@case("parse_text")
+def parse_text_case(scale: float, tmp: pathlib.Path):
+    driver = FakeDriver({fixtures.POST_URL: fixtures.load("comments.html")}, fixtures.POST_URL)
+    logger = Logger("Bench")
+    logger.setLevel(logging.WARNING)
+    extractor = FacebookPostExtractor(driver, logger)
+    elements = driver.find_elements(By.XPATH, f"//div[{has_classes(CMT_TEXT_CLASS)}]") * max(1, int(4 * scale))
+    return lambda: [extractor.parse_text(element) for element in elements], len(elements)
+
+
+@case("parse_post_date")
+def parse_post_date_case(scale: float, tmp: pathlib.Path):
+    raw_dates = fixtures.raw_dates(int(20_000 * scale))
+    return lambda: [parse_post_date(raw_date) for raw_date in raw_dates], len(raw_dates)
+
+
+@case("parse_attachment_types")
+def parse_attachment_types_case(scale: float, tmp: pathlib.Path):
+    hrefs = [
+        [
+            "https://mbasic.facebook.com/photo.php?fbid=1&id=2",
+            "https://lm.facebook.com/l.php?u=https%3A%2F%2Fvnexpress.net%2F",
+            "https://mbasic.facebook.com/video_redirect/?src=x"
+        ][:1 + i % 3]
+        for i in range(int(50_000 * scale))
+    ]
+    return lambda: [parse_attachment_types(href) for href in hrefs], len(hrefs)
+
+
+@case("as_data_frame")
+def as_data_frame_case(scale: float, tmp: pathlib.Path):
+    records = synthetic_records(int(50_000 * scale))
+    return lambda: AsDataFrame()(records), len(records)
+
+
+@case("save_images")
+def save_images_case(scale: float, tmp: pathlib.Path):
+    step = SaveImages(tmp / "imgs", downloader=NullDownloader(num_workers=1))
+    df = AsDataFrame()(synthetic_records(int(50_000 * scale)))
+    return lambda: step(df.copy()), len(df)
+
+
+@case("save_as_csv")
+def save_as_csv_case(scale: float, tmp: pathlib.Path):
+    df = AsDataFrame()(synthetic_records(int(50_000 * scale)))
+    df["image_paths"] = df["images"]
+    runs = iter(range(10**9))
+    return lambda: SaveAsCSV(tmp / f"{next(runs)}.csv")(df), len(df)
+
+
+def measure(prepare: Callable, scale: float, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        fn, items = prepare(scale, pathlib.Path(tmp))
+        fn()  # Warm up caches and lazy imports
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    best = min(times)
+    return {
+        "items": items,
+        "best_second": best,
+        "mean_second": sum(times) / len(times),
+        "per_item_us": best / items * 1e6
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=pathlib.Path(__file__).parent
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results: dict, baseline_path: str, threshold: float):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\ncompared with {baseline.get('commit')} ({baseline_path}):")
+    for name, result in results["cases"].items():
+        old = baseline["cases"].get(name)
+        if old is None:
+            continue
+        ratio = result["per_item_us"] / old["per_item_us"]
+        flag = "  REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{name:>30}: {old['per_item_us']:12.2f} -> {result['per_item_us']:12.2f} us/item  x{ratio:5.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), help="Run these cases only")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplies every input size")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="A previous --output file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scale": args.scale,
+        "cases": {}
+    }
+    for name in args.only or CASES:
+        result = measure(CASES[name], args.scale, args.repeat)
+        results["cases"][name] = result
+        print(f"{name:>30}: {result['items']:>8} items  best {result['best_second'] * 1000:10.2f} ms  {result['per_item_us']:10.2f} us/item")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
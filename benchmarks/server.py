@@ -0,0 +1,122 @@
+"""
+A local HTTP stand-in for the Facebook CDN, used by throughput benchmarks.
+
+    GET /img/<name>.jpg?size=<bytes>&fail=<n>
+
+serves `size` deterministic bytes after `latency_second`. With `fail=n` the
+first `n` requests for that path answer 503, to exercise retries.
+
+    GET /<page_id>?v=timeline&cursor=<i>
+
+serves a recorded-shape mbasic timeline page, chained to the next cursor up
+to `timeline_pages` pages. Once `timeline_newest` is set, posts are dated
+back from it, and raising `timeline_new_posts` publishes new posts on top. Without the `c_user` cookie it answers the login
+page, like Facebook does for a lost session.
+
+    GET /photo/?fbid=<id>
+
+serves the photo viewer of a comment image, with the same cookie check.
+"""
+from benchmarks.fixtures import timeline_page, timeline_url, photo_page
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from contextlib import contextmanager
+from collections import Counter
+import threading
+import hashlib
+import time
+
+LOGIN_PAGE = b"<html><body><form id=login_form></form></body></html>"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server: StandInServer = self.server
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with server.lock:
+            server.hits[url.path] += 1
+            hits = server.hits[url.path]
+        time.sleep(server.latency_second)
+
+        if url.path.startswith("/img/"):
+            if hits <= int(query.get("fail", 0)):
+                return self.send_body(b"", "text/plain", 503)
+            size = int(query.get("size", server.img_size))
+            seed = hashlib.sha256(url.path.encode()).digest()
+            body = (seed * (size // len(seed) + 1))[:size]
+            return self.send_body(body, "image/jpeg")
+
+        logged_in = "c_user=" in self.headers.get("Cookie", "")
+        if url.path == "/photo/":
+            if not logged_in:
+                return self.send_body(LOGIN_PAGE, "text/html")
+            return self.send_body(photo_page(int(query["fbid"])).encode(), "text/html; charset=utf-8")
+
+        if query.get("v") == "timeline":
+            if not logged_in:
+                return self.send_body(LOGIN_PAGE, "text/html")
+            page_id = url.path.strip("/")
+            cursor = int(query.get("cursor", 0))
+            next_url = timeline_url(page_id, cursor + 1) \
+                        if cursor + 1 < server.timeline_pages \
+                        else None
+            body = timeline_page(
+                page_id, cursor, server.timeline_posts, next_url,
+                newest=server.timeline_newest,
+                new_posts=server.timeline_new_posts
+            )
+            return self.send_body(body.encode(), "text/html; charset=utf-8")
+
+        self.send_body(b"not found", "text/plain", 404)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        latency_second: float = 0.02,
+        img_size: int = 100_000,
+        timeline_pages: int = 10,
+        timeline_posts: int = 5,
+        handler: type[BaseHTTPRequestHandler] = StandInHandler
+    ) -> None:
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency_second = latency_second
+        self.img_size = img_size
+        self.timeline_pages = timeline_pages
+        self.timeline_posts = timeline_posts
+        self.timeline_newest = None
+        self.timeline_new_posts = 0
+        self.lock = threading.Lock()
+        self.hits = Counter()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+@contextmanager
+def serve(**kwargs):
+    server = StandInServer(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,7 +1,6 @@
 import threading
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.support.ui import WebDriverWait
@@ -9,13 +8,21 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.remote.remote_connection import LOGGER
 
 from post import PagePostMetadata
-from pipeline import Pipeline
+from pipeline import Pipeline, PipelineExecutor, Records
 from progress import Progress
+from work_queue import SharedProgress, NoURLAvailable, page_key
 from logger import Logger
 from credentials import FacebookCookies
-from extractor import FacebookPostExtractor
+from extractor import FacebookPostExtractor, CLOSE_BTN_XPATH
+from driver_pool import DriverPool, resolve_driver_path, chrome_options
+from fetcher import MbasicFetcher, CommentImageResolver
+from readiness import Readiness
+from politeness import PolitenessScheduler, CheckpointError
+from transactions import TransactionAborted
+from metrics import STAGE_SECONDS, PAGES, RECORDS
 import colors
 
+from concurrent.futures import Future
 from typing import Literal
 import bs4
 import re
@@ -28,6 +35,56 @@ import traceback
 LOGGER.setLevel(logging.CRITICAL)
 total_crawler = 0
 
+def follow_next_page(
+    progress: Progress | SharedProgress,
+    url: str,
+    metadatas: list[PagePostMetadata],
+    next_page_link: str | None,
+    incremental: bool,
+    overlap_second: float
+):
+    """
+    Records the newest post of a timeline page for its page's watermark and
+    returns the link to follow: None once the timeline ends or, when
+    `incremental`, once every post of the page is older than the watermark
+    by more than `overlap_second`. Either ends the walk, whose newest post
+    becomes the watermark.
+    """
+    key = page_key(url)
+    if len(metadatas) > 0:
+        newest = max(metadatas, key=lambda metadata: metadata.date)
+        progress.see_post(key, newest.date.timestamp(), newest.post_id)
+    watermark = progress.watermark(key)
+    if (
+        incremental
+        and watermark is not None
+        and len(metadatas) > 0
+        and all(metadata.date.timestamp() < watermark[0] - overlap_second for metadata in metadatas)
+    ):
+        next_page_link = None
+    if next_page_link is None:
+        progress.end_walk(key)
+    return next_page_link
+
+
+def watch_pipeline(logger: Logger, result, url: str, transaction):
+    """
+    Makes a failure of the pipeline on a page's records visible: logs it
+    and, if the pipeline left the page's transaction open, rolls it back,
+    which puts the URL back in the queue.
+    """
+    if not isinstance(result, Future):
+        return
+
+    def done(future: Future):
+        error = future.exception()
+        if error is None:
+            return
+        logger.error(f"Pipeline failed on the records of {colors.grey(url)}, page redone: {error}")
+        transaction.rollback()
+    result.add_done_callback(done)
+
+
 class Crawler(threading.Thread):
     """
         Base class for crawlers
@@ -36,11 +93,14 @@ class Crawler(threading.Thread):
         self,
         termination_event: threading.Event,
         progress: Progress,
-        data_pipeline: Pipeline,
+        data_pipeline: Pipeline | PipelineExecutor,
         headless: bool = True,
         name: str | None = None,
         mean_std_sleep_second: tuple[float, float] = (10, 1),
         DOM_wait_second: float = 90,
+        driver_pool: DriverPool | None = None,
+        scheduler: PolitenessScheduler | None = None,
+        account: str = "default",
         thread_args: tuple = (),
         thread_kwargs: dict = {}
     ):
@@ -58,29 +118,40 @@ class Crawler(threading.Thread):
         self.headless = headless
         self.mean_std_sleep_second = mean_std_sleep_second
         self.DOM_wait_second = DOM_wait_second
-
-        self.driver_manager = ChromeDriverManager(latest_release_url="https://storage.googleapis.com/chrome-for-testing-public/125.0.6422.112/linux64/chrome-linux64.zip").install()
-        
-        self.driver_service = Service(self.driver_manager)
-        self.driver_options = webdriver.ChromeOptions()
-        # Options
-        if headless:
-            self.driver_options.add_argument("--headless")
-        else: self.driver_options.add_experimental_option("detach", True)
+        self.driver_pool = driver_pool
+        self.scheduler = scheduler
+        self.account = account
+        self.page_outcome = None
 
     def new_tab(self, url: str):
         self.chrome.switch_to.new_window("tab")
-        self.chrome.get(url)
+        with STAGE_SECONDS.time(crawler=self.name, stage="chrome_get"):
+            self.chrome.get(url)
         self.logger.info(f"Opened new tab to {colors.grey(url)}")
 
     def sleep(self, times: int = 1):
-        mean, std = self.mean_std_sleep_second
-        sleep_second = np.random.normal(mean, std, (times,))
-        sleep_second = np.clip(sleep_second, a_min=0, a_max=mean+3*std).sum()
-        time.sleep(sleep_second)
+        with STAGE_SECONDS.time(crawler=self.name, stage="sleep"):
+            # With a scheduler, wait for permits paced by the server's behavior
+            if self.scheduler is not None:
+                self.scheduler.acquire(self.account, times)
+                return
+            mean, std = self.mean_std_sleep_second
+            sleep_second = np.random.normal(mean, std, (times,))
+            sleep_second = np.clip(sleep_second, a_min=0, a_max=mean+3*std).sum()
+            time.sleep(sleep_second)
+
+    def report(self, outcome: Literal["success", "error", "checkpoint", "empty"]):
+        # A page's first outcome is its only one: `run` reports a success
+        # or a failure only if `parse` reported nothing else
+        if self.page_outcome is not None:
+            return
+        self.page_outcome = outcome
+        if self.scheduler is not None:
+            self.scheduler.report(self.account, outcome)
 
-    def wait_DOM(self):
-        self.chrome.implicitly_wait(self.DOM_wait_second)
+    def wait_DOM(self, by: str, value: str):
+        with STAGE_SECONDS.time(crawler=self.name, stage="wait_DOM"):
+            return self.readiness.element(by, value)
 
     def close_all_new_tabs(self):
         for handle in self.chrome.window_handles:
@@ -91,17 +162,32 @@ class Crawler(threading.Thread):
         self.chrome.switch_to.window(self.main_tab)
 
     def start_driver(self):
-        self.chrome = webdriver.Chrome(service=self.driver_service, options=self.driver_options)
+        if self.driver_pool is not None:
+            self.chrome = self.driver_pool.acquire()
+        else:
+            self.chrome = webdriver.Chrome(
+                service=Service(resolve_driver_path()),
+                options=chrome_options(self.headless)
+            )
         self.main_tab = self.chrome.current_window_handle
+        # Waits are explicit from here on, `DOM_wait_second` being their budget
+        self.readiness = Readiness(self.chrome, self.DOM_wait_second)
         self.logger.info(f"Driver started")
+
+    def stop_driver(self):
+        if self.driver_pool is not None:
+            self.driver_pool.release(self.chrome)
+        else:
+            self.chrome.quit()
     
     def exit(self):
         if self.termination_flag.is_set():
             self.logger.info("Closing due to Engine's termination")
         else:
             self.logger.info("Closing driver due to no URL left in queue")
+        self.progress.release(self.name)
         self.on_exit()
-        self.chrome.quit()
+        self.stop_driver()
     
     def on_start(self):
         pass
@@ -116,33 +202,65 @@ class Crawler(threading.Thread):
         pass
 
     def run(self):
+        start = time.monotonic()
         self.start_driver()
         self.on_start()
         err_trial = 0
+        first_page = True
 
         while (
-            self.progress.remaining_num() > 0 
+            self.progress.remaining_num(self.name) > 0
             and not self.termination_flag.is_set()
             and err_trial <= 5
         ):
+            url = None
+            self.page_outcome = None
+            accounted = False
             try:
-                # Extract data -> Pipeline -> Add history
-                url = self.progress.next_url()
-                self.logger.info(f"Begin parsing {colors.grey(url)}")
-                data = self.parse(url)
-                self.data_pipeline(data)
-                self.progress.add_history(url) 
+                # Extract data -> Add history -> Pipeline, which commits both
+                # once the records are staged; rolled back on error
+                with self.progress.transaction() as transaction:
+                    url = self.progress.next_url(worker=self.name)
+                    self.logger.info(f"Begin parsing {colors.grey(url)}")
+                    with STAGE_SECONDS.time(crawler=self.name, stage="parse"):
+                        data = self.parse(url)
+                    self.progress.add_history(url)
+                # Rolled back meanwhile along with the page it depends on
+                transaction.ensure_open()
+                if first_page:
+                    self.logger.info(f"First page fetched {colors.bold(f'{time.monotonic() - start:.1f}s')} after start")
+                    first_page = False
+                with STAGE_SECONDS.time(crawler=self.name, stage="pipeline_submit"):
+                    watch_pipeline(self.logger, self.data_pipeline(Records.of(data, transaction.id)), url, transaction)
+                PAGES.inc(crawler=self.name, outcome=self.page_outcome or "success")
+                RECORDS.inc(len(data) if data else 0, crawler=self.name)
+                self.progress.record_outcome(url, len(data) if data else 0)
+                self.report("success")
+                accounted = True
                 self.sleep()
                 err_trial = 0
+            except NoURLAvailable:
+                # Taken by another crawler since `remaining_num`, not a failure
+                continue
+            except TransactionAborted as e:
+                # Not a failure of this page, redone with the one it depends on
+                PAGES.inc(crawler=self.name, outcome="aborted")
+                self.logger.warning(f"Abandoned {colors.grey(url)}: {e}")
             except:
                 err_trial += 1
                 # Logging out error
                 exc_type, value, tb = sys.exc_info()
-                self.logger.error(f"Restore {colors.grey(url)} to queue due to error: \n{colors.red(exc_type.__name__)}: {value}\n{traceback.format_exc()}")
-                # If this url hasn't been crawled successfully
-                if not self.progress.propagated(url):
-                    # Re-append URL to queue
-                    self.progress.enqueue(url, "left")
+                # A failure once the page is accounted for (eg. while pacing) is
+                # not reported again
+                if not accounted:
+                    outcome = "checkpoint" if isinstance(value, CheckpointError) else "error"
+                    PAGES.inc(crawler=self.name, outcome=outcome)
+                    self.report(outcome)
+                    if url is not None:
+                        self.progress.record_outcome(url, 0, failed=True)
+                # The transaction of the page put its URL back in the queue
+                action = "Restore {0} to queue" if not accounted else "Done with {0}, then failed"
+                self.logger.error(f"{action.format(colors.grey(url))} due to error: \n{colors.red(exc_type.__name__)}: {value}\n{traceback.format_exc()}")
 
                 self.on_parse_error()
         self.exit()
@@ -153,7 +271,7 @@ class FacebookPageCrawler(Crawler):
         self, 
         termination_event: threading.Event,
         progress: Progress,
-        data_pipeline: Pipeline,
+        data_pipeline: Pipeline | PipelineExecutor,
         email: str,
         password: str,
         headless: bool = True,
@@ -161,9 +279,18 @@ class FacebookPageCrawler(Crawler):
         name: str | None = None,
         mode: Literal["post", "comments", "both"] = "both",
         comment_load_num: int = 300,
+        extraction: Literal["webdriver", "snapshot", "script"] = "webdriver",
+        fetch_mode: Literal["browser", "http"] = "browser",
+        image_resolution: Literal["browser", "http"] = "browser",
+        image_concurrency: int = 8,
+        incremental: bool = False,
+        watermark_overlap_second: float = 24 * 3600,
         mean_std_load_cmt_sleep_second: tuple[float, float] = (1, 0.1),
         mean_std_sleep_second: tuple[float, float] = (6, 1),
         DOM_wait_second: float = 60,
+        driver_pool: DriverPool | None = None,
+        scheduler: PolitenessScheduler | None = None,
+        account: str = "default",
         thread_args: tuple = (),
         thread_kwargs: dict = {}
     ) -> None:
@@ -175,6 +302,9 @@ class FacebookPageCrawler(Crawler):
             name=name,
             mean_std_sleep_second=mean_std_sleep_second, 
             DOM_wait_second=DOM_wait_second, 
+            driver_pool=driver_pool,
+            scheduler=scheduler,
+            account=account,
             thread_args=thread_args, 
             thread_kwargs=thread_kwargs
         )
@@ -182,6 +312,15 @@ class FacebookPageCrawler(Crawler):
         self.password = password
         self.mode = mode
         self.cmt_load_num = comment_load_num
+        self.extraction = extraction
+        self.fetch_mode = fetch_mode
+        self.fetcher = None
+        self.image_resolution = image_resolution
+        self.image_concurrency = image_concurrency
+        self.image_resolver = None
+        # Stop walking a timeline at posts older than the last walk's newest
+        self.incremental = incremental
+        self.watermark_overlap_second = watermark_overlap_second
         self.cookies = FacebookCookies(cookies_dir)
         self.mean_std_cmt_sleep = mean_std_load_cmt_sleep_second 
     
@@ -193,7 +332,14 @@ class FacebookPageCrawler(Crawler):
     def on_parse_error(self):
         if not self.termination_flag.is_set():
             self.close_all_new_tabs()
-        self.load_cookies()
+        if self.fetch_mode == "browser":
+            self.load_cookies()
+
+    def on_exit(self):
+        if self.fetcher is not None:
+            self.fetcher.close()
+        if self.image_resolver is not None:
+            self.image_resolver.close()
         
     def on_start(self):
         self.post_extractor = FacebookPostExtractor(
@@ -201,8 +347,11 @@ class FacebookPageCrawler(Crawler):
             logger=self.logger,
             mode=self.mode,
             cmt_load_time=self.cmt_load_num,
+            extraction=self.extraction,
             mean_std_sleep_second=self.mean_std_cmt_sleep,
-            DOM_wait_second=self.DOM_wait_second
+            DOM_wait_second=self.DOM_wait_second,
+            scheduler=self.scheduler,
+            account=self.account
         )
 
         # If local doesn't have cookies
@@ -220,8 +369,27 @@ class FacebookPageCrawler(Crawler):
             self.chrome.refresh()
             self.cookies.save(self.chrome.get_cookies())
             self.logger.info("Refreshed cookies")
+
+        if self.fetch_mode == "http":
+            # Timelines are fetched over HTTP with the login session, the
+            # browser only opens post pages and stays logged out
+            self.fetcher = MbasicFetcher(self.cookies.load())
+            self.chrome.delete_all_cookies()
+        if self.image_resolution == "http":
+            # Comment photos are resolved over HTTP with the login session
+            self.image_resolver = CommentImageResolver(self.cookies.load(), self.image_concurrency)
+            self.post_extractor.image_resolver = self.image_resolver
         self.sleep()
     
+    def follow(self, url: str, metadatas: list[PagePostMetadata], next_page_link: str | None):
+        link = follow_next_page(
+            self.progress, url, metadatas, next_page_link,
+            self.incremental, self.watermark_overlap_second
+        )
+        if link is None and next_page_link is not None:
+            self.logger.info(f"Reached the watermark of {colors.grey(page_key(url))}, not following older pages")
+        return link
+
     def login(self):
         self.chrome.get("https://mbasic.facebook.com")
         self.sleep()
@@ -246,26 +414,45 @@ class FacebookPageCrawler(Crawler):
         remember_device_btn = self.chrome.find_element(By.XPATH, "//input[(@value='OK') and (@class = 'bo bp bq br bs')]")
         remember_device_btn.click()
     
-    def parse(self, url: str):
-        self.chrome.get(url)
-        self.wait_DOM()
+    def parse_timeline(self, url: str):
+        with STAGE_SECONDS.time(crawler=self.name, stage="chrome_get"):
+            self.chrome.get(url)
+        if "/checkpoint" in self.chrome.current_url:
+            raise CheckpointError(f"Redirected to {self.chrome.current_url}")
+        container = self.wait_DOM(By.ID, "structured_composer_async_container")
         self.sleep()
-        container = self.chrome.find_element(By.ID, "structured_composer_async_container")
         
         posts: list[WebElement] = (
             container
             .find_element(By.TAG_NAME, "section")
             .find_elements(By.XPATH, "article")
         )
-        self.logger.info("Located {0} posts".format(colors.bold(str(len(posts)))))
+        with STAGE_SECONDS.time(crawler=self.name, stage="post_metadata"):
+            metadatas = [PagePostMetadata(post) for post in posts]
+
+        next_page_el: WebElement = container.find_element(By.XPATH, "div")
+        next_page_el: WebElement = next_page_el.find_element(By.TAG_NAME, "a")
+        next_page_link = next_page_el.get_attribute("href") \
+                        if next_page_el is not None \
+                        else None
+        return metadatas, next_page_link
+
+    def parse(self, url: str):
+        if self.fetch_mode == "http":
+            with STAGE_SECONDS.time(crawler=self.name, stage="http_get"):
+                metadatas, next_page_link = self.fetcher.fetch_timeline(url)
+            self.sleep()
+        else:
+            metadatas, next_page_link = self.parse_timeline(url)
+        self.logger.info("Located {0} posts".format(colors.bold(str(len(metadatas)))))
+        if len(metadatas) == 0:
+            self.report("empty")
 
         # Switch off login session, reducing account traffic
-        self.chrome.delete_all_cookies()
+        if self.fetch_mode == "browser":
+            self.chrome.delete_all_cookies()
         data = []
-        for i, post in enumerate(posts):
-            metadata = PagePostMetadata(post)
-            # self.logger.info("Extracted metadata for {0} post".format(colors.bold(str(i+1)+"th")))
-
+        for metadata in metadatas:
             # If this post contains image(s), go to new tab and crawl
             if (
                 "image" in metadata.attachment_types 
@@ -273,28 +460,24 @@ class FacebookPageCrawler(Crawler):
                 and not self.progress.propagated(metadata.post_url)
             ):
                 self.new_tab(metadata.post_url)
-                self.chrome.find_element(By.XPATH, "//div[@role='button' and @aria-label='Close']").click()
+                self.readiness.clickable(By.XPATH, CLOSE_BTN_XPATH).click()
                 post_data = self.post_extractor.extract(metadata)
                 data.extend(post_data)
 
                 self.progress.add_history(metadata.post_url)
                 self.close_all_new_tabs()
 
-        next_page_el: WebElement = container.find_element(By.XPATH, "div")
-        next_page_el: WebElement = next_page_el.find_element(By.TAG_NAME, "a")
-        next_page_link = next_page_el.get_attribute("href") \
-                        if next_page_el is not None \
-                        else None
-        self.progress.enqueue(next_page_link)
+        self.progress.enqueue(self.follow(url, metadatas, next_page_link))
 
         # Turn back on the login session, for propagating across the page
-        self.load_cookies()
+        if self.fetch_mode == "browser":
+            self.load_cookies()
 
         return data
 
     def cmt_show_mode(self, mode: Literal["newest", "most relevant", "all"] = "most relevant"):
-        btn_div = self.chrome.find_element(By.CSS_SELECTOR, "div.x78zum5.x1n2onr6.x1nhvcw1")
-        if len(btn_div.find_elements(By.XPATH, "*")) == 0:
+        btn_div = self.readiness.probe(By.CSS_SELECTOR, "div.x78zum5.x1n2onr6.x1nhvcw1")
+        if btn_div is None or len(btn_div.find_elements(By.XPATH, "*")) == 0:
             return
 
         mode = {
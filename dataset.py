@@ -0,0 +1,147 @@
+from typing import Sequence
+import pandas as pd
+import numpy as np
+import threading
+import pathlib
+import io
+
+QUOTE = ord('"')
+NEWLINE = ord("\n")
+
+
+class CSVDataset:
+    """
+    Random access to the rows of a CSV file written by `SaveAsCSV`, without
+    loading it. The byte offset of every row is indexed, so row `i` is one
+    read of its own bytes; newlines inside quoted fields (eg. post texts) are
+    told apart by the parity of the quotes before them.
+
+    `refresh` indexes the rows appended since the last call, so a dataset
+    kept open follows a running crawl. Only complete rows are indexed: a row
+    still being written shows up on a later refresh.
+    """
+    def __init__(
+        self,
+        path: str,
+        chunk_size: int = 1 << 24
+    ) -> None:
+        """
+        :param path: The CSV file.
+        :param chunk_size: The bytes read at a time while indexing.
+        """
+        self.path = pathlib.Path(path)
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.file = None
+        self.header = b""
+        self.columns: list[str] = []
+        # Start offsets of the rows, then the end of the last one
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.indexed = 0
+        self.refresh()
+
+    def __len__(self):
+        return max(len(self.offsets) - 1, 0)
+
+    def open(self):
+        if self.file is None and self.path.exists():
+            self.file = open(self.path, "rb")
+        return self.file
+
+    def reset(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.header = b""
+        self.columns = []
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.indexed = 0
+
+    def refresh(self):
+        """
+        Indexes the rows appended since the last refresh; returns the number of rows.
+        """
+        with self.lock:
+            try:
+                size = self.path.stat().st_size
+            except FileNotFoundError:
+                self.reset()
+                return 0
+            # A file cut below what was indexed (eg. a redone append) is indexed again
+            if size < self.indexed:
+                self.reset()
+            f = self.open()
+            if f is None or size == self.indexed:
+                return len(self)
+
+            ends = []
+            start, parity = self.indexed, 0
+            f.seek(start)
+            while start < size:
+                chunk = np.frombuffer(f.read(min(self.chunk_size, size - start)), dtype=np.uint8)
+                if len(chunk) == 0:
+                    break
+                quotes = np.flatnonzero(chunk == QUOTE)
+                newlines = np.flatnonzero(chunk == NEWLINE)
+                # Quotes before each newline, plus those left open by the previous chunk
+                quoted = (np.searchsorted(quotes, newlines) + parity) % 2
+                ends.append(start + newlines[quoted == 0] + 1)
+                parity = (len(quotes) + parity) % 2
+                start += len(chunk)
+            ends = np.concatenate(ends) if ends else np.zeros(0, dtype=np.int64)
+
+            if len(self.offsets) == 0 and len(ends) > 0:
+                # The first line is the header
+                f.seek(0)
+                self.header = f.read(int(ends[0]))
+                self.columns = pd.read_csv(io.BytesIO(self.header), nrows=0).columns.tolist()
+                self.offsets = np.array([ends[0]], dtype=np.int64)
+                ends = ends[1:]
+            if len(ends) > 0:
+                self.offsets = np.concatenate([self.offsets, ends.astype(np.int64)])
+            # Resume after the last complete row
+            if len(self.offsets) > 0:
+                self.indexed = int(self.offsets[-1])
+            return len(self)
+
+    def read(self, start: int, stop: int):
+        with self.lock:
+            f = self.open()
+            begin, end = int(self.offsets[start]), int(self.offsets[stop])
+            f.seek(begin)
+            return f.read(end - begin)
+
+    def rows(
+        self,
+        start: int,
+        stop: int,
+        columns: Sequence[str] | None = None
+    ) -> pd.DataFrame:
+        """
+        Rows `start` to `stop` (excluded), as strings, with only `columns`
+        (those present in the file) if given.
+        """
+        start, stop = max(start, 0), min(stop, len(self))
+        if start >= stop:
+            return pd.DataFrame(columns=list(columns) if columns is not None else self.columns, dtype=str)
+        return pd.read_csv(
+            io.BytesIO(self.header + self.read(start, stop)),
+            usecols=(lambda column: column in columns) if columns is not None else None,
+            dtype=str,
+            keep_default_na=False
+        )
+
+    def row(
+        self,
+        i: int,
+        columns: Sequence[str] | None = None
+    ) -> dict[str, str]:
+        if not 0 <= i < len(self):
+            raise IndexError(f"Row {i} out of range for {len(self)} rows")
+        return self.rows(i, i + 1, columns).iloc[0].to_dict()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,224 @@
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable
+import requests
+import threading
+import asyncio
+import pathlib
+import time
+import uuid
+import os
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class ImageDownloader:
+    """
+    Downloads images over a pooled keep-alive session with a bounded number of
+    worker threads. Files already on disk are skipped before any network I/O,
+    bodies are streamed to a temporary file and renamed into place once
+    complete, and transient failures are retried with exponential backoff.
+    """
+    def __init__(
+        self,
+        num_workers: int = 8,
+        timeout_second: float = 30,
+        max_retries: int = 3,
+        backoff_second: float = 0.5,
+        chunk_size: int = 64 * 1024
+    ) -> None:
+        """
+        :param num_workers: The number of concurrent downloads (and pooled connections).
+        :param timeout_second: Connect/read timeout of every request.
+        :param max_retries: How many times a failed download is retried.
+        :param backoff_second: The first retry delay, doubled on every attempt.
+        :param chunk_size: The streaming chunk size in bytes.
+        """
+        self.num_workers = num_workers
+        self.timeout_second = timeout_second
+        self.max_retries = max_retries
+        self.backoff_second = backoff_second
+        self.chunk_size = chunk_size
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=num_workers, pool_maxsize=num_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(num_workers, thread_name_prefix="ImageDownloader")
+
+    def fetch(self, url: str, path: pathlib.Path):
+        """
+        Streams `url` into `path`, returning the number of bytes written.
+        """
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+        try:
+            with self.session.get(url, stream=True, timeout=self.timeout_second) as response:
+                response.raise_for_status()
+                size = 0
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(self.chunk_size):
+                        f.write(chunk)
+                        size += len(chunk)
+            os.replace(tmp_path, path)
+            return size
+        finally:
+            if tmp_path.exists():
+                os.remove(tmp_path)
+
+    def download(self, url: str, path: str | pathlib.Path):
+        path = pathlib.Path(path)
+        if path.exists():
+            return path
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.fetch(url, path)
+                return path
+            except requests.HTTPError as e:
+                if e.response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                    raise
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            time.sleep(self.backoff_second * 2**attempt)
+
+    def download_all(self, tasks: Iterable[tuple[str, str | pathlib.Path]]):
+        """
+        Downloads every `(url, path)` pair concurrently and waits for all of
+        them. Raises the first failure once the others have finished, so
+        completed files stay on disk for the retry.
+        """
+        pending = {}
+        for url, path in tasks:
+            path = pathlib.Path(path)
+            if path not in pending and not path.exists():
+                pending[path] = url
+
+        futures = [
+            self.executor.submit(self.download, url, path)
+            for path, url in pending.items()
+        ]
+        error = None
+        for future in as_completed(futures):
+            if future.exception() is not None and error is None:
+                error = future.exception()
+        if error is not None:
+            raise error
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+
+
+class AsyncImageDownloader:
+    """
+    `ImageDownloader` counterpart multiplexing downloads as aiohttp requests
+    on one event loop, so hundreds of images can be in flight without a
+    thread each. The loop runs on a background thread: `download` and
+    `download_all` block like the threaded version and can be used by any
+    pipeline step, while coroutines (eg. async crawlers) await `adownload`.
+    """
+    def __init__(
+        self,
+        num_connections: int = 64,
+        timeout_second: float = 30,
+        max_retries: int = 3,
+        backoff_second: float = 0.5,
+        chunk_size: int = 64 * 1024
+    ) -> None:
+        """
+        :param num_connections: The number of concurrent downloads (and pooled connections).
+        :param timeout_second: Total timeout of every request.
+        :param max_retries: How many times a failed download is retried.
+        :param backoff_second: The first retry delay, doubled on every attempt.
+        :param chunk_size: The streaming chunk size in bytes.
+        """
+        self.num_connections = num_connections
+        self.timeout_second = timeout_second
+        self.max_retries = max_retries
+        self.backoff_second = backoff_second
+        self.chunk_size = chunk_size
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="AsyncImageDownloader", daemon=True)
+        self.thread.start()
+        self.session = self.call(self.open_session())
+
+    async def open_session(self):
+        import aiohttp
+        self.semaphore = asyncio.Semaphore(self.num_connections)
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.num_connections),
+            timeout=aiohttp.ClientTimeout(total=self.timeout_second)
+        )
+
+    def call(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    async def fetch(self, url: str, path: pathlib.Path):
+        """
+        Streams `url` into `path`, returning the number of bytes written.
+        File writes are small and sequential, so they stay on the loop.
+        """
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+        try:
+            async with self.semaphore, self.session.get(url) as response:
+                response.raise_for_status()
+                size = 0
+                with open(tmp_path, "wb") as f:
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        f.write(chunk)
+                        size += len(chunk)
+            os.replace(tmp_path, path)
+            return size
+        finally:
+            if tmp_path.exists():
+                os.remove(tmp_path)
+
+    async def adownload(self, url: str, path: str | pathlib.Path):
+        import aiohttp
+        path = pathlib.Path(path)
+        if path.exists():
+            return path
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.fetch(url, path)
+                return path
+            except aiohttp.ClientResponseError as e:
+                if e.status not in RETRY_STATUS or attempt == self.max_retries:
+                    raise
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+            await asyncio.sleep(self.backoff_second * 2**attempt)
+
+    async def adownload_all(self, tasks: Iterable[tuple[str, str | pathlib.Path]]):
+        pending = {}
+        for url, path in tasks:
+            path = pathlib.Path(path)
+            if path not in pending and not path.exists():
+                pending[path] = url
+
+        results = await asyncio.gather(
+            *(self.adownload(url, path) for path, url in pending.items()),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    def download(self, url: str, path: str | pathlib.Path):
+        return self.call(self.adownload(url, path))
+
+    def download_all(self, tasks: Iterable[tuple[str, str | pathlib.Path]]):
+        """
+        Downloads every `(url, path)` pair concurrently and waits for all of
+        them, raising the first failure once the others have finished.
+        """
+        self.call(self.adownload_all(list(tasks)))
+
+    def close(self):
+        self.call(self.session.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
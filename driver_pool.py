@@ -0,0 +1,173 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logger import Logger
+import colors
+
+import threading
+import queue
+import time
+
+CHROME_RELEASE_URL = "https://storage.googleapis.com/chrome-for-testing-public/125.0.6422.112/linux64/chrome-linux64.zip"
+
+_driver_paths: dict[str, str] = {}
+_driver_paths_lock = threading.Lock()
+
+def resolve_driver_path(release_url: str = CHROME_RELEASE_URL):
+    """
+    Resolves (downloading if needed) the chromedriver binary once per process.
+    """
+    with _driver_paths_lock:
+        if release_url not in _driver_paths:
+            _driver_paths[release_url] = ChromeDriverManager(latest_release_url=release_url).install()
+        return _driver_paths[release_url]
+
+def chrome_options(headless: bool = True):
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless")
+    else: options.add_experimental_option("detach", True)
+    return options
+
+
+class DriverPool:
+    """
+    Keeps warm Chrome instances for the crawlers. All browsers are launched in
+    parallel as soon as the pool starts; `acquire` hands out the first one
+    ready, and `release` resets a driver and puts it back instead of quitting
+    it, so a browser outlives the crawler that used it. A browser that fails
+    to launch or to be replaced leaves the pool smaller; only a pool left
+    without any browser fails `acquire`.
+
+    A threaded `Crawler` holds its browser until it exits, so under `Engine`
+    the pool only launches browsers in parallel; they are recycled between
+    pages by the async engine, whose crawlers borrow one per post.
+    """
+    def __init__(
+        self,
+        size: int,
+        headless: bool = True,
+        release_url: str = CHROME_RELEASE_URL
+    ) -> None:
+        """
+        :param size: The number of browsers to keep.
+        :param headless: Whether the browsers run headless.
+        :param release_url: The Chrome for Testing release the chromedriver is resolved for.
+        """
+        self.size = size
+        self.headless = headless
+        self.release_url = release_url
+        self.logger = Logger("DriverPool")
+
+        self.idle: queue.Queue[webdriver.Chrome] = queue.Queue()
+        self.drivers: list[webdriver.Chrome] = []
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.launch_error: BaseException | None = None
+        self.launcher = None
+
+    def new_driver(self):
+        driver = webdriver.Chrome(
+            service=Service(resolve_driver_path(self.release_url)),
+            options=chrome_options(self.headless)
+        )
+        with self.lock:
+            self.drivers.append(driver)
+        return driver
+
+    def start(self):
+        """
+        Launches every browser in the background and returns immediately.
+        """
+        self.launcher = threading.Thread(target=self.launch_all, name="DriverPool", daemon=True)
+        self.launcher.start()
+
+    def launch_all(self):
+        start = time.monotonic()
+        launched = 0
+        error = None
+        try:
+            resolve_driver_path(self.release_url)
+            with ThreadPoolExecutor(self.size) as executor:
+                futures = [executor.submit(self.new_driver) for _ in range(self.size)]
+                # Hand out each browser as soon as it is up
+                for future in as_completed(futures):
+                    try:
+                        self.idle.put(future.result())
+                        launched += 1
+                    except Exception as e:
+                        error = e
+                        self.logger.error(f"Failed to launch a browser: {e}")
+            self.logger.info(f"Launched {colors.bold(launched)}/{self.size} browsers in {colors.bold(f'{time.monotonic() - start:.1f}s')}")
+            if launched == 0:
+                self.launch_error = error
+        except BaseException as e:
+            self.launch_error = e
+            self.logger.error(f"Failed to launch browsers: {e}")
+        finally:
+            self.ready.set()
+
+    def wait_ready(self, timeout: float | None = None):
+        """
+        Readiness barrier: blocks until every browser has been launched;
+        raises if none could be.
+        """
+        self.ready.wait(timeout)
+        if self.launch_error is not None:
+            raise self.launch_error
+
+    def acquire(self) -> webdriver.Chrome:
+        while True:
+            try:
+                return self.idle.get(timeout=1)
+            except queue.Empty:
+                if self.ready.is_set() and self.launch_error is not None:
+                    raise self.launch_error
+                with self.lock:
+                    empty = len(self.drivers) == 0
+                if self.ready.is_set() and empty and self.idle.empty():
+                    raise RuntimeError("No browser left in the pool")
+
+    def release(self, driver: webdriver.Chrome):
+        """
+        Resets a driver (single blank tab, no cookies) and returns it to the
+        pool; a driver that fails to reset is replaced by a fresh one, or
+        dropped if that fails too.
+        """
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+        except Exception:
+            self.discard(driver)
+            try:
+                driver = self.new_driver()
+            except Exception as e:
+                self.logger.error(f"Failed to replace a browser, {len(self.drivers)} left in the pool: {e}")
+                return
+        self.idle.put(driver)
+
+    def discard(self, driver: webdriver.Chrome):
+        with self.lock:
+            if driver in self.drivers:
+                self.drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        if self.launcher is not None:
+            self.launcher.join()
+        with self.lock:
+            drivers, self.drivers = self.drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
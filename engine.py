@@ -1,11 +1,15 @@
 from crawler import Crawler
-from pipeline import Pipeline
+from pipeline import Pipeline, PipelineExecutor
 from progress import Progress
+from work_queue import SharedProgress, page_key
 from logger import Logger
+from driver_pool import DriverPool
+import metrics
 
 from typing import Sequence, Type
 import threading
-import time
+import traceback
+import inspect
 
 class Engine:
     """
@@ -18,7 +22,16 @@ class Engine:
         start_urls: Sequence[str],
         data_pipeline: Pipeline,
         progress_dir: str = "./progress",
+        progress: Progress | SharedProgress | None = None,
+        recrawl_start_urls: bool = False,
         num_crawlers: int = 1,
+        pipeline_workers: int = 1,
+        pipeline_queue_size: int = 16,
+        warm_drivers: bool = True,
+        metrics_port: int | None = None,
+        metrics_textfile: str | None = None,
+        metrics_summary_path: str | None = None,
+        metrics_interval_second: float = 60,
         name_format: str = "Crawler-{0}",
         crawler_args=(), crawler_kwargs={}
     ) -> None:
@@ -29,37 +42,81 @@ class Engine:
         :param start_urls: The initial URLs to crawl.
         :param data_pipeline: The pipeline to process crawled data.
         :param progress_dir: The directory to store progress.
+        :param progress: A progress tracker to use instead of the one in `progress_dir`, eg. a `SharedProgress` for sharded crawling.
+        :param recrawl_start_urls: Walk the start URLs again even if crawled before, eg. for an incremental refresh.
         :param num_crawlers: The number of crawlers to run concurrently.
+        :param pipeline_workers: The number of threads running the data pipeline.
+        :param pipeline_queue_size: The number of crawled results waiting for the pipeline before crawlers block.
+        :param warm_drivers: Whether to launch all browsers in parallel up front, through a pool, for crawlers taking a `driver_pool`. Each crawler keeps its browser until it exits, so browsers are only recycled by the async engine.
+        :param metrics_port: Serve Prometheus metrics on this local port (`/metrics`, JSON at `/summary`).
+        :param metrics_textfile: Periodically write Prometheus metrics to this file.
+        :param metrics_summary_path: Periodically append a JSON metrics summary to this file; logged if unset while metrics are on.
+        :param metrics_interval_second: The period of the metrics file and summary.
         :param name_format: The format for crawler names.
         :param crawler_args: Additional arguments to pass to crawlers.
         :param crawler_kwargs: Additional keyword arguments to pass to crawlers.
         """
         self.logger = Logger("Engine")
         # Create a logger for the Engine.
-        self.progress = Progress(progress_dir)
-        # Create a progress tracker.
+        self.metrics_reporter = metrics.start(
+            port=metrics_port,
+            textfile_path=metrics_textfile,
+            summary_path=metrics_summary_path,
+            interval_second=metrics_interval_second
+        ) if any(
+            option is not None
+            for option in (metrics_port, metrics_textfile, metrics_summary_path)
+        ) else None
+        # Record metrics only when they are exported, at no cost otherwise.
+        self.progress = progress \
+                        if progress is not None \
+                        else Progress(progress_dir)
+        # Create a progress tracker, unless one is shared with other workers.
+        queued_pages = {page_key(url) for url in self.progress.queue}
         for url in (
             set(start_urls)
            .difference(self.progress.queue)
-           .difference(self.progress.history)
         ):
-            # Enqueue URLs that are not already in progress or history.
+            if page_key(url) in queued_pages \
+                if recrawl_start_urls \
+                else self.progress.propagated(url):
+                continue
+            # Enqueue URLs that are not already in progress or history, or
+            # when recrawling, whose page is not being walked already.
             self.progress.enqueue(url, "left")
 
         self.termination_flag = threading.Event()
         # Create a flag to signal crawler termination.
         self.data_pipeline = data_pipeline
         # Store the data pipeline.
+        self.data_pipeline.recover(self.progress.committed)
+        # Publish the output of pages committed before a crash, drop the rest.
+        self.pipeline_executor = PipelineExecutor(
+            data_pipeline,
+            num_workers=pipeline_workers,
+            queue_size=pipeline_queue_size
+        )
+        # Run the pipeline off the crawler threads.
 
         self.num_crawlers = num_crawlers
         # Store the number of crawlers.
+        uses_pool = accepts_keyword(crawler_type, "driver_pool")
+        if warm_drivers and not uses_pool:
+            self.logger.warning(f"{crawler_type.__name__} takes no driver_pool, its crawlers start their own browsers")
+        # Crawlers written before the pool keep starting their own browsers.
+        self.driver_pool = DriverPool(
+            size=num_crawlers,
+            headless=crawler_kwargs.get("headless", True)
+        ) if warm_drivers and uses_pool else None
+        # Create a pool of warm browsers shared by the crawlers.
+        pool_kwargs = dict(driver_pool=self.driver_pool) if uses_pool else {}
         self.crawlers = [
             crawler_type(
                 termination_event=self.termination_flag,
                 progress=self.progress,
-                data_pipeline=data_pipeline,
+                data_pipeline=self.pipeline_executor,
                 name=name_format.format(i+1),
-                *crawler_args, **crawler_kwargs
+                *crawler_args, **pool_kwargs, **crawler_kwargs
             )
             for i in range(num_crawlers)
         ]
@@ -77,9 +134,11 @@ class Engine:
         Starts all crawlers and waits for them to finish.
         """
         try:
+            if self.driver_pool is not None:
+                self.driver_pool.start()
+            # Launch all browsers in parallel, crawlers pick them up as they get ready.
             for crawler in self.crawlers:
                 crawler.start()
-                time.sleep(1)
             # Start all crawlers.
             self.wait_all()
         except:
@@ -89,7 +148,28 @@ class Engine:
         finally:
             self.wait_all()
             # Ensure all crawlers have finished.
+            try:
+                self.pipeline_executor.shutdown()
+                # Drain queued results, flush buffered rows and release pipeline resources.
+            except:
+                self.logger.error(f"Failed to flush pipeline on termination:\n{traceback.format_exc()}")
             self.logger.warn("Saving progress on termination")
             # Log a warning message.
             self.progress.save()
-            # Save progress.
\ No newline at end of file
+            # Save progress.
+            if self.driver_pool is not None:
+                self.driver_pool.close()
+            # Quit the pooled browsers.
+            if self.metrics_reporter is not None:
+                self.metrics_reporter.stop()
+            # Write the final metrics.
+
+
+def accepts_keyword(fn, name: str):
+    """
+    Whether `fn` (eg. a class, through its constructor) takes the keyword `name`.
+    """
+    return any(
+        parameter.name == name or parameter.kind is inspect.Parameter.VAR_KEYWORD
+        for parameter in inspect.signature(fn).parameters.values()
+    )
@@ -3,6 +3,8 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.common.action_chains import ActionChains
 import bs4
+import lxml.html
+from lxml.html import HtmlElement
 
 import numpy as np
 import re
@@ -11,6 +13,170 @@ import colors
 from typing import Literal
 from logger import Logger
 from post import PagePostMetadata
+from politeness import PolitenessScheduler
+from readiness import Readiness
+from fetcher import CommentImageResolver
+from metrics import STAGE_SECONDS
+
+CMT_CLASSES = ("x1r8uery", "x1iyjqo2", "x6ikm8r", "x10wlt62", "x1pi30zi")
+CMT_SELECTOR = "div." + ".".join(CMT_CLASSES)
+CMT_IMG_CLASS = "xz74otr"
+CMT_TEXT_CLASS = "x1lliihq xjkvuk6 x1iorvi4"
+CMT_ATTACHMENT_CLASS = "x78zum5 xv55zj0 x1vvkbs"
+CMT_URL_CLASS = "x6s0dn4 x3nfvp2"
+SEE_MORE_XPATH = "div[@role='button' and @tabindex='0' and text()='See more']"
+# The login dialog covering post pages opened without a session
+CLOSE_BTN_XPATH = "//div[@role='button' and @aria-label='Close']"
+# The region holding the post and its comments, the only part watched for changes
+POST_ROOT_SELECTOR = "div[role='main']"
+
+# Exact-class probes used to tell comment attachments apart, in checking order
+CMT_ATTACHMENT_PROBES: list[tuple[str, str, str]] = [
+    ("video", "video", "x1lliihq x5yr21d xh8yej3"),
+    ("link", "a", "x1i10hfl xjbqb8w x1ejq31n xd10rxx x1sy0etr x17r0tee x972fbf xcfux6l x1qhh985 xm0m39n x9f619 x1ypdohk xt0psk2 xe8uvvx xdj266r x11i5rnm xat24cr x1mh8g0r xexx8yu x4uap5 x18d9i69 xkhd6sd x16tdsg8 x1hl2dhg xggy1nq x1a2a7pz x1ey2m1c xds687c x10l6tqk x17qophe x13vifvy xi2jdih"),
+    ("sticker", "img", "xz74otr x1uzojwf x10e4vud xa4qsjk xoj058f x1nxgg22 x10l6tqk x17qophe x13vifvy"),
+    ("gif", "div", "x1i10hfl x1ypdohk xe8uvvx x1hl2dhg xggy1nq x1o1ewxj x3x9cwd x1e5q0jg x13rtm0m x87ps6o x1lku1pv x1a2a7pz xjyslct xjbqb8w x13fuv20 xu3j5b3 x1q0q8m5 x26u7qi x972fbf xcfux6l x1qhh985 xm0m39n x9f619 x5muytz x1lliihq x5yr21d xdj266r x11i5rnm xat24cr x1mh8g0r x6ikm8r x10wlt62 xexx8yu x4uap5 x18d9i69 xkhd6sd x1n2onr6 x16tdsg8 xh8yej3 x1ja2u2z"),
+    ("gif", "img", "xz74otr x1lliihq xt7dq6l x193iq5w"),
+]
+
+# Clicks every comment's "See more" button (hiding the login banner first);
+# returns how many were clicked
+EXPAND_COMMENTS_SCRIPT = """
+var buttons = [];
+document.querySelectorAll(arguments[0]).forEach(function (comment) {
+    comment.querySelectorAll("div[role='button'][tabindex='0']").forEach(function (button) {
+        if (button.textContent === "See more") buttons.push(button);
+    });
+});
+var banner = document.querySelector("div[data-nosnippet]");
+if (buttons.length && banner && banner.firstChild) banner.removeChild(banner.firstChild);
+buttons.forEach(function (button) { button.click(); });
+return buttons.length;
+"""
+
+# Walks every comment the way `extract_comments` does, returning for each
+# its URL, attachment type, text HTML and image link, or null when it has
+# no text block
+COLLECT_COMMENTS_SCRIPT = """
+var selector = arguments[0], urlClass = arguments[1], attachmentClass = arguments[2],
+    textClass = arguments[3], imgClass = arguments[4], probes = arguments[5];
+
+function withClass(root, tag, cls) {
+    var elements = root.getElementsByTagName(tag);
+    for (var i = 0; i < elements.length; i++) {
+        if (elements[i].getAttribute("class") === cls) return elements[i];
+    }
+    return null;
+}
+function href(element) {
+    return element ? element.href || element.getAttribute("href") : null;
+}
+function attachmentType(attachment) {
+    if (!attachment || attachment.getAttribute("class") !== attachmentClass) return "no attachment";
+    for (var i = 0; i < probes.length; i++) {
+        if (withClass(attachment, probes[i][1], probes[i][2])) return probes[i][0];
+    }
+    return attachment.querySelector("img." + imgClass) ? "image" : "unknown";
+}
+
+return Array.from(document.querySelectorAll(selector)).map(function (comment) {
+    var divs = Array.from(comment.children).filter(function (el) { return el.tagName === "DIV"; });
+    var urlDiv = divs.find(function (el) { return el.getAttribute("class") === urlClass; });
+    var type = attachmentType(divs[1]);
+
+    var text = comment;
+    for (var i = 0; text && i < (type === "no attachment" ? 6 : 4); i++) text = text.querySelector("div");
+    text = text && text.lastElementChild;
+    if (!text || text.getAttribute("class") !== textClass) return null;
+
+    var image = null;
+    if (type === "image") {
+        var box = comment.querySelector("div." + attachmentClass.split(" ").join("."));
+        var img = box && box.querySelector("img." + imgClass);
+        image = href(img && img.parentElement);
+    }
+    return {
+        url: href(urlDiv && urlDiv.querySelector("a")),
+        attachment: type,
+        text: text.innerHTML,
+        image: image
+    };
+});
+"""
+
+
+def has_classes(*classes: str) -> str:
+    """
+    XPath predicate matching elements carrying every class in `classes`,
+    the equivalent of the CSS selector `.c1.c2...`.
+    """
+    return " and ".join(
+        f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+        for cls in classes
+    )
+
+def inner_html(element: HtmlElement) -> str:
+    """
+    Serializes the children of an lxml element the way `innerHTML` does.
+    """
+    return (element.text or "") + "".join(
+        lxml.html.tostring(child, encoding="unicode")
+        for child in element
+    )
+
+# One alternation over every tag shape `html_to_text` treats specially:
+# emoji images (their alt), links, block breaks and any other tag
+IMG_ALT = r'<img[^>]*alt="([^"]+)"[^>]*>'
+TEXT_TOKEN = re.compile(
+    IMG_ALT +
+    r'|<a[^>]*href="([^"]+)"[^>]*>'
+    r'|(</div>)(?=<div)'
+    r'|<[^>\n]*>'
+)
+TAG = re.compile(r"<[^>\n]*>")
+IMG = re.compile(IMG_ALT)
+
+def html_to_text(html: str) -> str:
+    """
+    Turns `innerHTML` into text in a single pass: emoji images become their
+    alt text, links `href(<text>, <url>)`, adjacent blocks are separated by a
+    line break, and every other tag is dropped. Entities are kept as is.
+    """
+    return render_text(html, 0, len(html), True)
+
+def render_text(html: str, pos: int, end: int, links: bool) -> str:
+    parts = []
+    while True:
+        match = TEXT_TOKEN.search(html, pos, end)
+        if match is None:
+            parts.append(html[pos:end])
+            return "".join(parts)
+        parts.append(html[pos:match.start()])
+        pos = match.end()
+
+        alt, href, block_end = match.groups()
+        if alt is not None:
+            parts.append(alt)
+        elif block_end is not None:
+            parts.append("\n")
+        elif href is not None:
+            # A link spans up to the first `</a>` on the same line (emoji
+            # replaced); a link nested in it is dropped like any other tag
+            close = html.find("</a>", pos, end)
+            if links and close != -1 and (
+                "\n" not in html[pos:close]
+                or "\n" not in IMG.sub(r"\1", html[pos:close])
+            ):
+                parts.append(f"href({render_text(html, pos, close, False)}, {href})")
+                pos = close + len("</a>")
+                continue
+            tag = TAG.match(html, match.start(), end)
+            if tag is None:
+                parts.append("<")
+                pos = match.start() + 1
+            else:
+                pos = tag.end()
+
 
 class Extractor:
     def __init__(
@@ -18,26 +184,50 @@ class Extractor:
         chrome: webdriver.Chrome,
         logger: Logger,
         mean_std_sleep_second: tuple[float, float] = (6, 1),
-        DOM_wait_second: float = 60
+        DOM_wait_second: float = 60,
+        scheduler: PolitenessScheduler | None = None,
+        account: str = "default"
     ) -> None:
         self.chrome = chrome
         self.logger = logger
         self.mean_std_sleep_second = mean_std_sleep_second
         self.DOM_wait_second = DOM_wait_second
+        self.scheduler = scheduler
+        self.account = account
+        self.readiness = Readiness(chrome, DOM_wait_second)
     
     def new_tab(self, url: str):
         self.chrome.switch_to.new_window("tab")
-        self.chrome.get(url)
+        with STAGE_SECONDS.time(crawler=self.logger.name, stage="chrome_get"):
+            self.chrome.get(url)
         self.logger.info(f"Opened new tab to {colors.grey(url)}")
 
     def sleep(self, times: int = 1):
-        mean, std = self.mean_std_sleep_second
-        sleep_second = np.random.normal(mean, std, (times,))
-        sleep_second = np.clip(sleep_second, a_min=0, a_max=mean+3*std).sum()
-        time.sleep(sleep_second)
+        with STAGE_SECONDS.time(crawler=self.logger.name, stage="sleep"):
+            if self.scheduler is not None:
+                self.scheduler.acquire(self.account, times)
+                return
+            mean, std = self.mean_std_sleep_second
+            sleep_second = np.random.normal(mean, std, (times,))
+            sleep_second = np.clip(sleep_second, a_min=0, a_max=mean+3*std).sum()
+            time.sleep(sleep_second)
 
-    def wait_DOM(self):
-        self.chrome.implicitly_wait(self.DOM_wait_second)
+    def wait_DOM(self, by: str, value: str):
+        with STAGE_SECONDS.time(crawler=self.logger.name, stage="wait_DOM"):
+            return self.readiness.element(by, value)
+
+    def snapshot(self, element: WebElement | None = None) -> HtmlElement:
+        """
+        Pulls the whole page (or one container's outerHTML) in a single
+        WebDriver call and parses it with lxml, links made absolute.
+        """
+        if element is None:
+            html = self.chrome.page_source
+        else:
+            html = element.get_attribute("outerHTML")
+        root = lxml.html.fromstring(html)
+        root.make_links_absolute(self.chrome.current_url, resolve_base_href=False)
+        return root
 
     def extract(self):
         pass
@@ -50,24 +240,46 @@ class FacebookPostExtractor(Extractor):
         logger: Logger,
         mode: Literal["post", "comments", "both"] = "both",
         cmt_load_time: int = 0,
+        extraction: Literal["webdriver", "snapshot", "script"] = "webdriver",
+        image_resolver: CommentImageResolver | None = None,
         mean_std_sleep_second: tuple[float, float] = (6, 1),
-        DOM_wait_second: float = 60
+        DOM_wait_second: float = 60,
+        scheduler: PolitenessScheduler | None = None,
+        account: str = "default"
     ):
         super().__init__(
             chrome=chrome, 
             logger=logger, 
             mean_std_sleep_second=mean_std_sleep_second,
-            DOM_wait_second=DOM_wait_second
+            DOM_wait_second=DOM_wait_second,
+            scheduler=scheduler,
+            account=account
         )
         self.mode = mode
         self.cmt_load_time = cmt_load_time
+        self.extraction = extraction
+        self.image_resolver = image_resolver
     
+    def wait_rendered(self):
+        """
+        Waits for the post to render and its comments to stop loading in.
+        """
+        with STAGE_SECONDS.time(crawler=self.logger.name, stage="wait_DOM"):
+            if not self.readiness.settled("div.html-div", root_selector=POST_ROOT_SELECTOR):
+                self.logger.warning("Post did not settle in time, extracting what has rendered")
+
     def extract(self, metadata: PagePostMetadata):
         data = []
+        self.wait_rendered()
 
         if self.mode in ["post", "both"]:
             self.logger.info("Parsing post's content...")
-            text, images = self.extract_post()
+            with STAGE_SECONDS.time(crawler=self.logger.name, stage="extract_post"):
+                # The post is a single element, a snapshot is as cheap as a script
+                if self.extraction in ("snapshot", "script"):
+                    text, images = self.extract_post_snapshot()
+                else:
+                    text, images = self.extract_post()
             post_data = {
                 "page_id": metadata.page_id,
                 "post_id": metadata.post_id,
@@ -83,7 +295,13 @@ class FacebookPostExtractor(Extractor):
 
         if self.mode in ["comment", "both"]:
             self.logger.info("Parsing comments...")
-            cmt_data = self.extract_comments(post_data)
+            with STAGE_SECONDS.time(crawler=self.logger.name, stage="extract_comments"):
+                if self.extraction == "snapshot":
+                    cmt_data = self.extract_comments_snapshot(post_data)
+                elif self.extraction == "script":
+                    cmt_data = self.extract_comments_script(post_data)
+                else:
+                    cmt_data = self.extract_comments(post_data)
             cmt_data = [
                 {
                     "page_id": metadata.page_id,
@@ -115,11 +333,11 @@ class FacebookPostExtractor(Extractor):
         return text, images
 
     def extract_comments(self, post_data: dict):
-        data = []
-        comments = self.chrome.find_elements(By.CSS_SELECTOR, "div.x1r8uery.x1iyjqo2.x6ikm8r.x10wlt62.x1pi30zi")
+        data, image_cmts = [], []
+        comments = self.chrome.find_elements(By.CSS_SELECTOR, CMT_SELECTOR)
         self.logger.info(f"Located {colors.bold(len(comments))} comments")
 
-        for i, comment in enumerate(comments):
+        for comment in comments:
             raw_cmt_url = comment.find_element(By.XPATH, "div[@class='x6s0dn4 x3nfvp2']").find_element(By.TAG_NAME, "a").get_attribute("href")
 
             attachment_type = self.extract_cmt_attachment_type(comment)
@@ -146,7 +364,8 @@ class FacebookPostExtractor(Extractor):
                 },
                 string="See more"
             ) is not None:
-                if len(self.chrome.find_element(By.CSS_SELECTOR, "div[data-nosnippet]").find_elements(By.XPATH, "*")) > 0:
+                nosnippet_div = self.readiness.probe(By.CSS_SELECTOR, "div[data-nosnippet]")
+                if nosnippet_div is not None and len(nosnippet_div.find_elements(By.XPATH, "*")) > 0:
                     self.chrome.execute_script("""
                         var l = document.querySelector("div[data-nosnippet]");
                         l.removeChild(l.firstChild);
@@ -169,92 +388,217 @@ class FacebookPostExtractor(Extractor):
                 })
             elif attachment_type == "image":
                 img = comment.find_element(By.TAG_NAME, "div.x78zum5.xv55zj0.x1vvkbs").find_element(By.CSS_SELECTOR, "img.xz74otr")
-                
-                self.logger.info(f"Getting {i+1}th comment's image")
-                img_src = self.parse_cmt_img(img)
 
+                # The photo link for now, resolved with the others at the end
                 data.append({
                     "id": cmt_id,
                     "url": cmt_url,
                     "text": text,
-                    "image": img_src,
+                    "image": img.find_element(By.XPATH, "./..").get_attribute("href"),
                 })
+                image_cmts.append(data[-1])
+        self.resolve_cmt_imgs(image_cmts)
         return data
     
-    def parse_cmt_img(self, img_element: WebElement):
-        href = img_element.find_element(By.XPATH, "./..").get_attribute("href")
-        current_handle = self.chrome.current_window_handle
-        self.new_tab(href)
-        self.wait_DOM()
-        self.sleep()
-
-        page_soup = bs4.BeautifulSoup(self.chrome.page_source, "lxml")
-        img = page_soup.find(
-            "img",
-            attrs={"data-visualcompletion": "media-vc-image"}
+    def extract_post_snapshot(self):
+        root = self.snapshot()
+        html_divs = root.xpath(f"//*[{has_classes('html-div')}]")
+        text_div, img_div = html_divs[7].xpath("div")
+        img_div = img_div.xpath("div/*/*/*")[0]
+
+        text = html_to_text(inner_html(text_div))
+        images = "   ".join([
+            img.get("src")
+            for img in img_div.iter("img")
+        ])
+        return text, images
+
+    def expand_comments(self, root: HtmlElement):
+        """
+        Clicks every comment's "See more" button through the driver. Returns
+        whether anything was clicked, ie. whether the snapshot is stale.
+        """
+        cmt_xpath = f"//div[{has_classes(*CMT_CLASSES)}]"
+        if not root.xpath(f"{cmt_xpath}//{SEE_MORE_XPATH}"):
+            return False
+
+        if root.xpath("//div[@data-nosnippet]/*"):
+            self.chrome.execute_script("""
+                var l = document.querySelector("div[data-nosnippet]");
+                l.removeChild(l.firstChild);
+            """)
+        for see_more_btn in self.chrome.find_elements(By.XPATH, f"{cmt_xpath}//{SEE_MORE_XPATH}"):
+            ActionChains(self.chrome).move_to_element(see_more_btn).perform()
+            see_more_btn.click()
+        return True
+
+    def extract_comments_snapshot(self, post_data: dict):
+        data, image_cmts = [], []
+        root = self.snapshot()
+        if self.expand_comments(root):
+            root = self.snapshot()
+        comments: list[HtmlElement] = root.xpath(f"//div[{has_classes(*CMT_CLASSES)}]")
+        self.logger.info(f"Located {colors.bold(len(comments))} comments")
+
+        for comment in comments:
+            raw_cmt_url = comment.xpath(f"div[@class='{CMT_URL_CLASS}']")[0].find(".//a").get("href")
+
+            attachment_type = self.snapshot_cmt_attachment_type(comment)
+
+            text_div = comment
+            for _ in range(4 if attachment_type != "no attachment" else 6):
+                text_div = text_div.find(".//div")
+            text_div = text_div.xpath("*")[-1]
+
+            if text_div.get("class") != CMT_TEXT_CLASS:
+                continue
+
+            text = html_to_text(inner_html(text_div))
+            cmt_id = re.search(r"comment_id=(\d+)", raw_cmt_url).group(1)
+            cmt_url = f"https://facebook.com/{cmt_id}"
+
+            if attachment_type == "no attachment":
+                data.append({
+                    "id": cmt_id,
+                    "url": cmt_url,
+                    "text": text,
+                    "image": post_data["images"]
+                })
+            elif attachment_type == "image":
+                img = (
+                    comment
+                    .xpath(f".//div[{has_classes(*CMT_ATTACHMENT_CLASS.split())}]")[0]
+                    .xpath(f".//img[{has_classes(CMT_IMG_CLASS)}]")[0]
+                )
+
+                data.append({
+                    "id": cmt_id,
+                    "url": cmt_url,
+                    "text": text,
+                    "image": img.getparent().get("href"),
+                })
+                image_cmts.append(data[-1])
+        self.resolve_cmt_imgs(image_cmts)
+        return data
+
+    def extract_comments_script(self, post_data: dict):
+        """
+        Collects every comment in one `execute_script` round-trip (two more
+        if some "See more" buttons have to be clicked first); only the
+        comment images are then resolved.
+        """
+        if self.chrome.execute_script(EXPAND_COMMENTS_SCRIPT, CMT_SELECTOR):
+            self.readiness.settled(root_selector=POST_ROOT_SELECTOR)
+        comments = self.chrome.execute_script(
+            COLLECT_COMMENTS_SCRIPT,
+            CMT_SELECTOR,
+            CMT_URL_CLASS,
+            CMT_ATTACHMENT_CLASS,
+            CMT_TEXT_CLASS,
+            CMT_IMG_CLASS,
+            CMT_ATTACHMENT_PROBES
         )
-        src = img.attrs["src"]
+        self.logger.info(f"Located {colors.bold(len(comments))} comments")
 
-        self.chrome.close()
-        self.chrome.switch_to.window(current_handle)
+        data, image_cmts = [], []
+        for comment in comments:
+            if comment is None:
+                continue
+            cmt_id = re.search(r"comment_id=(\d+)", comment["url"]).group(1)
+            cmt_url = f"https://facebook.com/{cmt_id}"
+            text = html_to_text(comment["text"])
 
-        self.sleep()
-        
-        return src
+            if comment["attachment"] == "no attachment":
+                data.append({
+                    "id": cmt_id,
+                    "url": cmt_url,
+                    "text": text,
+                    "image": post_data["images"]
+                })
+            elif comment["attachment"] == "image":
+                data.append({
+                    "id": cmt_id,
+                    "url": cmt_url,
+                    "text": text,
+                    "image": comment["image"],
+                })
+                image_cmts.append(data[-1])
+        self.resolve_cmt_imgs(image_cmts)
+        return data
+
+    def snapshot_cmt_attachment_type(self, cmt_div: HtmlElement):
+        content_divs = cmt_div.xpath("div")
+
+        if content_divs[1].get("class") != CMT_ATTACHMENT_CLASS:
+            return "no attachment"
+        attm_div = content_divs[1]
+
+        for attachment_type, tag, cls in CMT_ATTACHMENT_PROBES:
+            if attm_div.xpath(f".//{tag}[@class='{cls}']"):
+                return attachment_type
+
+        if attm_div.xpath(f".//img[{has_classes(CMT_IMG_CLASS)}]"):
+            return "image"
+
+        return "unknown"
+
+    def resolve_cmt_imgs(self, image_cmts: list[dict]):
+        """
+        Replaces the photo link of every image comment with the image URL:
+        all at once over HTTP with an image resolver, falling back to the
+        browser for the photos it could not resolve, else one tab at a time.
+        """
+        if len(image_cmts) == 0:
+            return
+        self.logger.info(f"Getting {colors.bold(len(image_cmts))} comments' images")
+        hrefs = [cmt["image"] for cmt in image_cmts]
+        if self.image_resolver is not None:
+            with STAGE_SECONDS.time(crawler=self.logger.name, stage="resolve_cmt_imgs"):
+                srcs = self.image_resolver.resolve_all(hrefs)
+        else:
+            srcs = [None] * len(hrefs)
+
+        for cmt, href, src in zip(image_cmts, hrefs, srcs):
+            cmt["image"] = src if src is not None else self.resolve_cmt_img(href)
+
+    def resolve_cmt_img(self, href: str):
+        with STAGE_SECONDS.time(crawler=self.logger.name, stage="parse_cmt_img"):
+            current_handle = self.chrome.current_window_handle
+            self.new_tab(href)
+            self.wait_DOM(By.XPATH, "//img[@data-visualcompletion='media-vc-image']")
+            self.sleep()
+
+            page_soup = bs4.BeautifulSoup(self.chrome.page_source, "lxml")
+            img = page_soup.find(
+                "img",
+                attrs={"data-visualcompletion": "media-vc-image"}
+            )
+            src = img.attrs["src"]
+
+            self.chrome.close()
+            self.chrome.switch_to.window(current_handle)
+
+            self.sleep()
+            
+            return src
 
     def extract_cmt_attachment_type(self, cmt_div: WebElement):
         content_divs: list[WebElement] = cmt_div.find_elements(By.XPATH, "div")
 
         # print("Checking none")
-        if content_divs[1].get_attribute("class") != "x78zum5 xv55zj0 x1vvkbs":
+        if content_divs[1].get_attribute("class") != CMT_ATTACHMENT_CLASS:
             return "no attachment"
         attm_div = content_divs[1]
         attm_soup = bs4.BeautifulSoup(attm_div.get_attribute("innerHTML"), "lxml")
 
-        # print("Checking video")
-        if attm_soup.find(
-            "video",
-            attrs={"class": "x1lliihq x5yr21d xh8yej3"}
-        ):
-            return "video"
-
-        # print("Checking link")
-        if attm_soup.find(
-            "a",
-            attrs={"class": "x1i10hfl xjbqb8w x1ejq31n xd10rxx x1sy0etr x17r0tee x972fbf xcfux6l x1qhh985 xm0m39n x9f619 x1ypdohk xt0psk2 xe8uvvx xdj266r x11i5rnm xat24cr x1mh8g0r xexx8yu x4uap5 x18d9i69 xkhd6sd x16tdsg8 x1hl2dhg xggy1nq x1a2a7pz x1ey2m1c xds687c x10l6tqk x17qophe x13vifvy xi2jdih"}
-        ):
-            return "link"
-
-        # print("Checking sticker")
-        if attm_soup.find(
-            "img",
-            attrs={"class": "xz74otr x1uzojwf x10e4vud xa4qsjk xoj058f x1nxgg22 x10l6tqk x17qophe x13vifvy"}
-        ):
-            return "sticker"
-
-        # print("Checking gif")
-        if attm_soup.find(
-            "div",
-            attrs={"class": "x1i10hfl x1ypdohk xe8uvvx x1hl2dhg xggy1nq x1o1ewxj x3x9cwd x1e5q0jg x13rtm0m x87ps6o x1lku1pv x1a2a7pz xjyslct xjbqb8w x13fuv20 xu3j5b3 x1q0q8m5 x26u7qi x972fbf xcfux6l x1qhh985 xm0m39n x9f619 x5muytz x1lliihq x5yr21d xdj266r x11i5rnm xat24cr x1mh8g0r x6ikm8r x10wlt62 xexx8yu x4uap5 x18d9i69 xkhd6sd x1n2onr6 x16tdsg8 xh8yej3 x1ja2u2z"}
-        ) or attm_soup.find(
-            "img",
-            attrs={"class": "xz74otr x1lliihq xt7dq6l x193iq5w"}
-        ):
-            return "gif"
-
-        # print("Checking image")
-        if attm_soup.find(
-            "img",
-            attrs={"class": "xz74otr"}
-        ):
+        for attachment_type, tag, cls in CMT_ATTACHMENT_PROBES:
+            if attm_soup.find(tag, attrs={"class": cls}):
+                return attachment_type
+
+        if attm_soup.find("img", attrs={"class": CMT_IMG_CLASS}):
             return "image"
 
         return "unknown"
     
     def parse_text(self, text_element: WebElement):
-        text = text_element.get_attribute("innerHTML")
-        text = re.sub(r"(<img[^>]*alt=\"([^\"]+)\")[^>]*>", r"\2", text)
-        text = re.sub(r"<a[^>]*href=\"([^\"]+)\"[^>]*>(.*?)</a>", r"href(\2, \1)", text)
-        text = re.sub(r"(?<=</div>)()(?=<div)", r"\n", text)
-        text = re.sub(r"<.*?>", "", text)
-        return text
\ No newline at end of file
+        return html_to_text(text_element.get_attribute("innerHTML"))
\ No newline at end of file
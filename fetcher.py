@@ -0,0 +1,176 @@
+from requests.adapters import HTTPAdapter
+import lxml.html
+from lxml.html import HtmlElement
+import requests
+
+from post import PagePostMetadata
+from politeness import CheckpointError
+from logger import Logger
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from collections import OrderedDict
+from typing import Sequence
+import threading
+
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+
+class MbasicFetcher:
+    """
+    Fetches server-rendered mbasic pages over a pooled `requests.Session`
+    carrying the browser's Facebook cookies, and parses them with lxml.
+    """
+    def __init__(
+        self,
+        cookies: list[dict],
+        timeout_second: float = 30,
+        pool_size: int = 4,
+        user_agent: str = USER_AGENT
+    ) -> None:
+        """
+        :param cookies: Cookies as returned by `webdriver.get_cookies()`.
+        :param timeout_second: Connect/read timeout of every request.
+        :param pool_size: The number of pooled keep-alive connections.
+        :param user_agent: The User-Agent header sent with every request.
+        """
+        self.timeout_second = timeout_second
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "User-Agent": user_agent,
+            "Accept-Language": "vi-VN,vi;q=0.9"
+        })
+        self.load_cookies(cookies)
+
+    def load_cookies(self, cookies: list[dict]):
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain", ""),
+                path=cookie.get("path", "/")
+            )
+
+    def get(self, url: str) -> HtmlElement:
+        response = self.session.get(url, timeout=self.timeout_second)
+        response.raise_for_status()
+        return parse_page(response.content, response.url, response.headers.get("Content-Type", ""))
+
+    def fetch_timeline(self, url: str):
+        return parse_timeline(self.get(url), url)
+
+    def close(self):
+        self.session.close()
+
+
+class CommentImageResolver:
+    """
+    Resolves comment photo links to the full-size image (the photo viewer's
+    `media-vc-image`) over HTTP with the session cookies, instead of a
+    browser tab per photo. Links are fetched concurrently, at most
+    `max_concurrency` at a time, and results are cached by photo ID.
+    """
+    def __init__(
+        self,
+        cookies: list[dict],
+        max_concurrency: int = 8,
+        timeout_second: float = 30,
+        cache_size: int = 10_000,
+        user_agent: str = USER_AGENT
+    ) -> None:
+        """
+        :param cookies: Cookies as returned by `webdriver.get_cookies()`.
+        :param max_concurrency: The number of photo pages fetched at once.
+        :param timeout_second: Connect/read timeout of every request.
+        :param cache_size: The number of resolved photos remembered.
+        :param user_agent: The User-Agent header sent with every request.
+        """
+        self.fetcher = MbasicFetcher(cookies, timeout_second, max_concurrency, user_agent)
+        self.executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix="CommentImages")
+        self.cache_size = cache_size
+        self.cache: OrderedDict[str, str] = OrderedDict()
+        self.lock = threading.Lock()
+        self.logger = Logger("CommentImages")
+
+    def cached(self, photo_id: str):
+        with self.lock:
+            src = self.cache.get(photo_id)
+            if src is not None:
+                self.cache.move_to_end(photo_id)
+            return src
+
+    def remember(self, photo_id: str, src: str):
+        with self.lock:
+            self.cache[photo_id] = src
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def resolve(self, href: str) -> str | None:
+        """
+        The image URL of a photo link, None if it could not be resolved.
+        """
+        key = photo_id(href)
+        src = self.cached(key)
+        if src is not None:
+            return src
+
+        try:
+            root = self.fetcher.get(href)
+        except requests.RequestException as e:
+            self.logger.warning(f"Failed to fetch {href}: {e}")
+            return None
+        srcs = root.xpath("//img[@data-visualcompletion='media-vc-image']/@src")
+        if len(srcs) == 0:
+            return None
+        self.remember(key, srcs[0])
+        return srcs[0]
+
+    def resolve_all(self, hrefs: Sequence[str]) -> list[str | None]:
+        # Every photo is fetched once, however many comments link it
+        unique = {photo_id(href): href for href in reversed(hrefs)}
+        srcs = dict(zip(unique, self.executor.map(self.resolve, unique.values())))
+        return [srcs[photo_id(href)] for href in hrefs]
+
+    def close(self):
+        self.executor.shutdown()
+        self.fetcher.close()
+
+
+def photo_id(href: str):
+    """
+    The `fbid` of a photo link, the link itself if it has none.
+    """
+    return parse_qs(urlparse(href).query).get("fbid", [href])[0]
+
+
+def parse_page(content: bytes, url: str, content_type: str = "") -> HtmlElement:
+    if "/checkpoint" in url:
+        raise CheckpointError(f"Redirected to {url}")
+    # mbasic pages are UTF-8; without a declared charset lxml would guess latin-1
+    encoding = content_type.partition("charset=")[2].split(";")[0].strip() or "utf-8"
+    parser = lxml.html.HTMLParser(encoding=encoding)
+    root = lxml.html.fromstring(content, base_url=url, parser=parser)
+    root.make_links_absolute(url, resolve_base_href=False)
+    return root
+
+
+def parse_timeline(root: HtmlElement, url: str):
+    """
+    Returns the metadata of every post on a parsed timeline page, and the
+    link to the next page (None on the last one).
+    """
+    container = root.find(".//*[@id='structured_composer_async_container']")
+    if container is None:
+        raise RuntimeError(f"No timeline at {url}, the session may have been logged out")
+
+    posts = [
+        PagePostMetadata.from_html(post)
+        for post in container.find(".//section").xpath("article")
+    ]
+    next_page_el = container.xpath("div[1]//a[@href]")
+    next_page_link = next_page_el[0].get("href") \
+                    if len(next_page_el) > 0 \
+                    else None
+    return posts, next_page_link
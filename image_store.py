@@ -0,0 +1,140 @@
+from downloader import ImageDownloader, AsyncImageDownloader
+from urllib.parse import urlparse
+from typing import Iterable
+import threading
+import hashlib
+import pathlib
+import uuid
+import os
+
+class ImageStore:
+    """
+    Content-addressed image store. Every distinct image is written once as
+    `<sha256><ext>`, and a persistent `index.tsv` maps each image's URL path
+    to its hash so that an image seen before never touches the network again.
+
+    CDN URLs are signed with query parameters that change between crawls, so
+    the same image is looked up by its path alone (`key`). New index lines
+    are fsynced once per batch, right after their images are stored.
+    """
+    def __init__(
+        self,
+        save_dir: str,
+        downloader: ImageDownloader | AsyncImageDownloader,
+        ext: str = ".jpg",
+        index_name: str = "index.tsv"
+    ) -> None:
+        """
+        :param save_dir: The directory holding the images and the index.
+        :param downloader: The downloader fetching unseen images, through its own concurrency.
+        :param ext: The file extension of stored images.
+        :param index_name: The file name of the URL path -> hash index.
+        """
+        self.save_dir = pathlib.Path(save_dir)
+        self.incoming_dir = self.save_dir / ".incoming"
+        self.index_path = self.save_dir / index_name
+        self.downloader = downloader
+        self.ext = ext
+        self.lock = threading.Lock()
+
+        os.makedirs(self.incoming_dir, exist_ok=True)
+        self.index = self.load()
+
+    @staticmethod
+    def key(url: str):
+        """
+        The stable part of an image URL: its path, without the signature.
+        """
+        return urlparse(url).path
+
+    def load(self):
+        index = {}
+        if not self.index_path.exists():
+            return index
+        with open(self.index_path, "r") as f:
+            for line in f:
+                url, _, digest = line.rstrip("\n").partition("\t")
+                # A torn last line from a crash has no hash, so it is dropped;
+                # full URLs of older indexes are keyed like new ones
+                if len(digest) == 64:
+                    index[self.key(url)] = digest
+        return index
+
+    def name(self, digest: str):
+        return f"{digest}{self.ext}"
+
+    def path(self, digest: str):
+        return self.save_dir / self.name(digest)
+
+    def get(self, url: str):
+        digest = self.index.get(self.key(url))
+        if digest is None or not self.path(digest).exists():
+            return None
+        return digest
+
+    def put(self, url: str):
+        return self.put_all([url])[url]
+
+    def hash(self, path: pathlib.Path):
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def put_all(self, urls: Iterable[str]):
+        """
+        Stores every unseen image, downloading them all at once, and returns
+        the URL -> hash map. Raises the first failure once the others have
+        been stored.
+        """
+        urls = set(urls)
+        hashes = {}
+        # One download per image, whichever signed URL it came with
+        pending: dict[str, tuple[str, pathlib.Path]] = {}
+        for url in urls:
+            digest = self.get(url)
+            if digest is not None:
+                hashes[url] = digest
+            elif self.key(url) not in pending:
+                pending[self.key(url)] = (url, self.incoming_dir / uuid.uuid4().hex)
+        if not pending:
+            return hashes
+
+        error = None
+        try:
+            self.downloader.download_all(pending.values())
+        except Exception as e:
+            error = e
+
+        lines = []
+        try:
+            for key, (url, tmp_path) in pending.items():
+                if not tmp_path.exists():
+                    continue
+                digest = self.hash(tmp_path)
+                with self.lock:
+                    if not self.path(digest).exists():
+                        os.replace(tmp_path, self.path(digest))
+                    self.index[key] = digest
+                lines.append(f"{key}\t{digest}\n")
+            self.append_index(lines)
+        finally:
+            for _, tmp_path in pending.values():
+                if tmp_path.exists():
+                    os.remove(tmp_path)
+        if error is not None:
+            raise error
+
+        for url in urls - hashes.keys():
+            hashes[url] = self.index[self.key(url)]
+        return hashes
+
+    def append_index(self, lines: list[str]):
+        if not lines:
+            return
+        with self.lock:
+            with open(self.index_path, "a") as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
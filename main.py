@@ -1,6 +1,7 @@
 from engine import Engine
 from crawler import FacebookPageCrawler
-from pipeline import Pipeline, SaveImages, SaveAsCSV
+from pipeline import Pipeline, SaveImages, MakeThumbnails, SaveAsCSV, RECORD_FIELDS
+from work_queue import SharedProgress
 import colors
 import getpass
 
@@ -13,33 +14,48 @@ page_ids = [
 ]
 num_crawlers = len(page_ids)
 group_name = "_".join(page_ids)
+# Set to a SQLite file on a shared volume to spread page_ids over several
+# worker processes/hosts, each running this script with the same page_ids
+shared_queue_path = None
 
-data_pipeline = Pipeline(
-    SaveImages(
-        save_dir=f"{data_dir}/{group_name}/imgs",
-        img_col="images",
-        img_name_format="{post_id}_{cmt_id}_{ordinal}.jpg"
-    ),
-    SaveAsCSV(f"{data_dir}/{group_name}/{group_name}.csv")
-)
+# Guarded: the thumbnail workers are spawned and import this module
+if __name__ == "__main__":
+    data_pipeline = Pipeline(
+        SaveImages(
+            save_dir=f"{data_dir}/{group_name}/imgs",
+            img_col="images",
+            img_name_format="{post_id}_{cmt_id}_{ordinal}.jpg"
+        ),
+        MakeThumbnails(
+            image_dir=f"{data_dir}/{group_name}/imgs",
+            max_size=(480, 480),
+            format="WEBP"
+        ),
+        # A CSV from before MakeThumbnails gets its thumbnail column added
+        SaveAsCSV(
+            f"{data_dir}/{group_name}/{group_name}.csv",
+            columns=[name for name, _ in RECORD_FIELDS]
+        )
+    )
 
-engine = Engine(
-    crawler_type=FacebookPageCrawler,
-    start_urls=[f"https://mbasic.facebook.com/{id}?v=timeline" for id in page_ids],
-    data_pipeline=data_pipeline,
-    progress_dir=f"{data_dir}/{group_name}/progress",
-    num_crawlers=num_crawlers,
-    name_format=f"Crawler-{colors._bold}{{0}}",
-    crawler_kwargs=dict(
-        email=email,
-        password=password,
-        headless=False,
-        mean_std_sleep_second=(13, 4),
-        mean_std_load_cmt_sleep_second=(1, 2),
-        DOM_wait_second=90,
-        mode="both",
-        comment_load_num=0,
-        cookies_dir="./fb-cookies"
+    engine = Engine(
+        crawler_type=FacebookPageCrawler,
+        start_urls=[f"https://mbasic.facebook.com/{id}?v=timeline" for id in page_ids],
+        data_pipeline=data_pipeline,
+        progress_dir=f"{data_dir}/{group_name}/progress",
+        progress=SharedProgress(shared_queue_path) if shared_queue_path else None,
+        num_crawlers=num_crawlers,
+        name_format=f"Crawler-{colors._bold}{{0}}",
+        crawler_kwargs=dict(
+            email=email,
+            password=password,
+            headless=False,
+            mean_std_sleep_second=(13, 4),
+            mean_std_load_cmt_sleep_second=(1, 2),
+            DOM_wait_second=90,
+            mode="both",
+            comment_load_num=0,
+            cookies_dir="./fb-cookies"
+        )
     )
-)
-engine.run()
\ No newline at end of file
+    engine.run()
@@ -0,0 +1,312 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from contextlib import contextmanager
+from logger import Logger
+
+from typing import Iterable
+import threading
+import bisect
+import json
+import time
+import os
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, registry: "Registry", name: str, help: str) -> None:
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.lock = threading.Lock()
+        self.values = {}
+
+    @staticmethod
+    def key(labels: dict[str, str]):
+        return tuple(sorted(labels.items()))
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, value: float = 1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    """
+    Cumulative-bucket histogram; every label set keeps `[bucket counts, sum,
+    count]`.
+    """
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: "Registry",
+        name: str,
+        help: str,
+        buckets: Iterable[float] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(registry, name, help)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        key = self.key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def _time(self, labels: dict):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def time(self, **labels):
+        """
+        Context manager observing the duration of its block.
+        """
+        if not self.registry.enabled:
+            return NULL_TIMER
+        return self._time(labels)
+
+    def quantile(self, q: float, counts: list[int], count: int):
+        # Upper bound of the bucket holding the q-th observation, None past the last bucket
+        rank, seen = q * count, 0
+        for bound, n in zip(self.buckets, counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_TIMER = NullTimer()
+
+
+def format_labels(key: tuple, extra: dict[str, str] = {}):
+    labels = dict(key, **extra)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+class Registry:
+    """
+    Holds every metric. Disabled by default, in which case recording is a
+    single attribute check.
+    """
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.metrics: dict[str, Metric] = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def register(self, metric_type: type[Metric], name: str, help: str, **kwargs):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = metric_type(self, name, help, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name: str, help: str = ""):
+        return self.register(Counter, name, help)
+
+    def gauge(self, name: str, help: str = ""):
+        return self.register(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = "", buckets: Iterable[float] = LATENCY_BUCKETS):
+        return self.register(Histogram, name, help, buckets=buckets)
+
+    def to_prometheus(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            with metric.lock:
+                values = dict(metric.values)
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in values.items():
+                if isinstance(metric, Histogram):
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, n in zip(metric.buckets + (float("inf"),), counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{metric.name}_bucket{format_labels(key, {'le': le})} {cumulative}")
+                    lines.append(f"{metric.name}_sum{format_labels(key)} {total}")
+                    lines.append(f"{metric.name}_count{format_labels(key)} {count}")
+                else:
+                    lines.append(f"{metric.name}{format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        JSON-friendly snapshot: counters and gauges as is, histograms as
+        count/sum/mean/p50/p95 per label set.
+        """
+        summary = {"uptime_second": time.time() - self.started}
+        for metric in list(self.metrics.values()):
+            with metric.lock:
+                values = dict(metric.values)
+            entries = {}
+            for key, value in values.items():
+                label = ",".join(f"{name}={value}" for name, value in key) or "all"
+                if isinstance(metric, Histogram):
+                    counts, total, count = value
+                    entries[label] = {
+                        "count": count,
+                        "sum": total,
+                        "mean": total / count if count else 0.0,
+                        "p50": metric.quantile(0.5, counts, count),
+                        "p95": metric.quantile(0.95, counts, count)
+                    }
+                else:
+                    entries[label] = value
+            summary[metric.name] = entries
+        return summary
+
+    def write_textfile(self, path: str):
+        """
+        Writes the Prometheus exposition atomically, for node_exporter's
+        textfile collector.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """
+        Serves `/metrics` on a daemon thread; returns the server.
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] == "/summary":
+                    body, content_type = json.dumps(registry.summary()).encode(), "application/json"
+                else:
+                    body, content_type = registry.to_prometheus().encode(), "text/plain; version=0.0.4"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="Metrics", daemon=True).start()
+        return server
+
+
+class Reporter:
+    """
+    Every `interval_second`, appends a JSON summary line to `summary_path`
+    (or logs it) and rewrites the Prometheus text file, if given.
+    """
+    def __init__(
+        self,
+        registry: Registry,
+        interval_second: float = 60,
+        summary_path: str | None = None,
+        textfile_path: str | None = None
+    ) -> None:
+        self.registry = registry
+        self.interval_second = interval_second
+        self.summary_path = summary_path
+        self.textfile_path = textfile_path
+        self.logger = Logger("Metrics")
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.loop, name="MetricsReporter", daemon=True)
+        self.server = None
+
+    def report(self):
+        summary = json.dumps(self.registry.summary(), ensure_ascii=False)
+        if self.summary_path is not None:
+            with open(self.summary_path, "a") as f:
+                f.write(summary + "\n")
+        else:
+            self.logger.info(summary)
+        if self.textfile_path is not None:
+            self.registry.write_textfile(self.textfile_path)
+
+    def loop(self):
+        while not self.stop_event.wait(self.interval_second):
+            try:
+                self.report()
+            except Exception as e:
+                self.logger.error(f"Failed to report metrics: {e}")
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.report()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+REGISTRY = Registry()
+
+# Metrics of the crawl, tagged by crawler name
+STAGE_SECONDS = REGISTRY.histogram("crawler_stage_seconds", "Time spent per crawl stage")
+PAGES = REGISTRY.counter("crawler_pages_total", "Pages crawled, by outcome")
+RECORDS = REGISTRY.counter("crawler_records_total", "Records extracted")
+PIPELINE_STEP_SECONDS = REGISTRY.histogram("pipeline_step_seconds", "Time spent per pipeline step")
+PIPELINE_ROWS = REGISTRY.counter("pipeline_rows_total", "Rows entering the pipeline")
+PIPELINE_QUEUE = REGISTRY.gauge("pipeline_queue_size", "Results waiting for the pipeline workers")
+
+def enable(enabled: bool = True):
+    REGISTRY.enabled = enabled
+
+def start(
+    port: int | None = None,
+    textfile_path: str | None = None,
+    summary_path: str | None = None,
+    interval_second: float = 60
+):
+    """
+    Enables recording and starts the exporters; returns a `Reporter` whose
+    `stop` writes the final summary and shuts the endpoint down.
+    """
+    enable()
+    reporter = Reporter(REGISTRY, interval_second, summary_path, textfile_path)
+    if port is not None:
+        reporter.server = REGISTRY.serve(port)
+    reporter.start()
+    return reporter
@@ -0,0 +1,244 @@
+from work_queue import page_key, NoURLAvailable
+
+from collections import deque
+from typing import Callable, Iterable, Hashable
+import time
+
+
+class PageStats:
+    def __init__(self, virtual_time: float) -> None:
+        self.pass_ = virtual_time
+        # The stride charged by the last URL served, settled by its outcome
+        self.charged = 0.0
+        self.crawled = 0
+        self.records = 0.0
+        self.errors = 0.0
+        self.newest = None
+
+
+class PageQueue:
+    """
+    The crawl queue of `Progress`: one FIFO of URLs per source page
+    (`page_key`), the pages served in weighted round-robin (stride
+    scheduling). Serving a page advances its pass by `1 / weight`, and the
+    page with the lowest pass goes next, so every page with URLs gets its
+    turn, and a page of weight 2 gets twice the turns of one of weight 1. A
+    page's weight grows with its recent yield (records per URL relative to
+    the other pages) and shrinks with its recent error rate and the age of
+    the newest post of its last timeline page, so that chains reaching old
+    posts give way to fresh content.
+
+    A page belongs to the worker (crawler) that last took one of its URLs,
+    so its cursor chain stays on one browser session. Other workers take
+    its URLs only when they have nothing else, and never while its owner is
+    crawling one: chains never fork, so a worker left without a page of its
+    own stops rather than share one. A worker keeps to the page it just
+    crawled for up to `stickiness` turns ahead of the others.
+
+    Keeps the `deque` methods `Progress` relies on.
+    """
+    def __init__(
+        self,
+        urls: Iterable[str] = (),
+        yield_weight: float = 0.5,
+        error_weight: float = 1.0,
+        freshness_weight: float = 2.0,
+        freshness_half_life_second: float = 6 * 3600,
+        stickiness: float = 1.0,
+        smoothing: float = 0.3,
+        clock: Callable[[], float] = time.time
+    ) -> None:
+        """
+        :param urls: The initial queue.
+        :param yield_weight: The exponent of the yield ratio in the weight, 0 to ignore yield.
+        :param error_weight: The exponent of the success rate in the weight, 0 to ignore errors.
+        :param freshness_weight: The exponent of the freshness factor in the weight, 0 to ignore post age.
+        :param freshness_half_life_second: The post age halving the weight of a page.
+        :param stickiness: The turns a worker stays ahead on the page it just crawled, 0 for strict round-robin.
+        :param smoothing: The factor of the moving averages of yield and errors.
+        :param clock: The time source of freshness.
+        """
+        self.yield_weight = yield_weight
+        self.error_weight = error_weight
+        self.freshness_weight = freshness_weight
+        self.freshness_half_life_second = freshness_half_life_second
+        self.stickiness = stickiness
+        self.smoothing = smoothing
+        self.clock = clock
+
+        self.queues: dict[str, deque[str]] = {}
+        self.stats: dict[str, PageStats] = {}
+        self.owners: dict[str, Hashable] = {}
+        self.in_flight: dict[Hashable, str] = {}
+        self.counts: dict[str, int] = {}
+        self.length = 0
+        self.virtual_time = 0.0
+        self.mean_records = 0.0
+        for url in urls:
+            self.append(url)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for queue in list(self.queues.values()):
+            yield from list(queue)
+
+    def __contains__(self, url: str):
+        return url in self.counts
+
+    def __eq__(self, other):
+        # The same URLs in the same order per page
+        return isinstance(other, PageQueue) and self.queues == other.queues
+
+    def page(self, url: str):
+        key = page_key(url)
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = PageStats(self.virtual_time)
+        elif len(queue) == 0:
+            # A page coming back does not get the turns it missed
+            stats.pass_ = max(stats.pass_, self.virtual_time)
+        return key, queue
+
+    def added(self, url: str):
+        self.counts[url] = self.counts.get(url, 0) + 1
+        self.length += 1
+
+    def removed(self, key: str, url: str):
+        if self.counts[url] == 1:
+            del self.counts[url]
+        else:
+            self.counts[url] -= 1
+        self.length -= 1
+        if len(self.queues[key]) == 0:
+            del self.queues[key]
+
+    def append(self, url: str):
+        _, queue = self.page(url)
+        queue.append(url)
+        self.added(url)
+
+    def appendleft(self, url: str):
+        _, queue = self.page(url)
+        queue.appendleft(url)
+        self.added(url)
+
+    def extendleft(self, urls: Iterable[str]):
+        for url in urls:
+            self.appendleft(url)
+
+    def remove(self, url: str):
+        key = page_key(url)
+        queue = self.queues.get(key)
+        if queue is None:
+            raise ValueError(f"{url} is not in the queue")
+        queue.remove(url)
+        self.removed(key, url)
+
+    def peek(self):
+        key = self.select(None, None)
+        if key is None:
+            raise IndexError("peek from an empty queue")
+        return self.queues[key][0]
+
+    def busy(self, worker: Hashable):
+        return {key for other, key in self.in_flight.items() if other != worker}
+
+    def available(self, worker: Hashable = None):
+        """
+        The number of URLs `worker` may take, those of pages no other worker is crawling.
+        """
+        return self.length - sum(len(self.queues[key]) for key in self.busy(worker) if key in self.queues)
+
+    def select(self, worker: Hashable, previous: str | None):
+        # Own or free pages first, then pages of idle owners
+        busy = self.busy(worker)
+        best, best_rank = None, None
+        for key in self.queues:
+            if key in busy:
+                continue
+            owner = self.owners.get(key)
+            tier = 0 if owner is None or owner == worker else 1
+            pass_ = self.stats[key].pass_ - (self.stickiness if key == previous else 0)
+            rank = (tier, pass_, owner != worker)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = key, rank
+        return best
+
+    def pop(self, worker: Hashable = None):
+        """
+        The next URL for `worker`, which is done with the URL it took last.
+        """
+        previous = self.in_flight.pop(worker, None)
+        key = self.select(worker, previous)
+        if key is None:
+            raise NoURLAvailable("No URL available to this worker")
+        url = self.queues[key].popleft()
+        self.removed(key, url)
+
+        stats = self.stats[key]
+        self.virtual_time = max(self.virtual_time, stats.pass_)
+        stats.charged = 1 / self.weight(key)
+        stats.pass_ += stats.charged
+        # Pages of the worker whose chain has ended are free again
+        for owned in [owned for owned, owner in self.owners.items() if owner == worker and owned not in self.queues]:
+            del self.owners[owned]
+        self.owners[key] = worker
+        self.in_flight[worker] = key
+        return url
+
+    def release(self, worker: Hashable):
+        """
+        Frees the pages of a worker that stops.
+        """
+        self.in_flight.pop(worker, None)
+        for key in [key for key, owner in self.owners.items() if owner == worker]:
+            del self.owners[key]
+
+    def weight(self, key: str):
+        stats = self.stats[key]
+        yield_ratio = stats.records / self.mean_records \
+                    if stats.crawled > 0 and self.mean_records > 0 \
+                    else 1.0
+        weight = min(max(yield_ratio, 0.25), 4.0) ** self.yield_weight
+        weight *= max(1 - stats.errors, 0.05) ** self.error_weight
+        if stats.newest is not None:
+            age = max(self.clock() - stats.newest, 0)
+            weight *= max(0.5 ** (age / self.freshness_half_life_second), 0.05) ** self.freshness_weight
+        return weight
+
+    def record(self, url: str, records: int, failed: bool = False):
+        """
+        Updates the moving averages of a page with the outcome of one of
+        its URLs, and charges the URL at the weight they give.
+        """
+        key = page_key(url)
+        stats = self.stats.get(key)
+        if stats is None:
+            return
+        a = self.smoothing
+        stats.errors = a * failed + (1 - a) * stats.errors
+        if not failed:
+            stats.records = a * records + (1 - a) * stats.records \
+                            if stats.crawled > 0 \
+                            else records
+            stats.crawled += 1
+            self.mean_records = a * records + (1 - a) * self.mean_records \
+                                if self.mean_records > 0 \
+                                else records
+        if stats.charged > 0:
+            charged = 1 / self.weight(key)
+            stats.pass_ += charged - stats.charged
+            stats.charged = 0.0
+
+    def fresh(self, key: str, timestamp: float):
+        """
+        The newest post of the timeline page of `key` just walked.
+        """
+        stats = self.stats.get(key)
+        if stats is not None:
+            stats.newest = timestamp
@@ -1,16 +1,96 @@
 from selenium import webdriver
 from pandas import DataFrame
-from typing import Sequence, Callable, Any
+from typing import Sequence, Sized, Callable, Any
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from downloader import ImageDownloader, AsyncImageDownloader
+from image_store import ImageStore
+from logger import Logger
+from metrics import PIPELINE_STEP_SECONDS, PIPELINE_ROWS, PIPELINE_QUEUE
+from transactions import Transaction, TRANSACTIONS, LOCK
+import pandas as pd
+import multiprocessing
+import shutil
+import threading
+import traceback
+import queue
+import time
+import uuid
 import os
 import pathlib
-import requests
+
+# (name, arrow type) of every field produced by the extractors and SaveImages
+RECORD_FIELDS: list[tuple[str, str]] = [
+    ("page_id", "string"),
+    ("post_id", "string"),
+    ("post_url", "string"),
+    ("cmt_id", "string"),
+    ("cmt_url", "string"),
+    ("datetime", "timestamp[us]"),
+    ("text", "string"),
+    ("images", "string"),
+    ("type", "string"),
+    ("image_paths", "string"),
+    ("thumbnail_paths", "string"),
+    ("reencoded_paths", "string"),
+]
+# Column tagging every row with the transaction of its page, dropped by the sinks
+TRANSACTION_COL = "_transaction"
+
+
+class Records(list):
+    """
+    Crawled records tagged with the transactions (see `transactions.py`) of
+    the pages they come from, as `(transaction id, number of records)`
+    segments. A page without records still has its segment, so that its
+    transaction is committed too.
+    """
+    def __init__(self, records: Sequence[dict] = (), segments: Sequence[tuple[str, int]] = ()) -> None:
+        super().__init__(records)
+        self.segments = list(segments)
+
+    @classmethod
+    def of(cls, records: Sequence[dict] | None, transaction_id: str):
+        records = records or []
+        return cls(records, [(transaction_id, len(records))])
+
+
+def transaction_ids(data: Any) -> list[str]:
+    if isinstance(data, Records):
+        return [transaction_id for transaction_id, _ in data.segments]
+    if isinstance(data, DataFrame):
+        return list(data.attrs.get("transactions", ()))
+    return []
+
+
+def end_transactions(data: Any, commit: bool):
+    """
+    Prepares (commits once their parents have) or rolls back the
+    transactions of `data`.
+    """
+    for transaction_id in transaction_ids(data):
+        with LOCK:
+            transaction = TRANSACTIONS.get(transaction_id)
+        if transaction is None:
+            continue
+        if commit:
+            transaction.prepare()
+        else:
+            transaction.rollback()
+
 
 class Pipeline:
     def __init__(
         self,
-        *steps: Callable[[Any], Any]
+        *steps: Callable[[Any], Any],
+        batch: "MicroBatch | None" = None
     ) -> None:
+        """
+        :param steps: The steps run, in order, on every crawled result.
+        :param batch: An optional accumulator placed in front of everything,
+            so that the rest of the pipeline runs on large batches.
+        """
         self.steps = [
+            *([batch] if batch is not None else []),
             AsDataFrame(), 
             *steps
         ]
@@ -18,94 +98,579 @@ class Pipeline:
     def __call__(
         self,
         input: Any
+    ) -> Any:
+        try:
+            return self.run(input)
+        except:
+            # The crawler redoes the pages; rows held back by a MicroBatch
+            # keep their transactions open
+            end_transactions(input, commit=False)
+            raise
+
+    def run(
+        self,
+        input: Any,
+        start: int = 0
     ) -> Any:
         result = input
-        for step in self.steps:
-            result = step(result)
+        for i in range(start, len(self.steps)):
+            step = self.steps[i]
+            with PIPELINE_STEP_SECONDS.time(step=type(step).__name__):
+                result = step(result)
+            # Held back by an accumulating step, nothing left to do for now
+            if result is None:
+                return None
+
+            if isinstance(step, MicroBatch):
+                batch = result
+                try:
+                    result = self.run(batch, i+1)
+                except:
+                    step.restore(batch)
+                    raise
+                step.done(batch)
+                return result
+        # Every step is done with these records: commit their pages
+        end_transactions(input, commit=True)
         return result
     
     def add(self, step: Callable[[Any], Any]):
         self.steps.append(step)
 
+    def flush(self):
+        """
+        Pushes whatever accumulating steps still hold through the rest of
+        the pipeline.
+        """
+        for i, step in enumerate(self.steps):
+            if isinstance(step, MicroBatch):
+                batch = step.flush()
+                if batch is not None:
+                    try:
+                        self.run(batch, i+1)
+                    except:
+                        step.restore(batch)
+                        raise
+                    step.done(batch)
+
+    def recover(self, committed: Callable[[str], bool]):
+        """
+        Lets the steps staging output per transaction publish what the
+        progress committed before a crash and discard the rest.
+
+        :param committed: Whether a transaction id was committed, eg. `Progress.committed`.
+        """
+        for step in self.steps:
+            if hasattr(step, "recover"):
+                step.recover(committed)
+
+    def close(self):
+        """
+        Flushes buffered rows, then releases every step holding buffers or
+        resources (eg. open files, download workers).
+        """
+        self.flush()
+        for step in self.steps:
+            if hasattr(step, "close"):
+                step.close()
+
+
+class PipelineExecutor:
+    """
+    Runs a Pipeline on dedicated worker threads, so crawlers keep browsing
+    while images download and files are written. Results are handed over
+    through a bounded queue: once `queue_size` results are waiting, `submit`
+    blocks the crawler until the sinks catch up.
+    """
+    def __init__(
+        self,
+        pipeline: Pipeline,
+        num_workers: int = 1,
+        queue_size: int = 16,
+        name: str = "Pipeline"
+    ) -> None:
+        """
+        :param pipeline: The pipeline run on every submitted result.
+        :param num_workers: The number of threads draining the queue.
+        :param queue_size: The number of results waiting before submitters block.
+        :param name: The logger and thread name prefix.
+        """
+        self.pipeline = pipeline
+        self.queue: queue.Queue[tuple[Any, Future] | None] = queue.Queue(maxsize=queue_size)
+        self.name = name
+        self.logger = Logger(name)
+        self.workers = [
+            threading.Thread(target=self.work, name=f"{name}-{i+1}", daemon=True)
+            for i in range(num_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def __call__(self, input: Any) -> Future:
+        return self.submit(input)
+
+    def submit(self, input: Any) -> Future:
+        future = Future()
+        if isinstance(input, Sized):
+            PIPELINE_ROWS.inc(len(input))
+        self.queue.put((input, future))
+        PIPELINE_QUEUE.set(self.queue.qsize(), pipeline=self.name)
+        return future
+
+    def work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+
+            input, future = item
+            try:
+                future.set_result(self.pipeline(input))
+            except Exception as e:
+                self.logger.error(f"Pipeline failed on a result:\n{traceback.format_exc()}")
+                future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    def shutdown(self):
+        """
+        Drains every queued result, stops the workers, then closes the pipeline.
+        """
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.pipeline.close()
+
+    def close(self):
+        self.shutdown()
+
 
 class AsDataFrame:
     def __call__(self, data: dict[str, Any]) -> Any:
         if not isinstance(data, Sequence):
             data = [data]
         df = DataFrame(data)
+        if isinstance(data, Records):
+            df[TRANSACTION_COL] = [
+                transaction_id
+                for transaction_id, rows in data.segments
+                for _ in range(rows)
+            ]
+            df.attrs["transactions"] = transaction_ids(data)
         return df
 
 
+class MicroBatch:
+    """
+    Accumulates crawled results and releases them as one batch once
+    `max_rows` rows or `max_bytes` bytes are buffered, or the oldest buffered
+    row has waited `max_latency_second` (checked whenever a result arrives).
+    Whatever is left is released by `Pipeline.flush`/`Pipeline.close`.
+
+    If the rest of the pipeline fails on a batch, the rows buffered by earlier
+    calls are restored for the next attempt, while the rows of the call that
+    triggered the batch are dropped: that call raises and rolls back its
+    page, so its crawler retries the page and produces them again. The pages
+    of buffered rows are committed once their batch has gone through.
+    """
+    def __init__(
+        self,
+        max_rows: int = 5_000,
+        max_bytes: int = 64 * 1024**2,
+        max_latency_second: float = 300
+    ) -> None:
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_latency_second = max_latency_second
+
+        self.lock = threading.Lock()
+        self.chunks: list[list[dict] | DataFrame] = []
+        self.rows = 0
+        self.bytes = 0
+        self.oldest_buffered = None
+        # Batches handed downstream, mapped to the chunks restored on failure
+        self.in_flight: dict[int, list] = {}
+
+    def measure(self, chunk: list[dict] | DataFrame):
+        if isinstance(chunk, DataFrame):
+            return len(chunk), int(chunk.memory_usage(deep=True).sum())
+        size = sum(
+            len(value) if isinstance(value, str) else 8
+            for record in chunk
+            for value in record.values()
+        )
+        return len(chunk), size
+
+    def drain(self, restorable: list):
+        if not self.chunks:
+            return None
+        if all(isinstance(chunk, DataFrame) for chunk in self.chunks):
+            batch = pd.concat(self.chunks, ignore_index=True)
+            batch.attrs["transactions"] = [
+                transaction_id
+                for chunk in self.chunks
+                for transaction_id in transaction_ids(chunk)
+            ]
+        else:
+            batch = Records(
+                [record for chunk in self.chunks for record in chunk],
+                [segment for chunk in self.chunks for segment in getattr(chunk, "segments", ())]
+            )
+
+        self.in_flight[id(batch)] = restorable
+        self.chunks = []
+        self.rows = 0
+        self.bytes = 0
+        self.oldest_buffered = None
+        return batch
+
+    def __call__(self, data: Any) -> Any:
+        if not isinstance(data, (Sequence, DataFrame)):
+            data = [data]
+        with self.lock:
+            rows, size = self.measure(data)
+            # A page without records is kept for its transaction
+            buffered = rows > 0 or len(transaction_ids(data)) > 0
+            if buffered:
+                self.chunks.append(data)
+                self.rows += rows
+                self.bytes += size
+                if self.oldest_buffered is None:
+                    self.oldest_buffered = time.monotonic()
+
+            if self.chunks and (
+                self.rows >= self.max_rows
+                or self.bytes >= self.max_bytes
+                or time.monotonic() - self.oldest_buffered >= self.max_latency_second
+            ):
+                restorable = self.chunks[:-1] if buffered else list(self.chunks)
+                return self.drain(restorable)
+        return None
+
+    def flush(self):
+        with self.lock:
+            return self.drain(list(self.chunks))
+
+    def done(self, batch: Any):
+        with self.lock:
+            self.in_flight.pop(id(batch), None)
+
+    def restore(self, batch: Any):
+        with self.lock:
+            chunks = self.in_flight.pop(id(batch), [])
+            self.chunks[:0] = chunks
+            for chunk in chunks:
+                rows, size = self.measure(chunk)
+                self.rows += rows
+                self.bytes += size
+            if chunks and self.oldest_buffered is None:
+                self.oldest_buffered = time.monotonic()
+
+
 class SaveImages:
     def __init__(
         self,
         save_dir: str,
         img_col: str = "images",
         img_name_format: str = "{post_id}_{cmt_id}_{ordinal}.jpg",
+        num_workers: int = 8,
+        timeout_second: float = 30,
+        max_retries: int = 3,
+        content_addressed: bool = False,
+        downloader: ImageDownloader | AsyncImageDownloader | None = None
     ) -> None:
         self.img_col = img_col
         self.save_dir = pathlib.Path(save_dir)
         self.img_name_format = img_name_format
+        self.downloader = downloader \
+                        if downloader is not None \
+                        else ImageDownloader(
+                            num_workers=num_workers,
+                            timeout_second=timeout_second,
+                            max_retries=max_retries
+                        )
+        # Store each distinct image once under its content hash
+        self.store = ImageStore(save_dir, self.downloader) \
+                    if content_addressed \
+                    else None
 
         if not self.save_dir.exists():
             os.makedirs(self.save_dir, exist_ok=True)
     
-    def save_img(
+    def img_name(
         self,
-        url: str,
         post_id: str,
         cmt_id: str,
         ordinal: int
     ):
-        img_name = self.img_name_format.format(
+        return self.img_name_format.format(
             post_id=post_id,
             cmt_id=cmt_id,
             ordinal=ordinal
         )
-        img_path = self.save_dir / img_name
-        img_data = requests.get(url).content
-        if os.path.exists(img_path):
-            return img_name
-    
-        with open(img_path, "wb") as f:
-            f.write(img_data)
+
+    def save_img(
+        self,
+        url: str,
+        post_id: str,
+        cmt_id: str,
+        ordinal: int
+    ):
+        img_name = self.img_name(post_id, cmt_id, ordinal)
+        self.downloader.download(url, self.save_dir / img_name)
         return img_name
 
     def __call__(
         self, 
         df: DataFrame,
     ) -> Any:
-        if not df.empty:
-            is_post = df["type"] == "post"
-
-        for tp in df.itertuples():
-            post_img = df.loc[(df["post_id"] == tp.post_id) & is_post, "images"].values[0]
-
-            img_files = []
-            imgs = tp.images.split()
-            for i, url in enumerate(imgs):
-                img_file = self.save_img(
-                    url=url,
-                    post_id=tp.post_id,
-                    cmt_id=tp.cmt_id \
-                            if tp.images != post_img \
-                            else "",
-                    ordinal=i
-                )
-                img_files.append(img_file)
-            df.loc[tp.Index, "image_paths"] = "   ".join(img_files)
-        
+        if df.empty:
+            return df
+        if self.store is not None:
+            return self.save_content_addressed(df)
+
+        # Rows sharing their post's images (ie. the post itself and comments
+        # without attachment) save them under the post's name
+        is_post = df["type"] == "post"
+        post_imgs = df.loc[is_post].drop_duplicates("post_id").set_index("post_id")["images"]
+        cmt_ids = df["cmt_id"].where(df["images"] != df["post_id"].map(post_imgs), "")
+
+        tasks = []
+        image_paths = []
+        for post_id, cmt_id, urls in zip(df["post_id"], cmt_ids, df["images"].str.split()):
+            img_files = [
+                self.img_name(post_id=post_id, cmt_id=cmt_id, ordinal=i)
+                for i in range(len(urls))
+            ]
+            tasks.extend(zip(urls, img_files))
+            image_paths.append("   ".join(img_files))
+        df["image_paths"] = image_paths
+
+        self.downloader.download_all(
+            (url, self.save_dir / img_file)
+            for url, img_file in tasks
+        )
         return df
+
+    def save_content_addressed(self, df: DataFrame):
+        imgs = df["images"].str.split()
+        hashes = self.store.put_all(
+            url
+            for urls in imgs
+            for url in urls
+        )
+        df["image_paths"] = [
+            "   ".join(self.store.name(hashes[url]) for url in urls)
+            for urls in imgs
+        ]
+        return df
+
+    def close(self):
+        self.downloader.close()
         
 
+def make_thumbnail(
+    src: str,
+    dst: str,
+    max_size: tuple[int, int],
+    format: str,
+    quality: int,
+    reencode_dst: str | None,
+    reencode_quality: int | None
+):
+    """
+    Runs in the worker processes of `MakeThumbnails`; returns False if the
+    image is missing.
+    """
+    from PIL import Image
+
+    if not os.path.exists(src):
+        return False
+    if reencode_quality is not None and not os.path.exists(reencode_dst):
+        # The original is copied as is if re-encoding does not shrink it
+        tmp = f"{reencode_dst}.{os.getpid()}.tmp"
+        with Image.open(src) as img:
+            img.convert("RGB").save(tmp, format="JPEG", quality=reencode_quality, optimize=True)
+        if os.path.getsize(tmp) >= os.path.getsize(src):
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, reencode_dst)
+    with Image.open(src) as img:
+        img.draft("RGB", max_size)
+        img = img.convert("RGB")
+        img.thumbnail(max_size)
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        img.save(tmp, format=format, quality=quality)
+    os.replace(tmp, dst)
+    return True
+
+
+class MakeThumbnails:
+    """
+    Resizes the images saved by `SaveImages` into thumbnails, in a process
+    pool, and records their paths (relative to `image_dir`, like
+    `image_paths`) in `thumbnail_paths`. Optionally writes copies of the
+    originals re-encoded at `reencode_quality` under `reencode_dir`, listed
+    in `reencoded_paths`; the originals are left as served, so the names of
+    a content-addressed `SaveImages` keep matching their bytes. An image
+    whose outputs exist is skipped, so retried batches and images shared by
+    many rows cost nothing.
+    """
+    def __init__(
+        self,
+        image_dir: str,
+        thumbnail_dir: str = "thumbs",
+        max_size: tuple[int, int] = (480, 480),
+        format: str = "WEBP",
+        quality: int = 75,
+        reencode_quality: int | None = None,
+        reencode_dir: str = "reencoded",
+        num_workers: int | None = None,
+        path_col: str = "image_paths"
+    ) -> None:
+        """
+        :param image_dir: The `save_dir` of `SaveImages`.
+        :param thumbnail_dir: The thumbnail directory, relative to `image_dir`.
+        :param max_size: The largest width and height of thumbnails.
+        :param format: The Pillow format of thumbnails, eg. "WEBP" or "JPEG".
+        :param quality: The encoding quality of thumbnails.
+        :param reencode_quality: The JPEG quality of the re-encoded copies, None for no copies.
+        :param reencode_dir: The directory of the re-encoded copies, relative to `image_dir`.
+        :param num_workers: The number of worker processes, the CPU count by default.
+        :param path_col: The column holding the image names.
+        """
+        try:
+            import PIL
+        except ImportError as e:
+            raise ImportError("MakeThumbnails requires Pillow: pip install pillow") from e
+
+        self.image_dir = pathlib.Path(image_dir)
+        self.thumbnail_dir = thumbnail_dir
+        self.max_size = tuple(max_size)
+        self.format = format
+        self.quality = quality
+        self.reencode_quality = reencode_quality
+        self.reencode_dir = reencode_dir
+        self.num_workers = num_workers
+        self.path_col = path_col
+        self.ext = ".jpg" if format.upper() in ("JPEG", "JPG") else f".{format.lower()}"
+        self.logger = Logger("MakeThumbnails")
+        # Created before the pipeline runs and spawned rather than forked:
+        # a fork of this multi-threaded process can deadlock on a lock
+        # another thread held (eg. an import or logging lock)
+        self.pool = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+        os.makedirs(self.image_dir / self.thumbnail_dir, exist_ok=True)
+        if reencode_quality is not None:
+            os.makedirs(self.image_dir / self.reencode_dir, exist_ok=True)
+
+    def thumbnail_name(self, img_name: str):
+        return f"{self.thumbnail_dir}/{pathlib.PurePath(img_name).stem}{self.ext}"
+
+    def reencoded_name(self, img_name: str):
+        if self.reencode_quality is None:
+            return None
+        return f"{self.reencode_dir}/{pathlib.PurePath(img_name).stem}.jpg"
+
+    def done(self, img_name: str, thumbnail: str):
+        reencoded = self.reencoded_name(img_name)
+        return (self.image_dir / thumbnail).exists() \
+            and (reencoded is None or (self.image_dir / reencoded).exists())
+
+    def __call__(
+        self,
+        df: DataFrame
+    ) -> Any:
+        if df.empty or self.path_col not in df:
+            return df
+
+        img_names = df[self.path_col].fillna("").str.split()
+        thumbnails = {
+            img_name: self.thumbnail_name(img_name)
+            for names in img_names
+            for img_name in names
+        }
+        futures = {
+            self.pool.submit(
+                make_thumbnail,
+                str(self.image_dir / img_name),
+                str(self.image_dir / thumbnail),
+                self.max_size,
+                self.format,
+                self.quality,
+                str(self.image_dir / self.reencoded_name(img_name)) if self.reencode_quality is not None else None,
+                self.reencode_quality
+            ): img_name
+            for img_name, thumbnail in thumbnails.items()
+            if not self.done(img_name, thumbnail)
+        }
+        failed = set()
+        for future in as_completed(futures):
+            try:
+                made = future.result()
+            except Exception:
+                self.logger.error(f"Thumbnail failed for {futures[future]}:\n{traceback.format_exc()}")
+                made = False
+            if not made:
+                failed.add(futures[future])
+
+        df["thumbnail_paths"] = [
+            "   ".join(thumbnails[img_name] for img_name in names if img_name not in failed)
+            for names in img_names
+        ]
+        if self.reencode_quality is not None:
+            df["reencoded_paths"] = [
+                "   ".join(self.reencoded_name(img_name) for img_name in names if img_name not in failed)
+                for names in img_names
+            ]
+        return df
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
 class SaveAsCSV:
+    """
+    Appends the records to a CSV file. Rows tagged with transactions are
+    staged per transaction under `<path>.staging/` and only appended once
+    the transaction commits; before appending, a line `<id>\t<offset>` is
+    written to `<path>.commits`, so that `recover` can cut off an append torn
+    by a crash and redo it. The file then holds each committed page once.
+
+    Rows are written with the columns of the file's header, missing ones
+    left empty; a frame bringing a column the header lacks raises. Declared
+    `columns` missing from an existing header are added on the first write,
+    by rewriting the file (readers then have to reopen it).
+    """
     def __init__(
         self,
         path: str,
+        columns: Sequence[str] | None = None
     ) -> None:
+        """
+        :param path: The CSV file, appended to if it exists.
+        :param columns: The columns of the file, in order; by default those
+            of its header, or of the first frame written to a new file.
+        """
         self.path = pathlib.Path(path)
         if not self.path.parent:
             os.makedirs(self.path.parent, exist_ok=True)
+        self.staging_dir = self.path.with_name(self.path.name + ".staging")
+        self.commits_path = self.path.with_name(self.path.name + ".commits")
+        self.declared = list(columns) if columns is not None else None
+        self.columns: list[str] | None = None
+        self.logger = Logger("SaveAsCSV")
+        self.lock = threading.Lock()
+        self.header_written = self.path.exists()
+
+    def staged_path(self, transaction_id: str):
+        return self.staging_dir / f"{transaction_id}.csv"
 
     def __call__(
         self,
@@ -113,11 +678,334 @@ class SaveAsCSV:
     ) -> Any:
         if df.empty:
             return df
-        df.to_csv(
-            self.path,
-            index=False,
-            mode="a",
-            header=not os.path.exists(self.path)
+        rows = self.conform(df)
+        if TRANSACTION_COL in df:
+            self.stage(rows)
+            return df
+        with self.lock:
+            rows.to_csv(
+                self.path,
+                index=False,
+                mode="a",
+                header=not self.header_written
+            )
+            self.header_written = True
+
+        return df
+
+    def conform(self, df: DataFrame):
+        """
+        `df` with the columns of the file, in order.
+        """
+        with self.lock:
+            if self.columns is None:
+                self.columns = self.load_columns(df)
+        extra = [column for column in df.columns if column not in self.columns and column != TRANSACTION_COL]
+        if extra:
+            raise ValueError(f"Columns {extra} are not in the header of {self.path}, declare them in `columns` to add them")
+        return df.reindex(columns=self.columns + ([TRANSACTION_COL] if TRANSACTION_COL in df else []))
+
+    def load_columns(self, df: DataFrame):
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            return self.declared or [column for column in df.columns if column != TRANSACTION_COL]
+        header = pd.read_csv(self.path, nrows=0).columns.tolist()
+        missing = [column for column in self.declared or () if column not in header]
+        if missing:
+            self.add_columns(header, missing)
+        return header + missing
+
+    def add_columns(self, header: list[str], missing: list[str]):
+        """
+        Rewrites the file with `missing` columns, empty, after `header`.
+        """
+        self.logger.warning(f"Adding columns {missing} to {self.path}")
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", newline="") as f:
+            pd.DataFrame(columns=header + missing).to_csv(f, index=False)
+            for chunk in pd.read_csv(self.path, dtype=str, keep_default_na=False, chunksize=100_000):
+                chunk.reindex(columns=header + missing).to_csv(f, index=False, header=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # Offsets of earlier appends, all complete after `recover`, no longer hold
+        self.commits_path.unlink(missing_ok=True)
+
+    def stage(self, df: DataFrame):
+        os.makedirs(self.staging_dir, exist_ok=True)
+        for transaction_id, rows in df.groupby(TRANSACTION_COL, sort=False):
+            with LOCK:
+                transaction = TRANSACTIONS.get(transaction_id)
+            if transaction is None:
+                continue
+            # A retried batch stages the same rows again, over the same file
+            staged_path = self.staged_path(transaction_id)
+            with open(staged_path, "w", newline="") as f:
+                rows.drop(columns=TRANSACTION_COL).to_csv(f, index=False)
+                f.flush()
+                os.fsync(f.fileno())
+            if not transaction.on_finish(
+                self,
+                lambda transaction_id=transaction_id: self.publish(transaction_id),
+                lambda staged_path=staged_path: staged_path.unlink(missing_ok=True)
+            ):
+                staged_path.unlink(missing_ok=True)
+
+    def publish(self, transaction_id: str, offset: int | None = None):
+        """
+        Appends the staged rows of a committed transaction, from `offset` if
+        a previous attempt was cut off there.
+        """
+        staged_path = self.staged_path(transaction_id)
+        with self.lock:
+            with open(staged_path, "r", newline="") as f_staged:
+                header = f_staged.readline()
+                body = f_staged.read()
+            with open(self.path, "a+", newline="") as f:
+                if offset is not None:
+                    f.truncate(offset)
+                else:
+                    offset = f.seek(0, os.SEEK_END)
+                    with open(self.commits_path, "a") as f_commits:
+                        f_commits.write(f"{transaction_id}\t{offset}\n")
+                        f_commits.flush()
+                        os.fsync(f_commits.fileno())
+                f.write(body if offset > 0 else header + body)
+                f.flush()
+                os.fsync(f.fileno())
+            self.header_written = True
+            # The staged file is gone once its rows are in
+            os.remove(staged_path)
+
+    def recover(self, committed: Callable[[str], bool]):
+        """
+        Publishes the staged rows of transactions committed before a crash
+        and discards those of the others.
+        """
+        if not self.staging_dir.exists():
+            return
+        offsets = {}
+        if self.commits_path.exists():
+            with open(self.commits_path, "r") as f:
+                for line in f:
+                    transaction_id, _, offset = line.strip().partition("\t")
+                    if offset:
+                        offsets[transaction_id] = int(offset)
+
+        # An append cut off by a crash (at most one) is redone first
+        staged = sorted(
+            self.staging_dir.glob("*.csv"),
+            key=lambda path: path.stem not in offsets
         )
+        for staged_path in staged:
+            transaction_id = staged_path.stem
+            if committed(transaction_id):
+                self.publish(transaction_id, offsets.get(transaction_id))
+            else:
+                staged_path.unlink()
+        self.header_written = self.path.exists() and self.path.stat().st_size > 0
+
+    def close(self):
+        # Nothing left to recover: forget the offsets
+        with self.lock:
+            if not any(self.staging_dir.glob("*.csv")) and self.commits_path.exists():
+                os.remove(self.commits_path)
+
+
+class SaveAsParquet:
+    """
+    Columnar sink writing the records as Parquet part files under a dataset
+    directory. Rows are buffered and written once `row_group_size` rows are
+    pending or `flush_interval_second` has passed since the oldest one
+    (checked by a timer, so a quiet crawler flushes too). Every flush writes
+    a complete part, renamed to `*.parquet` once closed, so readers never
+    see a torn file and a crash loses at most the buffered rows. Parts
+    left half-written by a crash have no footer and are removed on start.
+
+    Rows tagged with transactions hold their pages' commits until the part
+    holding them is published, so a crash before that redoes the pages
+    instead of losing their rows. A crash between publishing a part and
+    committing its pages redoes them too: the sink is at-least-once.
+    """
+    def __init__(
+        self,
+        dir_path: str,
+        row_group_size: int = 50_000,
+        flush_interval_second: float = 300,
+        compression: str = "zstd"
+    ) -> None:
+        """
+        :param dir_path: The dataset directory receiving the part files.
+        :param row_group_size: The number of buffered rows triggering a write.
+        :param flush_interval_second: The longest time a row stays buffered.
+        :param compression: The Parquet compression codec.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("SaveAsParquet requires pyarrow: pip install pyarrow") from e
+        self.pa, self.pq = pa, pq
+
+        self.dir_path = pathlib.Path(dir_path)
+        self.row_group_size = row_group_size
+        self.flush_interval_second = flush_interval_second
+        self.compression = compression
+        self.schema = pa.schema([
+            (name, pa.type_for_alias(arrow_type))
+            for name, arrow_type in RECORD_FIELDS
+        ])
+        self.logger = Logger("SaveAsParquet")
+
+        self.lock = threading.Lock()
+        self.buffer: list[DataFrame] = []
+        self.buffered_rows = 0
+        self.oldest_buffered = None
+        # Transactions holding buffered rows, written ones not finished yet
+        # and rolled back ones whose buffered rows are dropped
+        self.holding: dict[str, Transaction] = {}
+        self.written: set[str] = set()
+        self.discarded: set[str] = set()
+        # Outcomes of finished transactions, applied to the sets above by `settle`
+        self.settlements: queue.SimpleQueue[tuple[str, bool]] = queue.SimpleQueue()
+
+        os.makedirs(self.dir_path, exist_ok=True)
+        self.remove_orphans()
+        self.stop_event = threading.Event()
+        self.timer = threading.Thread(target=self.loop, name="SaveAsParquet", daemon=True)
+        self.timer.start()
+
+    def remove_orphans(self):
+        for tmp_path in self.dir_path.glob(".part-*.tmp"):
+            self.logger.warning(f"Removing part {tmp_path.name} left unfinished by a previous run")
+            tmp_path.unlink()
+
+    def to_table(self, df: DataFrame):
+        df = df.reindex(columns=self.schema.names)
+        df["datetime"] = pd.to_datetime(df["datetime"])
+        return self.pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+
+    def write_part(self, table):
+        name = f"part-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp_path = self.dir_path / f".{name}.tmp"
+        with open(tmp_path, "wb") as f:
+            self.pq.write_table(
+                table,
+                f,
+                row_group_size=self.row_group_size,
+                compression=self.compression
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.dir_path / name)
+
+    def flush(self):
+        """
+        Writes the buffered rows as a part; returns the transactions to
+        release, once the lock is left.
+        """
+        self.settle()
+        if self.buffered_rows == 0:
+            return []
+        df = pd.concat(self.buffer, ignore_index=True)
+        if TRANSACTION_COL in df:
+            df = df[~df[TRANSACTION_COL].isin(self.discarded)]
+        if not df.empty:
+            self.write_part(self.to_table(df))
+        self.buffer = []
+        self.buffered_rows = 0
+        self.oldest_buffered = None
+
+        released = list(self.holding.values())
+        self.written.update(self.holding)
+        self.discarded.difference_update(self.holding)
+        self.holding = {}
+        return released
+
+    def commit_flushed(self, force: bool = False):
+        with self.lock:
+            released = self.flush() if force or self.due() else []
+        for transaction in released:
+            transaction.release(self)
+
+    def finish(self, transaction_id: str, committed: bool):
+        # Runs under the transactions' lock, which `hold` takes within
+        # `self.lock`: queued for `settle` instead of taking `self.lock`
+        self.settlements.put((transaction_id, committed))
+
+    def settle(self):
+        """
+        Applies the outcomes of the transactions finished since the last
+        call; runs under `self.lock`.
+        """
+        while True:
+            try:
+                transaction_id, committed = self.settlements.get_nowait()
+            except queue.Empty:
+                return
+            self.written.discard(transaction_id)
+            if not committed and transaction_id in self.holding:
+                self.discarded.add(transaction_id)
+
+    def hold(self, df: DataFrame):
+        """
+        Holds the commit of the transactions of `df` and returns its rows
+        to buffer: not those of finished transactions or already buffered.
+        """
+        keep = []
+        for transaction_id, rows in df.groupby(TRANSACTION_COL, sort=False):
+            if transaction_id in self.holding or transaction_id in self.written:
+                continue
+            with LOCK:
+                transaction = TRANSACTIONS.get(transaction_id)
+            if (
+                transaction is None
+                or not transaction.hold(self)
+                or not transaction.on_finish(
+                    self,
+                    lambda transaction_id=transaction_id: self.finish(transaction_id, True),
+                    lambda transaction_id=transaction_id: self.finish(transaction_id, False)
+                )
+            ):
+                continue
+            self.holding[transaction_id] = transaction
+            keep.append(rows)
+        return pd.concat(keep) if keep else None
+
+    def due(self):
+        return (
+            self.buffered_rows >= self.row_group_size
+            or (
+                self.oldest_buffered is not None
+                and time.monotonic() - self.oldest_buffered >= self.flush_interval_second
+            )
+        )
+
+    def loop(self):
+        while not self.stop_event.wait(min(self.flush_interval_second, 10)):
+            try:
+                self.commit_flushed()
+            except Exception:
+                self.logger.error(f"Timed flush failed:\n{traceback.format_exc()}")
+
+    def __call__(
+        self,
+        df: DataFrame
+    ) -> Any:
+        if df.empty:
+            return df
+        with self.lock:
+            self.settle()
+            rows = self.hold(df) if TRANSACTION_COL in df else df
+            if rows is not None:
+                self.buffer.append(rows)
+                self.buffered_rows += len(rows)
+                if self.oldest_buffered is None:
+                    self.oldest_buffered = time.monotonic()
+        self.commit_flushed()
+        return df
 
-        return df
\ No newline at end of file
+    def close(self):
+        self.stop_event.set()
+        if self.timer.is_alive():
+            self.timer.join()
+        self.commit_flushed(force=True)
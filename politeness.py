@@ -0,0 +1,241 @@
+from logger import Logger
+import colors
+
+from typing import Literal
+import threading
+import random
+import time
+
+Outcome = Literal["success", "error", "checkpoint", "empty"]
+
+class CheckpointError(RuntimeError):
+    """
+    Facebook redirected the session to a checkpoint (account verification).
+    """
+
+
+class Clock:
+    def now(self):
+        return time.monotonic()
+
+    def sleep(self, second: float):
+        if second > 0:
+            time.sleep(second)
+
+
+class SimulatedClock(Clock):
+    """
+    A clock whose `sleep` only moves time forward, so schedules of hours run
+    instantly in simulations.
+    """
+    def __init__(self, start: float = 0.0) -> None:
+        self.time = start
+        self.lock = threading.Lock()
+
+    def now(self):
+        return self.time
+
+    def sleep(self, second: float):
+        if second > 0:
+            with self.lock:
+                self.time += second
+
+
+class TokenBucket:
+    """
+    Token bucket handing out reservations: `reserve` always succeeds and
+    returns how long the caller has to wait for its permit, so waiting
+    callers are served in order even while the rate changes.
+    """
+    def __init__(
+        self,
+        rate_per_second: float,
+        capacity: float = 1,
+        now: float = 0.0
+    ) -> None:
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = now
+        self.paused_until = now
+
+    def refill(self, now: float):
+        # `last` is ahead of `now` while paused: nothing accrues until then
+        if now <= self.last:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate_per_second)
+        self.last = now
+
+    def reserve(self, now: float, cost: float = 1):
+        start = max(now, self.paused_until)
+        self.refill(start)
+        self.tokens -= cost
+        wait = start - now
+        if self.tokens >= 0:
+            return wait
+        return wait - self.tokens / self.rate_per_second
+
+    def pause(self, now: float, second: float):
+        """
+        Grants nothing for `second` seconds from now, whatever the rate is
+        meanwhile; the account resumes with one permit at the deadline.
+        """
+        self.refill(now)
+        self.paused_until = max(self.paused_until, now + second)
+        self.last = self.paused_until
+        self.tokens = min(self.tokens, 0) + min(1, self.capacity)
+
+
+class AccountStats:
+    def __init__(self) -> None:
+        self.permits = 0
+        self.waited_second = 0.0
+        self.first_permit = None
+        self.last_permit = None
+        self.outcomes = dict.fromkeys(("success", "error", "checkpoint", "empty"), 0)
+
+
+class PolitenessScheduler:
+    """
+    Hands out permits for requests instead of blind sleeps. Every account
+    has its own token bucket, all of them drawing from an optional global
+    one, and delays are jittered around the bucket's pace. Account rates
+    adapt AIMD-style: a success adds `increase_per_second` to the rate, an
+    error or an empty result multiplies it by `decrease_factor`, and a
+    checkpoint multiplies it by `checkpoint_factor` and pauses the account
+    for `checkpoint_pause_second`.
+
+    Thread-safe; shared by every crawler of an engine through the crawler
+    kwargs. The clock is injectable for simulations.
+    """
+    def __init__(
+        self,
+        rate_per_second: float = 1 / 6,
+        min_rate_per_second: float = 1 / 120,
+        max_rate_per_second: float = 1 / 2,
+        global_rate_per_second: float | None = None,
+        burst: float = 1,
+        increase_per_second: float = 0.005,
+        decrease_factor: float = 0.5,
+        checkpoint_factor: float = 0.1,
+        checkpoint_pause_second: float = 1800,
+        jitter: float = 0.3,
+        clock: Clock | None = None,
+        seed: int | None = None
+    ) -> None:
+        """
+        :param rate_per_second: The starting request rate of every account.
+        :param min_rate_per_second: The floor the rate backs off to.
+        :param max_rate_per_second: The ceiling the rate speeds up to.
+        :param global_rate_per_second: The budget shared by all accounts, None for no cap.
+        :param burst: The number of permits an idle account can use back to back.
+        :param increase_per_second: Additive rate increase on every success.
+        :param decrease_factor: Multiplicative rate decrease on an error or empty result.
+        :param checkpoint_factor: Multiplicative rate decrease on a checkpoint.
+        :param checkpoint_pause_second: How long an account is paused after a checkpoint.
+        :param jitter: Delays are drawn uniformly within ±`jitter` of the bucket's wait.
+        :param clock: Time source, a `SimulatedClock` to run simulations instantly.
+        :param seed: Seed of the jitter.
+        """
+        self.rate_per_second = rate_per_second
+        self.min_rate_per_second = min_rate_per_second
+        self.max_rate_per_second = max_rate_per_second
+        self.burst = burst
+        self.increase_per_second = increase_per_second
+        self.decrease_factor = decrease_factor
+        self.checkpoint_factor = checkpoint_factor
+        self.checkpoint_pause_second = checkpoint_pause_second
+        self.jitter = jitter
+        self.clock = clock if clock is not None else Clock()
+        self.random = random.Random(seed)
+        self.logger = Logger("Politeness")
+
+        self.lock = threading.Lock()
+        self.buckets: dict[str, TokenBucket] = {}
+        self.stats: dict[str, AccountStats] = {}
+        self.global_bucket = TokenBucket(global_rate_per_second, burst, self.clock.now()) \
+                            if global_rate_per_second is not None \
+                            else None
+
+    def bucket(self, account: str):
+        if account not in self.buckets:
+            self.buckets[account] = TokenBucket(self.rate_per_second, self.burst, self.clock.now())
+            self.stats[account] = AccountStats()
+        return self.buckets[account]
+
+    def delay(self, account: str = "default", cost: float = 1):
+        """
+        Reserves `cost` permits and returns the jittered time to wait before
+        using them, without waiting (eg. for `asyncio.sleep`).
+        """
+        with self.lock:
+            now = self.clock.now()
+            wait = self.bucket(account).reserve(now, cost)
+            if self.global_bucket is not None:
+                wait = max(wait, self.global_bucket.reserve(now, cost))
+            if wait > 0 and self.jitter > 0:
+                wait *= self.random.uniform(1 - self.jitter, 1 + self.jitter)
+
+            stats = self.stats[account]
+            stats.permits += cost
+            stats.waited_second += wait
+            if stats.first_permit is None:
+                stats.first_permit = now + wait
+            stats.last_permit = now + wait
+            return wait
+
+    def acquire(self, account: str = "default", cost: float = 1):
+        """
+        Blocks until `cost` permits of `account` are granted; returns the
+        time waited.
+        """
+        wait = self.delay(account, cost)
+        self.clock.sleep(wait)
+        return wait
+
+    def report(self, account: str, outcome: Outcome):
+        with self.lock:
+            bucket = self.bucket(account)
+            self.stats[account].outcomes[outcome] += 1
+            rate = bucket.rate_per_second
+            if outcome == "success":
+                rate += self.increase_per_second
+            elif outcome in ("error", "empty"):
+                rate *= self.decrease_factor
+            elif outcome == "checkpoint":
+                rate *= self.checkpoint_factor
+
+            # Settle the tokens at the old rate before switching
+            now = self.clock.now()
+            bucket.refill(now)
+            bucket.rate_per_second = min(self.max_rate_per_second, max(self.min_rate_per_second, rate))
+            if outcome == "checkpoint":
+                bucket.pause(now, self.checkpoint_pause_second)
+
+        if outcome == "checkpoint":
+            self.logger.warning(f"Checkpoint on account {colors.bold(account)}, pausing it for {self.checkpoint_pause_second:.0f}s")
+
+    def throughput(self):
+        """
+        Achieved permits per second and current rate of every account.
+        """
+        with self.lock:
+            summary = {}
+            for account, stats in self.stats.items():
+                span = (stats.last_permit or 0) - (stats.first_permit or 0)
+                summary[account] = {
+                    "permits": stats.permits,
+                    "achieved_per_second": stats.permits / span if span > 0 else 0.0,
+                    "rate_per_second": self.buckets[account].rate_per_second,
+                    "waited_second": stats.waited_second,
+                    **stats.outcomes
+                }
+            return summary
+
+    def log_throughput(self):
+        for account, summary in self.throughput().items():
+            self.logger.info(
+                f"{colors.bold(account)}: {summary['achieved_per_second'] * 60:.2f} requests/min achieved, "
+                f"pacing at {summary['rate_per_second'] * 60:.2f}/min, "
+                f"{summary['error']} errors, {summary['checkpoint']} checkpoints"
+            )
@@ -1,10 +1,12 @@
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.common.by import By
 import selenium.common.exceptions as exc
+from lxml.html import HtmlElement
 
 from datetime import datetime, timedelta
 import re
 from urllib.parse import urlparse
+from functools import lru_cache
 from typing import Sequence, Literal
 
 HREF_TYPE: dict[str, Literal["image", "video", "link"]] = {
@@ -24,7 +26,7 @@ class PagePostMetadata:
         if len(post_element.find_elements(By.XPATH, "*")) == 2: # Regular post
             header: WebElement = post_element.find_element(By.TAG_NAME, "header")
         else: # Post is of Album XYZ
-            header: WebElement = post_element.find_element(By.XPATH, "(//header)[2]")
+            header: WebElement = post_element.find_element(By.XPATH, "(.//header)[2]")
         content: list[WebElement] = post_element.find_element(By.TAG_NAME, "div").find_elements(By.XPATH, "div")
         footer: WebElement = post_element.find_element(By.TAG_NAME, "footer")
 
@@ -44,7 +46,7 @@ class PagePostMetadata:
             if attachment_element.tag_name == "a":
                 attachment_hrefs = [attachment_element.get_attribute("href")]
             else:
-                attachment_element = attachment_element.find_element(By.XPATH, "//*")
+                attachment_element = attachment_element.find_element(By.XPATH, ".//*")
                 if attachment_element.tag_name == "article":
                     attachment_hrefs = ["shared post"]
                 else:
@@ -54,11 +56,64 @@ class PagePostMetadata:
                     ]
         else: attachment_hrefs = []
 
+        self.set_fields(page_id, post_id, raw_date, attachment_hrefs, content[0].text)
+
+    @classmethod
+    def from_html(cls, post_element: HtmlElement):
+        """
+        Builds the metadata from an lxml `<article>` (eg. of a timeline page
+        fetched over HTTP, links made absolute), without any WebDriver call.
+        Looks up the same elements as the constructor, all within the post.
+        """
+        metadata = cls.__new__(cls)
+        if len(post_element.xpath("*")) == 2: # Regular post
+            header = post_element.find(".//header")
+        else: # Post is of Album XYZ
+            header = post_element.xpath(".//header")[1]
+        content = post_element.find(".//div").xpath("div")
+        footer = post_element.find(".//footer")
+
+        date_div, like_div = footer.xpath("div")
+        post_id = like_div.find(".//span").get("id")
+        page_id = header.find(".//a").get("href")
+        page_id = urlparse(page_id).path.strip("/")
+        page_name_h3 = header.find(".//h3")
+
+        post_id = re.sub(r"^like_([\d]+)$", r"\1", post_id)
+        raw_date = re.sub(r"([\d\w\s]+)\s·[\s\w\d]+$", r"\1", date_div.text_content().strip())
+
+        if "đã cập nhật" in page_name_h3.text_content():
+            attachment_hrefs = ["avatar / background"]
+        elif len(content) > 1:
+            attachment_element = content[1].xpath("*")[0]
+            first_descendant = attachment_element.find(".//*")
+            if attachment_element.tag == "a":
+                attachment_hrefs = [attachment_element.get("href")]
+            elif first_descendant is not None and first_descendant.tag == "article":
+                attachment_hrefs = ["shared post"]
+            else:
+                attachment_hrefs = [
+                    a.get("href")
+                    for a in content[1].iter("a")
+                ]
+        else: attachment_hrefs = []
+
+        metadata.set_fields(page_id, post_id, raw_date, attachment_hrefs, content[0].text_content().strip())
+        return metadata
+
+    def set_fields(
+        self,
+        page_id: str,
+        post_id: str,
+        raw_date: str,
+        attachment_hrefs: Sequence[str],
+        preview_text: str
+    ):
         self.date, self.attachment_types = self.parse_data(raw_date, attachment_hrefs)
         self.page_id = page_id
         self.post_id = post_id
         self.post_url = f"https://facebook.com/{self.post_id}"
-        self.preview_text = content[0].text
+        self.preview_text = preview_text
     
     def parse_data(
         self,
@@ -81,34 +136,49 @@ class PagePostMetadata:
         }
 
 
-def parse_post_date(raw_date: str):
-    dt = datetime.now()
-    if re.match(r"^\d{1,2} tháng \d{1,2}(, \d{4})? lúc \d{1,2}:\d{1,2}.*", raw_date):
-        if not re.match(r"^\d{1,2} tháng \d{1,2}, \d{4}.*", raw_date):
-            year = datetime.now().year
-            raw_date = f", {year}".join(
-                re.split(r"(?<=\d)(?= lúc)", raw_date)
+# Date shapes printed by mbasic (Vietnamese locale), tried in order
+DATE_RULES: tuple[tuple[str, re.Pattern], ...] = (
+    ("datetime", re.compile(r"^(\d{1,2}) tháng (\d{1,2})(?:, (\d{4}))? lúc (\d{1,2}):(\d{1,2})")),
+    ("date", re.compile(r"^(\d{1,2}) tháng (\d{1,2})(?:, (\d{4}))?")),
+    ("minutes", re.compile(r"^(\d{1,2}) phút")),
+    ("hours", re.compile(r"^(\d{1,2}) giờ")),
+    ("yesterday", re.compile(r"^Hôm qua lúc (\d{1,2}):(\d{1,2})"))
+)
+
+@lru_cache(maxsize=4096)
+def match_post_date(raw_date: str):
+    """
+    The rule matching `raw_date` and its numbers; memoized, as a page's
+    dates repeat a lot and relative ones are resolved against `now` later.
+    """
+    for kind, pattern in DATE_RULES:
+        match = pattern.match(raw_date)
+        if match is not None:
+            return kind, tuple(
+                int(group) if group is not None else None
+                for group in match.groups()
             )
-        raw_date = re.search(r"\d{1,2} tháng \d{1,2}, \d{4} lúc \d{1,2}:\d{1,2}", raw_date).group(0)
-        dt = datetime.strptime(raw_date, "%d tháng %m, %Y lúc %H:%M")
-    elif re.match(r"^\d{1,2} tháng \d{1,2}(, \d{4})?", raw_date):
-        raw_date = re.search(r"\d{1,2} tháng \d{1,2}", raw_date).group(0)
-        dt = datetime.strptime(raw_date, "%d tháng %m")
-    elif re.match(r"\d{1,2} phút.*", raw_date):
-        minute = re.search(r"(\d{1,2}) phút", raw_date).group(1)
-        minute = int(minute)
-        dt -= timedelta(minutes=minute)
-    elif re.match(r"\d{1,2} giờ.*", raw_date):
-        hour = re.search(r"(\d{1,2}) giờ", raw_date).group(1)
-        hour = int(hour)
-        dt -= timedelta(hours=hour)
-    elif re.match(r"^Hôm qua lúc \d{1,2}:\d{1,2}", raw_date):
-        h_m_search = re.search(r"lúc (\d{1,2}):(\d{2})$", raw_date)
-        hour, minute = h_m_search.group(1), h_m_search.group(2)
-        dt -= timedelta(days=1)
-        dt.replace(hour=int(hour), minute=int(minute))
+    return None, ()
+
+def parse_post_date(raw_date: str, now: datetime | None = None):
+    if now is None:
+        now = datetime.now()
+    kind, values = match_post_date(raw_date)
+    if kind == "datetime":
+        day, month, year, hour, minute = values
+        return datetime(year or now.year, month, day, hour, minute)
+    elif kind == "date":
+        day, month, year = values
+        return datetime(year or now.year, month, day)
+    elif kind == "minutes":
+        return now - timedelta(minutes=values[0])
+    elif kind == "hours":
+        return now - timedelta(hours=values[0])
+    elif kind == "yesterday":
+        hour, minute = values
+        return (now - timedelta(days=1)).replace(hour=hour, minute=minute, second=0, microsecond=0)
     
-    return dt
+    return now
 
 def parse_attachment_types(attachment_hrefs: Sequence[str]):
     return [
@@ -1,6 +1,6 @@
 import PIL.Image
 import streamlit as st
-import pandas as pd
+from dataset import CSVDataset
 from pathlib import Path
 import numpy as np
 import glob
@@ -10,6 +10,14 @@ import PIL
 data_dir = "kltn"
 page_ids = glob.glob("*", root_dir=f"{data_dir}/")
 
+# Columns shown for a record, the only ones read
+COLUMNS = ["post_url", "text", "image_paths", "thumbnail_paths"]
+
+@st.cache_resource
+def open_dataset(path: str):
+    # Kept across reruns: the open file and its row index
+    return CSVDataset(path)
+
 def on_select():
     st.session_state.index = 0
 
@@ -25,21 +33,23 @@ if not page_dropdown:
     sys.exit()
 
 root_dir = Path(data_dir) / page_dropdown
-df = pd.read_csv(
-    root_dir / f"{page_dropdown}.csv"
-)
-# img_paths = glob.glob(root_dir / "imgs" / "*.jpg")
+dataset = open_dataset(str(root_dir / f"{page_dropdown}.csv"))
+# Picks up the rows appended by a running crawl
+num_rows = dataset.refresh()
+if num_rows == 0:
+    st.write("No records yet")
+    sys.exit()
 
 def handle_prev():
     st.session_state.index = np.clip(
         st.session_state.index-1, 
-        a_min=0, a_max=df.shape[0]-1
+        a_min=0, a_max=num_rows-1
     )
 
 def handle_next():
     st.session_state.index = np.clip(
         st.session_state.index+1, 
-        a_min=0, a_max=df.shape[0]-1
+        a_min=0, a_max=num_rows-1
     )
 
 _, leftcol, centercol, rightcol = st.columns([1/3-.137, .137, 1/3, 1/3])
@@ -51,18 +61,24 @@ with centercol:
         label="Index:",
         label_visibility="collapsed",
         min_value=0,
-        max_value=df.shape[0]-1,
+        max_value=num_rows-1,
         key="index"
     )
 with rightcol:
     st.button("Next", on_click=handle_next)
 
-i = st.session_state.index
-st.link_button("Go to post", df.post_url[i], type="primary")
-st.write(df.text[i])
+i = min(st.session_state.index, num_rows-1)
+record = dataset.row(i, columns=COLUMNS)
+st.link_button("Go to post", record["post_url"], type="primary")
+st.write(record["text"])
 
+# Thumbnails by default, when the pipeline made them
+full_size = st.toggle("Full-size images")
+img_paths = record.get("thumbnail_paths", "")
+if full_size or not img_paths:
+    img_paths = record.get("image_paths", "")
 imgs = [
     str(root_dir / "imgs" / image)
-    for image in df.images[i].split()
+    for image in img_paths.split()
 ]
 st.image(imgs)
\ No newline at end of file
@@ -1,62 +1,365 @@
-from collections import deque
+from history import HistoryIndex
+from page_queue import PageQueue
+from transactions import Transactional, Transaction, LOCK
+import threading
+import time
 import os
 import pathlib
 
 from typing import Literal
 
-class Progress:
+class Progress(Transactional):
+    """
+    Crawl queue and history, persisted through an append-only journal.
+
+    Every enqueue, dequeue and history event is appended to `journal.log` as
+    it happens and flushed to the OS, so a killed process loses nothing;
+    fsyncs are batched every `fsync_every` events or `fsync_interval_second`.
+    On startup the `history.txt`/`queue.txt` snapshot is loaded and the
+    journal replayed on top of it. Every `compact_every` events the state is
+    written as a new snapshot and the journal restarted.
+
+    History is a `HistoryIndex`: post/comment IDs live in `history.npy`,
+    memory-mapped on load, and only other URLs in `history.txt`.
+
+    Updates made within `transaction()` are journaled as one `B`...`C` group
+    when the transaction commits, fsynced; replay skips a group whose `C`
+    line is missing. The ids of the last `committed_window` committed
+    transactions are kept (in `transactions.txt` across compactions) for
+    sinks to recover their staged output. Page watermarks are journaled as
+    `W` lines and kept in `watermarks.txt`.
+
+    The queue is a `PageQueue`: URLs are queued per source page and the
+    pages served in weighted round-robin, each page's cursor chain staying
+    with one crawler. Crawlers pass their name to `next_url`, report each
+    page's outcome with `record_outcome` and `release` their pages on exit.
+    """
     def __init__(
         self,
-        dir_path: str = "./progress"
+        dir_path: str = "./progress",
+        fsync_every: int = 64,
+        fsync_interval_second: float = 1.0,
+        compact_every: int = 100_000,
+        mmap_history: bool = True,
+        committed_window: int = 100_000
     ) -> None:
         dir = pathlib.Path(dir_path)
         self.progress_dir = dir
         self.history_path = dir.joinpath("history.txt")
+        self.history_ids_path = dir.joinpath("history.npy")
         self.queue_path = dir.joinpath("queue.txt")
+        self.transactions_path = dir.joinpath("transactions.txt")
+        self.watermarks_path = dir.joinpath("watermarks.txt")
+        self.journal_path = dir.joinpath("journal.log")
+        # A journal renamed here marks a compaction whose snapshot is complete
+        self.compacted_journal_path = dir.joinpath("journal.old")
+
+        self.fsync_every = fsync_every
+        self.fsync_interval_second = fsync_interval_second
+        self.compact_every = compact_every
+        self.mmap_history = mmap_history
+        self.committed_window = committed_window
+        self.lock = threading.RLock()
+        self.init_transactions()
+
+        os.makedirs(self.progress_dir, exist_ok=True)
+        self.recover()
+        self.history, self.queue, self.committed_ids, self.watermarks = self.load()
+        self.journal_entries = self.replay()
+        self.journal = open(self.journal_path, "a")
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    @property
+    def snapshot_paths(self):
+        return (self.history_ids_path, self.history_path, self.queue_path, self.transactions_path, self.watermarks_path)
+
+    def recover(self):
+        """
+        Finishes or rolls back a compaction interrupted by a crash.
+        """
+        tmp_paths = [
+            (path.with_name(path.name + ".tmp"), path)
+            for path in self.snapshot_paths
+        ]
+        if self.compacted_journal_path.exists():
+            for tmp_path, path in tmp_paths:
+                if tmp_path.exists():
+                    os.replace(tmp_path, path)
+            os.remove(self.compacted_journal_path)
+        else:
+            for tmp_path, _ in tmp_paths:
+                if tmp_path.exists():
+                    os.remove(tmp_path)
 
-        self.history, self.queue = self.load()
-    
     def load(self):
         # Prepare history
-        if not self.history_path.exists():
-            history = []
-        else:
-            with open(self.history_path, "r") as f_hist:
-                history = f_hist.read().split()
+        history = HistoryIndex()
+        history.load(self.history_ids_path, self.history_path, mmap=self.mmap_history)
 
         # Prepare queue
         if not self.queue_path.exists():
-            queue = deque()
+            queue = []
         else:
             with open(self.queue_path, "r") as f_queue:
                 queue = f_queue.read().split()
 
-        return set(history), deque(queue)
-    
-    def save(self):
-        if not self.progress_dir.is_dir():
-            os.makedirs(self.progress_dir, exist_ok=True)
+        # Ids of recently committed transactions, oldest first
+        committed_ids = {}
+        if self.transactions_path.exists():
+            with open(self.transactions_path, "r") as f_transactions:
+                committed_ids = dict.fromkeys(f_transactions.read().split())
 
-        with open(self.history_path, "w") as f_hist, open(self.queue_path, "w") as f_queue:
-            f_hist.writelines("\n".join(self.history))
-            f_queue.writelines("\n".join(self.queue))
+        # Page watermarks, one `key\tnewest\tnewest_id\tseen\tseen_id` per line
+        watermarks = {}
+        if self.watermarks_path.exists():
+            with open(self.watermarks_path, "r") as f_watermarks:
+                for line in f_watermarks:
+                    key, record = decode_watermark(line.rstrip("\n"))
+                    watermarks[key] = record
 
-    def enqueue(self, url: str, side: Literal["left", "right"] = "right"):
-        if side == "right":
+        return history, PageQueue(queue), committed_ids, watermarks
+
+    def replay(self):
+        if not self.journal_path.exists():
+            return 0
+
+        entries = 0
+        group = None
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                # A torn last line from a crash is ignored
+                if not line.endswith("\n"):
+                    break
+                op, _, url = line.rstrip("\n").partition("\t")
+                entries += 1
+                if op == "B":
+                    group = []
+                elif op == "C":
+                    for group_op, group_url in group or ():
+                        self.apply(group_op, group_url)
+                    self.remember(url)
+                    group = None
+                elif group is not None:
+                    group.append((op, url))
+                else:
+                    self.apply(op, url)
+        # A group without its C line is a transaction that never committed
+        return entries
+
+    def apply(self, op: str, url: str):
+        if op == "R":
             self.queue.append(url)
-        elif side == "left":
+        elif op == "L":
             self.queue.appendleft(url)
-    
-    def next_url(self, pop: bool = True):
-        if pop:
-            return self.queue.popleft()
-        return self.queue[0]
+        elif op == "D":
+            if url in self.queue:
+                self.queue.remove(url)
+        elif op == "H":
+            self.history.add(url)
+        elif op == "W":
+            key, record = decode_watermark(url)
+            self.watermarks[key] = record
+
+    def remember(self, transaction_id: str):
+        self.committed_ids[transaction_id] = None
+        if len(self.committed_ids) > self.committed_window:
+            del self.committed_ids[next(iter(self.committed_ids))]
+
+    def log(self, op: str, url: str):
+        self.journal.write(f"{op}\t{url}\n")
+        self.journal.flush()
+        self.unsynced += 1
+        self.journal_entries += 1
+
+        if (
+            self.unsynced >= self.fsync_every
+            or time.monotonic() - self.last_sync >= self.fsync_interval_second
+        ):
+            self.sync()
+        if self.journal_entries >= self.compact_every:
+            self.save()
+
+    def sync(self):
+        os.fsync(self.journal.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def save(self):
+        """
+        Compacts the journal into a fresh `history.txt`/`queue.txt` snapshot.
+        Only committed updates are written: the URLs dequeued by pending
+        transactions are kept, those they enqueued left out.
+        """
+        with LOCK, self.lock:
+            tmp_paths = [
+                (path.with_name(path.name + ".tmp"), path)
+                for path in self.snapshot_paths
+            ]
+            self.history.save(tmp_paths[0][0], tmp_paths[1][0])
+            popped = [
+                url
+                for transaction in self.pending
+                for url in transaction.popped
+                if url not in self.origins
+            ]
+            queue = popped + [url for url in self.queue if url not in self.origins]
+            watermarks = [encode_watermark(key, record) for key, record in self.watermarks.items()]
+            for (tmp_path, _), lines in zip(tmp_paths[2:], (queue, self.committed_ids, watermarks)):
+                with open(tmp_path, "w") as f:
+                    f.writelines("\n".join(lines))
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            # Commit point: from here on, recovery completes the snapshot
+            self.journal.close()
+            os.replace(self.journal_path, self.compacted_journal_path)
+            for tmp_path, path in tmp_paths:
+                os.replace(tmp_path, path)
+            os.remove(self.compacted_journal_path)
+            fsync_dir(self.progress_dir)
+
+            self.journal = open(self.journal_path, "a")
+            self.journal_entries = 0
+            self.unsynced = 0
+            self.last_sync = time.monotonic()
+
+    def enqueue(self, url: str, side: Literal["left", "right"] = "right"):
+        if url is None:
+            return
+        transaction = self.current.get()
+        if side not in ("left", "right"):
+            return
+        with LOCK, self.lock:
+            if transaction is not None:
+                self.track_enqueue(transaction, url, side)
+            if side == "right":
+                self.queue.append(url)
+            else:
+                self.queue.appendleft(url)
+            if transaction is None:
+                self.log("R" if side == "right" else "L", url)
+
+    def next_url(self, pop: bool = True, worker: str | None = None):
+        """
+        :param worker: The name of the calling crawler, which keeps the
+            pages it crawled.
+        :raises NoURLAvailable: No URL is available to `worker` right now.
+        """
+        transaction = self.current.get()
+        with LOCK, self.lock:
+            if pop:
+                if transaction is not None:
+                    transaction.ensure_open()
+                url = self.queue.pop(worker)
+                if transaction is not None:
+                    self.track_pop(transaction, url)
+                else:
+                    self.log("D", url)
+                return url
+            return self.queue.peek()
+
+    def record_outcome(self, url: str, records: int, failed: bool = False):
+        """
+        Feeds the yield and error rate of `url`'s page to the scheduler.
+        """
+        with self.lock:
+            self.queue.record(url, records, failed)
+
+    def release(self, worker: str | None = None):
+        with self.lock:
+            self.queue.release(worker)
+
+    def see_post(self, key: str, timestamp: float, post_id: str):
+        super().see_post(key, timestamp, post_id)
+        with self.lock:
+            self.queue.fresh(key, timestamp)
 
     def add_history(self, url: str):
-        self.history.add(url)
-    
+        transaction = self.current.get()
+        with LOCK, self.lock:
+            if transaction is not None:
+                transaction.ensure_open()
+            if url in self.history or url in self.pending_history:
+                return
+            if transaction is not None:
+                self.track_history(transaction, url)
+            else:
+                self.history.add(url)
+                self.log("H", url)
+
     def propagated(self, url: str):
-        return url in self.history
+        return url in self.history or url in self.pending_history
+
+    def write_transaction(self, transaction: Transaction):
+        with self.lock:
+            lines = [
+                f"B\t{transaction.id}\n",
+                *(f"D\t{url}\n" for url in transaction.popped),
+                *(f"{'R' if side == 'right' else 'L'}\t{url}\n" for side, url in transaction.enqueued),
+                *(f"H\t{url}\n" for url in transaction.history),
+                *(f"W\t{encode_watermark(key, record)}\n" for key, record in transaction.watermarks.items()),
+                f"C\t{transaction.id}\n"
+            ]
+            self.journal.writelines(lines)
+            self.journal.flush()
+            self.sync()
+            self.journal_entries += len(lines)
+
+            self.watermarks.update(transaction.watermarks)
+            self.forget(transaction)
+            self.history.update(transaction.history)
+            self.remember(transaction.id)
+            if self.journal_entries >= self.compact_every:
+                self.save()
+
+    def undo_transaction(self, transaction: Transaction, restore: bool):
+        with self.lock:
+            for _, url in transaction.enqueued:
+                # Unless a dependent dequeued it, rolled back along
+                if self.origins.get(url) is transaction and url in self.queue:
+                    self.queue.remove(url)
+            self.forget(transaction)
+            if restore:
+                self.queue.extendleft(reversed(transaction.popped))
+
+    def committed(self, transaction_id: str):
+        return transaction_id in self.committed_ids
+
+    def load_watermark(self, key: str):
+        return self.watermarks.get(key)
+
+    def store_watermark(self, key: str, record: tuple):
+        with self.lock:
+            self.watermarks[key] = record
+            self.log("W", encode_watermark(key, record))
+
+    def remaining_num(self, worker: str | None = None):
+        """
+        The number of URLs `worker` can take, leaving out the pages other
+        crawlers are on.
+        """
+        with self.lock:
+            return self.queue.available(worker)
+
+
+def encode_watermark(key: str, record: tuple):
+    return "\t".join([key, *("" if value is None else str(value) for value in record)])
+
+
+def decode_watermark(line: str):
+    key, newest, newest_id, seen, seen_id = line.split("\t")
+    return key, (
+        float(newest) if newest else None,
+        newest_id or None,
+        float(seen) if seen else None,
+        seen_id or None
+    )
+
 
-    def remaining_num(self):
-        return len(self.queue)
\ No newline at end of file
+def fsync_dir(path: pathlib.Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
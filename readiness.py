@@ -0,0 +1,121 @@
+from selenium import webdriver
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+import selenium.common.exceptions as exc
+
+# Resolves once `selector` is in the document and the subtree of `root` (the
+# document if absent) has not changed for `quietMs`, on the next idle period;
+# resolves false after `timeoutMs`
+SETTLED_SCRIPT = """
+var selector = arguments[0], quietMs = arguments[1], timeoutMs = arguments[2], root = arguments[3];
+var done = arguments[arguments.length - 1];
+var idle = window.requestIdleCallback || function (fn) { return setTimeout(fn, 1); };
+var timer = null, finished = false;
+var observer = new MutationObserver(arm);
+
+function finish(ok) {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(timer);
+    done(ok);
+}
+function arm() {
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+        if (!selector || document.querySelector(selector)) {
+            idle(function () { finish(true); }, {timeout: quietMs});
+        } else {
+            arm();
+        }
+    }, quietMs);
+}
+
+observer.observe(
+    (root && document.querySelector(root)) || document,
+    {childList: true, subtree: true, characterData: true}
+);
+setTimeout(function () { finish(false); }, timeoutMs);
+arm();
+"""
+
+
+class Readiness:
+    """
+    Explicit readiness checks replacing the driver-wide implicit wait: the
+    implicit wait is set to 0 so that looking for something absent returns
+    at once, elements a step needs are waited for one by one within a
+    budget, and `settled` asks the page itself (a MutationObserver, then
+    `requestIdleCallback`) when it has finished rendering.
+    """
+    def __init__(
+        self,
+        chrome: webdriver.Chrome,
+        timeout_second: float = 10,
+        poll_second: float = 0.1,
+        quiet_second: float = 0.5,
+        settle_second: float = 5
+    ) -> None:
+        """
+        :param chrome: The driver to check.
+        :param timeout_second: The default budget of a wait.
+        :param poll_second: How often explicit waits look for their element.
+        :param quiet_second: How long the DOM has to stay unchanged to be settled.
+        :param settle_second: The default budget of `settled`, short: a page that never goes quiet costs it every time.
+        """
+        self.chrome = chrome
+        self.timeout_second = timeout_second
+        self.poll_second = poll_second
+        self.quiet_second = quiet_second
+        self.settle_second = settle_second
+        self.chrome.implicitly_wait(0)
+
+    def wait(self, condition, timeout_second: float | None = None):
+        timeout_second = timeout_second if timeout_second is not None else self.timeout_second
+        return WebDriverWait(self.chrome, timeout_second, self.poll_second).until(condition)
+
+    def element(self, by: str, value: str, timeout_second: float | None = None) -> WebElement:
+        """
+        Waits for an element to be in the DOM; raises `TimeoutException`
+        once the budget is spent.
+        """
+        return self.wait(EC.presence_of_element_located((by, value)), timeout_second)
+
+    def clickable(self, by: str, value: str, timeout_second: float | None = None) -> WebElement:
+        return self.wait(EC.element_to_be_clickable((by, value)), timeout_second)
+
+    def probe(self, by: str, value: str, root: WebElement | None = None) -> WebElement | None:
+        """
+        The first matching element, or None right away if there is none.
+        """
+        elements = (root if root is not None else self.chrome).find_elements(by, value)
+        return elements[0] if elements else None
+
+    def settled(
+        self,
+        css_selector: str | None = None,
+        timeout_second: float | None = None,
+        quiet_second: float | None = None,
+        root_selector: str | None = None
+    ):
+        """
+        Waits until `css_selector` (if given) is in the page and the DOM
+        stopped changing, only watching `root_selector`'s subtree if it is
+        in the page. Returns False if the page did not settle within the
+        budget instead of raising, the caller then works with what has
+        rendered.
+        """
+        timeout_second = timeout_second if timeout_second is not None else self.settle_second
+        quiet_second = quiet_second if quiet_second is not None else self.quiet_second
+        self.chrome.set_script_timeout(timeout_second + 5)
+        try:
+            return bool(self.chrome.execute_async_script(
+                SETTLED_SCRIPT,
+                css_selector,
+                int(quiet_second * 1000),
+                int(timeout_second * 1000),
+                root_selector
+            ))
+        except exc.TimeoutException:
+            return False
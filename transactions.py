@@ -0,0 +1,282 @@
+from logger import Logger
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Hashable, Any
+import threading
+import traceback
+import uuid
+
+# Serializes the state changes of every transaction; taken before the lock
+# of a progress tracker, never after it
+LOCK = threading.RLock()
+# Unfinished transactions by id, for pipeline sinks to find the transactions
+# of the rows they stage
+TRANSACTIONS: dict[str, "Transaction"] = {}
+
+logger = Logger("Transaction")
+
+
+class TransactionAborted(Exception):
+    """
+    Raised when a page tracks an update on a transaction that has already
+    finished, eg. rolled back along with the page it depends on while still
+    being parsed: the page is abandoned, and redone with that page.
+    """
+
+
+class Transaction:
+    """
+    The progress updates of one crawled page: the URL it dequeued, the URLs
+    it enqueued, its history and watermarks. They take effect in memory right away but
+    are only made durable, together, once the pipeline sinks have staged the
+    page's records (`prepare`), and are undone by `rollback`. Sinks register
+    hooks to publish or discard what they staged when the transaction ends,
+    and a sink buffering the records holds the commit until they are written.
+
+    A page dequeued from a URL enqueued by a still pending transaction
+    depends on it: it commits after it and is rolled back with it, so that a
+    crash never leaves a page committed while the page that led to it is
+    redone.
+    """
+    def __init__(self, progress: "Transactional") -> None:
+        self.id = uuid.uuid4().hex
+        self.progress = progress
+        self.popped: list[str] = []
+        self.enqueued: list[tuple[str, str]] = []
+        self.history: list[str] = []
+        self.watermarks: dict[str, tuple] = {}
+        self.parents: set[Transaction] = set()
+        self.dependents: list[Transaction] = []
+        self.hooks: dict[Hashable, tuple[Callable[[], Any], Callable[[], Any]]] = {}
+        self.holds: set[Hashable] = set()
+        self.state = "open"
+
+    @property
+    def finished(self):
+        return self.state in ("committed", "rolled back")
+
+    def ensure_open(self):
+        if self.finished:
+            raise TransactionAborted(f"Transaction {self.id} already {self.state}")
+
+    def on_finish(
+        self,
+        key: Hashable,
+        commit: Callable[[], Any],
+        rollback: Callable[[], Any]
+    ):
+        """
+        Registers (or replaces) the hooks run by `key` once the transaction
+        commits or rolls back; returns False if it already has.
+        """
+        with LOCK:
+            if self.finished:
+                return False
+            self.hooks[key] = (commit, rollback)
+            return True
+
+    def hold(self, key: Hashable):
+        """
+        Keeps the transaction from committing until `key` releases it, eg.
+        while a sink buffers its records; returns False if it has finished.
+        """
+        with LOCK:
+            if self.finished:
+                return False
+            self.holds.add(key)
+            return True
+
+    def release(self, key: Hashable):
+        with LOCK:
+            self.holds.discard(key)
+            if self.state == "prepared":
+                self.try_commit()
+
+    def prepare(self):
+        """
+        Called once the records of the page are staged: commits now, or as
+        soon as the transactions it depends on have committed.
+        """
+        with LOCK:
+            if self.state != "open":
+                return
+            self.state = "prepared"
+            self.try_commit()
+
+    def try_commit(self):
+        if self.holds or any(parent.state != "committed" for parent in self.parents):
+            return
+        self.progress.write_transaction(self)
+        self.state = "committed"
+        TRANSACTIONS.pop(self.id, None)
+        self.run_hooks(0)
+        for dependent in self.dependents:
+            if dependent.state == "prepared":
+                dependent.try_commit()
+
+    def rollback(self, restore: bool = True):
+        """
+        Undoes the updates of the page and of the pages depending on it.
+
+        :param restore: Whether the dequeued URL goes back to the front of
+            the queue; not for dependents, whose URL is enqueued again when
+            the page they depend on is redone.
+        """
+        with LOCK:
+            if self.finished:
+                return
+            self.state = "rolled back"
+            TRANSACTIONS.pop(self.id, None)
+            self.progress.undo_transaction(self, restore)
+            self.run_hooks(1)
+            for dependent in self.dependents:
+                dependent.rollback(restore=False)
+
+    def run_hooks(self, i: int):
+        # The progress is final by now, a failing sink recovers on restart
+        for hooks in self.hooks.values():
+            try:
+                hooks[i]()
+            except Exception:
+                logger.error(f"Hook failed on transaction {self.id}:\n{traceback.format_exc()}")
+
+
+class Transactional(ABC):
+    """
+    Transaction support shared by `Progress` and `SharedProgress`, which
+    implement the abstract methods: writing and undoing transactions,
+    looking up committed ones, and loading and storing watermarks. Updates
+    made within `transaction()` belong to it; the current transaction is a
+    context variable, so each thread and each asyncio task has its own.
+    """
+    def init_transactions(self):
+        self.current: ContextVar[Transaction | None] = ContextVar(f"transaction-{id(self)}", default=None)
+        self.pending: set[Transaction] = set()
+        # URLs enqueued and history added by pending transactions
+        self.origins: dict[str, Transaction] = {}
+        self.pending_history: dict[str, Transaction] = {}
+        self.pending_watermarks: dict[str, Transaction] = {}
+
+    @contextmanager
+    def transaction(self):
+        """
+        Opens a transaction for the updates made in the block, rolled back if
+        the block raises. It is left pending for the pipeline to commit.
+        """
+        transaction = Transaction(self)
+        with LOCK:
+            TRANSACTIONS[transaction.id] = transaction
+            self.pending.add(transaction)
+        token = self.current.set(transaction)
+        try:
+            yield transaction
+        except BaseException:
+            transaction.rollback()
+            raise
+        finally:
+            self.current.reset(token)
+
+    # The trackers are called under `LOCK`, before the update is applied,
+    # and raise `TransactionAborted` on a finished transaction, whose
+    # bookkeeping is gone already
+    def track_pop(self, transaction: Transaction, url: str):
+        transaction.ensure_open()
+        transaction.popped.append(url)
+        parent = self.origins.get(url)
+        if parent is not None and parent is not transaction and not parent.finished:
+            transaction.parents.add(parent)
+            parent.dependents.append(transaction)
+
+    def track_enqueue(self, transaction: Transaction, url: str, side: str):
+        transaction.ensure_open()
+        transaction.enqueued.append((side, url))
+        self.origins[url] = transaction
+
+    def track_history(self, transaction: Transaction, url: str):
+        transaction.ensure_open()
+        transaction.history.append(url)
+        self.pending_history[url] = transaction
+
+    def forget(self, transaction: Transaction):
+        """
+        Drops the bookkeeping of a finished transaction.
+        """
+        self.pending.discard(transaction)
+        for _, url in transaction.enqueued:
+            if self.origins.get(url) is transaction:
+                del self.origins[url]
+        for url in transaction.history:
+            if self.pending_history.get(url) is transaction:
+                del self.pending_history[url]
+        for key in transaction.watermarks:
+            if self.pending_watermarks.get(key) is transaction:
+                del self.pending_watermarks[key]
+
+    def watermark_record(self, key: str) -> tuple:
+        """
+        `(newest, newest_id, seen, seen_id)` of a page: the timestamp and id
+        of the newest post of its last complete walk, and of the newest post
+        seen by the walk in progress.
+        """
+        with LOCK:
+            transaction = self.pending_watermarks.get(key)
+            if transaction is not None:
+                return transaction.watermarks[key]
+        return self.load_watermark(key) or (None, None, None, None)
+
+    def update_watermark(self, key: str, record: tuple):
+        transaction = self.current.get()
+        if transaction is None:
+            self.store_watermark(key, record)
+            return
+        with LOCK:
+            transaction.ensure_open()
+            transaction.watermarks[key] = record
+            self.pending_watermarks[key] = transaction
+
+    def watermark(self, key: str) -> tuple[float, str] | None:
+        """
+        The timestamp and id of the newest post of the last complete walk
+        of a page's timeline, None before the first one.
+        """
+        newest, newest_id, _, _ = self.watermark_record(key)
+        return (newest, newest_id) if newest is not None else None
+
+    def see_post(self, key: str, timestamp: float, post_id: str):
+        newest, newest_id, seen, seen_id = self.watermark_record(key)
+        if seen is None or timestamp > seen:
+            self.update_watermark(key, (newest, newest_id, timestamp, post_id))
+
+    def end_walk(self, key: str):
+        """
+        The walk of a page's timeline is over: the newest post it saw
+        becomes the watermark.
+        """
+        newest, newest_id, seen, seen_id = self.watermark_record(key)
+        if seen is None:
+            return
+        if newest is None or seen > newest:
+            newest, newest_id = seen, seen_id
+        self.update_watermark(key, (newest, newest_id, None, None))
+
+    @abstractmethod
+    def load_watermark(self, key: str) -> tuple | None:
+        ...
+
+    @abstractmethod
+    def store_watermark(self, key: str, record: tuple):
+        ...
+
+    @abstractmethod
+    def write_transaction(self, transaction: Transaction):
+        ...
+
+    @abstractmethod
+    def undo_transaction(self, transaction: Transaction, restore: bool):
+        ...
+
+    @abstractmethod
+    def committed(self, transaction_id: str) -> bool:
+        ...
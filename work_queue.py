@@ -0,0 +1,411 @@
+from logger import Logger
+from transactions import Transactional, Transaction, LOCK
+import colors
+
+from urllib.parse import urlparse
+from collections import deque
+from typing import Literal
+import threading
+import sqlite3
+import socket
+import uuid
+import time
+import os
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    url TEXT PRIMARY KEY,
+    page_key TEXT NOT NULL,
+    position REAL NOT NULL,
+    owner TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS queue_position ON queue (position);
+CREATE INDEX IF NOT EXISTS queue_page ON queue (page_key);
+CREATE TABLE IF NOT EXISTS pages (
+    page_key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    lease_until REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    url TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    page_key TEXT PRIMARY KEY,
+    newest REAL,
+    newest_id TEXT,
+    seen REAL,
+    seen_id TEXT
+);
+"""
+
+class NoURLAvailable(IndexError):
+    """
+    Raised by `next_url` when no URL is available to the caller right now,
+    eg. another crawler took the last one since `remaining_num`.
+    """
+
+
+def page_key(url: str):
+    """
+    The page a URL belongs to, eg. `mbasic.facebook.com/BeatvnNow` for every
+    timeline cursor of that page.
+    """
+    parsed = urlparse(url)
+    return parsed.netloc + "/" + parsed.path.strip("/").split("/")[0]
+
+
+class SharedProgress(Transactional):
+    """
+    Drop-in replacement for `Progress` backed by a SQLite work queue shared
+    by any number of worker processes, on one host or on several hosts
+    mounting the same volume (it needs working POSIX locks, so use
+    `journal_mode="DELETE"` on network filesystems).
+
+    `next_url` leases a URL for `visibility_timeout_second` instead of
+    removing it; `add_history` acknowledges (deletes) it, and re-enqueueing
+    a leased URL releases it. Every page is owned by a single worker at a
+    time: its queued URLs are only handed to the worker holding the page
+    lease. A heartbeat thread renews this worker's leases, so the leases of
+    a dead worker expire and its URLs and pages go back to the queue.
+
+    Leases follow queue order (FIFO), apart from preferring the pages this
+    worker holds: the yield, error and freshness weighting of `PageQueue`
+    and its per-crawler affinity only apply to `Progress`, so
+    `record_outcome` and `release` do nothing here.
+
+    Within `transaction()`, leases are written right away (a leased URL
+    stays in the queue until acknowledged) while enqueues and history are
+    held back: enqueued URLs wait in a local queue, served to this worker
+    first, and the commit inserts them, acknowledges the page and records
+    its history and transaction id in one SQLite transaction. A rollback
+    drops the page's enqueued URLs and releases its lease.
+    """
+    def __init__(
+        self,
+        db_path: str = "./progress/queue.sqlite",
+        visibility_timeout_second: float = 300,
+        idle_wait_second: float = 60,
+        poll_second: float = 2,
+        journal_mode: Literal["WAL", "DELETE"] = "WAL",
+        worker_id: str | None = None
+    ) -> None:
+        """
+        :param db_path: The SQLite file shared by all workers.
+        :param visibility_timeout_second: How long a lease outlives the last heartbeat of its worker.
+        :param idle_wait_second: How long `remaining_num` waits for URLs leased by other workers before reporting an empty queue.
+        :param poll_second: The polling interval while waiting.
+        :param journal_mode: SQLite journal mode, WAL only works on a local filesystem.
+        :param worker_id: Identifies this worker in leases, unique per process by default.
+        """
+        if worker_id is None:
+            worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.worker_id = worker_id
+        self.db_path = db_path
+        self.visibility_timeout_second = visibility_timeout_second
+        self.idle_wait_second = idle_wait_second
+        self.poll_second = poll_second
+        self.logger = Logger(f"WorkQueue-{worker_id}")
+
+        dir_path = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(dir_path, exist_ok=True)
+        self.db = sqlite3.connect(
+            db_path,
+            timeout=60,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self.db.execute(f"PRAGMA journal_mode={journal_mode}")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.lock = threading.RLock()
+        self.init_transactions()
+        # URLs enqueued by pending transactions and not leased yet
+        self.local: deque[str] = deque()
+
+        self.heartbeat_stop = threading.Event()
+        self.heartbeat_thread = None
+
+    def write(self, fn):
+        """
+        Runs `fn(cursor)` in an immediate (write-locked) transaction.
+        """
+        with self.lock:
+            cursor = self.db.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(cursor)
+                cursor.execute("COMMIT")
+                return result
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+
+    @property
+    def queue(self):
+        with self.lock:
+            return [
+                url
+                for url, in self.db.execute("SELECT url FROM queue ORDER BY position")
+            ]
+
+    def start_heartbeat(self):
+        if self.heartbeat_thread is not None and self.heartbeat_thread.is_alive():
+            return
+        self.heartbeat_stop.clear()
+        self.heartbeat_thread = threading.Thread(target=self.heartbeat, name="WorkQueueHeartbeat", daemon=True)
+        self.heartbeat_thread.start()
+
+    def heartbeat(self):
+        while not self.heartbeat_stop.wait(self.visibility_timeout_second / 3):
+            try:
+                self.renew()
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to renew leases: {e}")
+
+    def renew(self):
+        def renew(cursor: sqlite3.Cursor):
+            lease_until = time.time() + self.visibility_timeout_second
+            cursor.execute("UPDATE queue SET lease_until = ? WHERE owner = ?", (lease_until, self.worker_id))
+            cursor.execute("UPDATE pages SET lease_until = ? WHERE owner = ?", (lease_until, self.worker_id))
+        self.write(renew)
+
+    def insert(
+        self,
+        cursor: sqlite3.Cursor,
+        url: str,
+        side: Literal["left", "right"],
+        lease_until: float | None = None
+    ):
+        if side == "left":
+            position, = cursor.execute("SELECT COALESCE(MIN(position), 0) - 1 FROM queue").fetchone()
+        else:
+            position, = cursor.execute("SELECT COALESCE(MAX(position), 0) + 1 FROM queue").fetchone()
+        owner = self.worker_id if lease_until is not None else None
+        # Re-enqueueing a URL leased by this worker releases the lease
+        cursor.execute(
+            "UPDATE queue SET owner = ?, lease_until = ?, position = ? WHERE url = ? AND owner = ?",
+            (owner, lease_until, position, url, self.worker_id)
+        )
+        cursor.execute(
+            "INSERT OR IGNORE INTO queue (url, page_key, position, owner, lease_until) VALUES (?, ?, ?, ?, ?)",
+            (url, page_key(url), position, owner, lease_until)
+        )
+
+    def enqueue(self, url: str, side: Literal["left", "right"] = "right"):
+        if url is None:
+            return
+        transaction = self.current.get()
+        if transaction is None:
+            self.write(lambda cursor: self.insert(cursor, url, side))
+            return
+        with LOCK:
+            self.track_enqueue(transaction, url, side)
+            if side == "left":
+                self.local.appendleft(url)
+            else:
+                self.local.append(url)
+
+    def lease(self):
+        def lease(cursor: sqlite3.Cursor):
+            now = time.time()
+            row = cursor.execute(
+                """
+                SELECT q.url, q.page_key FROM queue q
+                LEFT JOIN pages p ON p.page_key = q.page_key
+                WHERE (q.lease_until IS NULL OR q.lease_until < :now)
+                  AND (p.owner IS NULL OR p.owner = :me OR p.lease_until < :now)
+                ORDER BY (p.owner IS NOT NULL AND p.owner = :me) DESC, q.position
+                LIMIT 1
+                """,
+                {"now": now, "me": self.worker_id}
+            ).fetchone()
+            if row is None:
+                return None
+
+            url, key = row
+            lease_until = now + self.visibility_timeout_second
+            cursor.execute(
+                "UPDATE queue SET owner = ?, lease_until = ? WHERE url = ?",
+                (self.worker_id, lease_until, url)
+            )
+            cursor.execute(
+                "INSERT OR REPLACE INTO pages (page_key, owner, lease_until) VALUES (?, ?, ?)",
+                (key, self.worker_id, lease_until)
+            )
+            return url
+        return self.write(lease)
+
+    def next_url(self, pop: bool = True, worker: str | None = None):
+        # Pages are leased per worker process, not per crawler
+        if not pop:
+            with self.lock:
+                row = self.db.execute("SELECT url FROM queue ORDER BY position LIMIT 1").fetchone()
+            if row is None:
+                raise IndexError("next_url from an empty queue")
+            return row[0]
+
+        transaction = self.current.get()
+        with LOCK:
+            if transaction is not None:
+                transaction.ensure_open()
+            # The next pages of pages this worker is on come first
+            url = self.local.popleft() if self.local else self.lease()
+            if url is None:
+                raise NoURLAvailable("No URL available to this worker")
+            if transaction is not None:
+                self.track_pop(transaction, url)
+        self.start_heartbeat()
+        return url
+
+    def record_outcome(self, url: str, records: int, failed: bool = False):
+        # Leases follow queue order, page outcomes do not reorder them
+        pass
+
+    def release(self, worker: str | None = None):
+        # Pages are leased per worker process, released by `save`
+        pass
+
+    def available_num(self):
+        with self.lock:
+            available, = self.db.execute(
+                """
+                SELECT COUNT(*) FROM queue q
+                LEFT JOIN pages p ON p.page_key = q.page_key
+                WHERE (q.lease_until IS NULL OR q.lease_until < :now)
+                  AND (p.owner IS NULL OR p.owner = :me OR p.lease_until < :now)
+                """,
+                {"now": time.time(), "me": self.worker_id}
+            ).fetchone()
+            return available
+
+    def remaining_num(self, worker: str | None = None):
+        """
+        The number of URLs this worker can lease now. While the queue only
+        holds URLs of other workers, waits up to `idle_wait_second` for them
+        to be released or expire.
+        """
+        deadline = time.monotonic() + self.idle_wait_second
+        while True:
+            available = self.available_num() + len(self.local)
+            if available > 0 or time.monotonic() >= deadline:
+                return available
+            with self.lock:
+                total, = self.db.execute("SELECT COUNT(*) FROM queue").fetchone()
+            if total == 0:
+                return 0
+            time.sleep(self.poll_second)
+
+    @staticmethod
+    def acknowledge(cursor: sqlite3.Cursor, url: str, worker_id: str):
+        cursor.execute("INSERT OR IGNORE INTO history (url) VALUES (?)", (url,))
+        # Acknowledge a leased URL
+        deleted = cursor.execute(
+            "DELETE FROM queue WHERE url = ? RETURNING page_key",
+            (url,)
+        ).fetchone()
+        if deleted is None:
+            return
+        # A page whose chain has ended is released
+        key, = deleted
+        left, = cursor.execute("SELECT COUNT(*) FROM queue WHERE page_key = ?", (key,)).fetchone()
+        if left == 0:
+            cursor.execute("DELETE FROM pages WHERE page_key = ? AND owner = ?", (key, worker_id))
+
+    def add_history(self, url: str):
+        transaction = self.current.get()
+        if transaction is not None:
+            with LOCK:
+                transaction.ensure_open()
+                if url not in self.pending_history:
+                    self.track_history(transaction, url)
+            return
+        self.write(lambda cursor: self.acknowledge(cursor, url, self.worker_id))
+
+    def propagated(self, url: str):
+        if url in self.pending_history:
+            return True
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM history WHERE url = ?", (url,)).fetchone() is not None
+
+    def write_transaction(self, transaction: Transaction):
+        with LOCK:
+            # Those a dependent page took stay leased by this worker
+            unleased = set(self.local)
+            for _, url in transaction.enqueued:
+                if url in unleased:
+                    self.local.remove(url)
+
+        def commit(cursor: sqlite3.Cursor):
+            lease_until = time.time() + self.visibility_timeout_second
+            for side, url in transaction.enqueued:
+                self.insert(cursor, url, side, None if url in unleased else lease_until)
+            for url in transaction.history:
+                self.acknowledge(cursor, url, self.worker_id)
+            for key, record in transaction.watermarks.items():
+                cursor.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?, ?)", (key, *record))
+            cursor.execute("INSERT OR IGNORE INTO transactions (id) VALUES (?)", (transaction.id,))
+        self.write(commit)
+        self.forget(transaction)
+
+    def undo_transaction(self, transaction: Transaction, restore: bool):
+        # Enqueued URLs never left this worker; unless a dependent took
+        # one, rolled back along
+        for _, url in transaction.enqueued:
+            if self.origins.get(url) is transaction and url in self.local:
+                self.local.remove(url)
+        # A URL enqueued by a pending page goes back to the local queue
+        local = [url for url in transaction.popped if url in self.origins]
+        if restore:
+            self.local.extendleft(reversed(local))
+
+        def release(cursor: sqlite3.Cursor):
+            for url in transaction.popped:
+                if url in local:
+                    continue
+                if restore:
+                    position, = cursor.execute("SELECT COALESCE(MIN(position), 0) - 1 FROM queue").fetchone()
+                    cursor.execute("UPDATE queue SET position = ? WHERE url = ?", (position, url))
+                cursor.execute(
+                    "UPDATE queue SET owner = NULL, lease_until = NULL WHERE url = ? AND owner = ?",
+                    (url, self.worker_id)
+                )
+        self.write(release)
+        self.forget(transaction)
+
+    def committed(self, transaction_id: str):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM transactions WHERE id = ?", (transaction_id,)).fetchone() is not None
+
+    def load_watermark(self, key: str):
+        with self.lock:
+            return self.db.execute(
+                "SELECT newest, newest_id, seen, seen_id FROM watermarks WHERE page_key = ?",
+                (key,)
+            ).fetchone()
+
+    def store_watermark(self, key: str, record: tuple):
+        self.write(lambda cursor: cursor.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?, ?)", (key, *record)))
+
+    def save(self):
+        """
+        Releases every lease and page held by this worker, for other workers
+        to pick up right away; called when the worker stops.
+        """
+        self.heartbeat_stop.set()
+        if self.heartbeat_thread is not None:
+            self.heartbeat_thread.join()
+
+        def release(cursor: sqlite3.Cursor):
+            cursor.execute("UPDATE queue SET owner = NULL, lease_until = NULL WHERE owner = ?", (self.worker_id,))
+            cursor.execute("DELETE FROM pages WHERE owner = ?", (self.worker_id,))
+            return cursor.rowcount
+        released = self.write(release)
+        self.logger.info(f"Released {colors.bold(released)} pages")
+
+    def close(self):
+        self.save()
+        self.db.close()